@@ -0,0 +1,74 @@
+# --- compares the speed of the line parser and the block parser of myparse ---
+#
+# usage: python benchmark_parse.py [size in MB] [measurement file]
+# without a file a measurement file of the given size (default 100 MB) is
+# generated first, both parsers convert it to csv and the results must be the same
+
+import os
+import sys
+import time
+import random
+import tempfile
+from myparse import file_to_sv_lines, file_to_sv
+
+
+def generate(filename, size, names=("FMI220", "Keithley2000", "Eurotherm2416")):
+    """Writes a measurement file of about size bytes in the Terminal's format"""
+    random.seed(0)
+    with open(filename, "w") as file:
+        file.write("Starting new measurement at 01.January.2020 - 12:00:00\n")
+        written = 0
+        i = 0
+        while written < size:
+            lines = []
+            for _ in range(10000):
+                line = "Time: {}, ".format(i * 0.1)
+                for name in names:
+                    line += "{}: {}, ".format(name, random.random())
+                lines.append(line + "\n")
+                i += 1
+            text = "".join(lines)
+            file.write(text)
+            written += len(text)
+
+
+def convert_lines(in_filename, out_filename, **kwargs):
+    # the line by line conversion (how file_to_sv did it before the block parser):
+    with open(out_filename, "w") as file:
+        for parsed_line in file_to_sv_lines(in_filename, **kwargs):
+            file.write(parsed_line + "\n")
+
+
+def measure(function, in_filename, out_filename, **kwargs) -> float:
+    start = time.perf_counter()
+    function(in_filename, out_filename, **kwargs)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    size = float(sys.argv[1]) if len(sys.argv) > 1 else 100.0
+    directory = tempfile.mkdtemp()
+    if len(sys.argv) > 2:
+        in_filename = sys.argv[2]
+    else:
+        in_filename = os.path.join(directory, "benchmark.txt")
+        generate(in_filename, size * 1024 * 1024)
+    megabytes = os.path.getsize(in_filename) / 1024 / 1024
+    lines_out = os.path.join(directory, "lines.csv")
+    blocks_out = os.path.join(directory, "blocks.csv")
+
+    for header, separator in ((True, ","), (False, "\t")):
+        t_lines = measure(convert_lines, in_filename, lines_out, header=header, separator=separator)
+        t_blocks = measure(file_to_sv, in_filename, blocks_out, header=header, separator=separator)
+        with open(lines_out, "rb") as a, open(blocks_out, "rb") as b:
+            same = a.read() == b.read()
+        print("header={} separator={!r}: {:.1f} MB".format(header, separator, megabytes))
+        print("  line parser:  {:8.2f}s {:8.1f} MB/s".format(t_lines, megabytes / t_lines))
+        print("  block parser: {:8.2f}s {:8.1f} MB/s ({:.1f}x)".format(t_blocks, megabytes / t_blocks,
+                                                                    t_lines / t_blocks))
+        print("  same output:", same)
+
+    for filename in (lines_out, blocks_out, os.path.join(directory, "benchmark.txt")):
+        if os.path.exists(filename):
+            os.remove(filename)
+    os.rmdir(directory)
@@ -2,38 +2,56 @@ from tkinter import *
 from tkinter import ttk
 from mypages import *
 from mythreads import *
-
-
-# create tabed window with custom pages:
-root = Tk()
-root.wm_title("TextileUX Measurement")
-# width x height + x offset + y offset
-# note for offset: (0,0) is upper left corner of our screen
-root.geometry("1200x600+300+50")
-
-notebook = ttk.Notebook(root)
-
-# we need to get data from the MeasurementPage to the GraphPage,
-# and therefore we use the Fifo class which implements synchronized
-# data access(needed when working with threads), the Fifo uses a deque
-# in the background, last "maxlen" elements are saved for plotting:
-buffer = Fifo(maxlen=1000)
-
-# for sending information of selected Instruments to the GraphPage:
-class_info = []
-
-# --- create custom pages ---
-measurement = MeasurementPage(notebook, buffer, class_info, bg="snow3")
-# change the graph title here:
-title = "Measurement Plot"
-graph = GraphPage(notebook, buffer, class_info, title, bg="snow3")
-# here we can parse a file to different formats:
-parsing = ParsingPage(notebook, bg="snow3")
-
-notebook.add(measurement, text="measurement")
-notebook.add(graph, text="graph")
-notebook.add(parsing, text="parsing")
-
-notebook.pack(expand=True, fill="both")
-
-root.mainloop()
+from mybuffers import *
+from mylog import setup_logging, shutdown_logging
+from myrecorder import recover_all
+import logging
+
+
+# the main guard is needed for the "processes" engine: the worker processes
+# import this module too and must not create a second GUI!
+if __name__ == "__main__":
+    # the messages of all modules go through one background thread, use
+    # logging.DEBUG to see every measured value (slows down fast measurements):
+    setup_logging(logging.INFO)
+    # finish the save files of a run that was interrupted (e.g. by a crash):
+    recover_all(".")
+
+    # create tabed window with custom pages:
+    root = Tk()
+    root.wm_title("TextileUX Measurement")
+    # width x height + x offset + y offset
+    # note for offset: (0,0) is upper left corner of our screen
+    root.geometry("1200x600+300+50")
+
+    notebook = ttk.Notebook(root)
+
+    # we need to get data from the MeasurementPage to the GraphPage,
+    # and therefore we use the RingBuffer class which implements synchronized
+    # data access(needed when working with threads), the RingBuffer uses
+    # preallocated numpy arrays in the background, last "capacity" samples are
+    # saved for plotting (the channels are configured on initialization):
+    buffer = RingBuffer(capacity=100000)
+
+    # for sending information of selected Instruments to the GraphPage:
+    class_info = []
+
+    # --- create custom pages ---
+    measurement = MeasurementPage(notebook, buffer, class_info, bg="snow3")
+    # change the graph title here:
+    title = "Measurement Plot"
+    graph = GraphPage(notebook, buffer, class_info, title, bg="snow3")
+    # here we can parse a file to different formats:
+    parsing = ParsingPage(notebook, bg="snow3")
+
+    notebook.add(measurement, text="measurement")
+    notebook.add(graph, text="graph")
+    notebook.add(parsing, text="parsing")
+
+    notebook.pack(expand=True, fill="both")
+
+    root.mainloop()
+    # write the rest of the save file:
+    measurement.terminal.recorder.stop()
+    measurement.terminal.writer.close(timeout=10.0)
+    shutdown_logging()
@@ -0,0 +1,156 @@
+# --- module for aligning the samples of different Instruments by time ---
+
+import math
+import collections
+
+# how the value of an Instrument at a row time is chosen:
+NEAREST = "nearest"   # the sample closest to the row time
+HOLD = "hold"         # the last sample taken before the row time (hold last value)
+LINEAR = "linear"     # linear interpolation between the samples around the row time
+POLICIES = (NEAREST, HOLD, LINEAR)
+
+
+class Sample(collections.namedtuple("Sample", ["t_request", "t_response", "value"])):
+    """A measured value with the time the measurement was requested and the
+    time the response arrived (both time.perf_counter() values, this clock is
+    the same for all threads and processes), the value was measured somewhere
+    in between, so the midpoint is used as the time of the sample!
+    """
+    __slots__ = ()
+
+    @property
+    def time(self) -> float:
+        return 0.5 * (self.t_request + self.t_response)
+
+
+class TimeAligner:
+    """Builds rows of values of all Instruments at the row times:
+    start, start + period, start + 2 * period, ...
+
+    The samples of every Instrument (channel) are added as they arrive, a row
+    is ready as soon as every channel has a sample at or after the row time
+    (then no sample can come anymore that is closer to the row time), or if
+    we waited <max_wait> seconds longer than that for a slow Instrument -> then
+    its value is taken from the samples already there (or NaN if none fits)
+    so one slow Instrument can't hold back the others! (if no Instrument has
+    a sample for the row yet, the row isn't sent)
+    The rows before the first value of any Instrument aren't sent either (all
+    NaN while the Instruments get connected).
+
+    tolerance ... a sample used for a row must be at most tolerance seconds away
+    from the row time, otherwise the value is NaN (default: period)
+    """
+    def __init__(self, channels, period, start, policy=NEAREST, tolerance=None, max_wait=None):
+        assert policy in POLICIES, "Policy must be one of: {}".format(POLICIES)
+        self.period = period
+        self.start = start
+        self.policy = policy
+        self.tolerance = period if tolerance is None else tolerance
+        self.max_wait = self.tolerance + period if max_wait is None else max_wait
+        # the samples (time, value) of every channel, oldest first:
+        self.samples = [collections.deque() for _ in range(channels)]
+        # index of the next row:
+        self.k = 0
+        # True as soon as a row with a value was sent:
+        self.started = False
+
+    def add(self, channel, sample):
+        """Adds a Sample of the given channel (samples of one channel must be
+        added in the order they were measured)
+        """
+        self.samples[channel].append((sample.time, sample.value))
+
+    def row_time(self) -> float:
+        return self.start + self.k * self.period
+
+    def ready(self, now) -> list:
+        """Returns all rows that are ready at time <now> as a list of
+        (row time, [value1, value2, ...]) tuples
+        """
+        rows = []
+        while True:
+            t = self.row_time()
+            if now < t:
+                break
+            # which channels have a sample at or after the row time:
+            arrived = [bool(samples) and samples[-1][0] >= t for samples in self.samples]
+            if not all(arrived):
+                # wait for the slow Instruments, but not longer than max_wait
+                # and only if at least one Instrument is still measuring:
+                if now < t + self.max_wait or not any(arrived):
+                    break
+            self.append_row(rows, t)
+        return rows
+
+    def flush(self) -> list:
+        """Returns the rows held back at the end of a measurement (no sample
+        comes anymore), every row up to the newest sample, like ready()
+        """
+        newest = max((samples[-1][0] for samples in self.samples if samples), default=None)
+        rows = []
+        while newest is not None and self.row_time() <= newest:
+            self.append_row(rows, self.row_time())
+        return rows
+
+    def append_row(self, rows, t):
+        """Appends the row at time t to rows and goes on to the next row
+        (leading rows without any value are skipped)
+        """
+        values = [self.value(samples, t) for samples in self.samples]
+        self.k += 1
+        if not self.started and all(isinstance(value, float) and math.isnan(value)
+                                    for value in values):
+            return
+        self.started = True
+        rows.append((t, values))
+
+    def value(self, samples, t) -> float:
+        """The value of one channel at time t according to the policy"""
+        # drop samples which can't be the one before t anymore, we always keep
+        # the newest sample before t (needed for HOLD and LINEAR):
+        while len(samples) > 1 and samples[1][0] <= t:
+            samples.popleft()
+        if not samples:
+            return math.nan
+        before = samples[0] if samples[0][0] <= t else None
+        after = None
+        for sample in samples:
+            if sample[0] >= t:
+                after = sample
+                break
+
+        if self.policy == HOLD:
+            if before is not None and t - before[0] <= self.tolerance:
+                return before[1]
+            return math.nan
+
+        if self.policy == LINEAR and before is not None and after is not None:
+            if t - before[0] <= self.tolerance and after[0] - t <= self.tolerance:
+                if after[0] == before[0]:
+                    return before[1]
+                weight = (t - before[0]) / (after[0] - before[0])
+                return before[1] + weight * (after[1] - before[1])
+
+        # NEAREST (and LINEAR if only one side is there):
+        candidates = [sample for sample in (before, after) if sample is not None]
+        nearest = min(candidates, key=lambda sample: abs(sample[0] - t))
+        if abs(nearest[0] - t) <= self.tolerance:
+            return nearest[1]
+        return math.nan
+
+    def __repr__(self):
+        return "TimeAligner<policy={}, period={}s, tolerance={}s, max_wait={}s>".format(self.policy,
+                                                                                      self.period,
+                                                                                      self.tolerance,
+                                                                                      self.max_wait)
+
+
+if __name__ == '__main__':
+    aligner = TimeAligner(2, period=1.0, start=0.0, policy=LINEAR)
+    for t in (0.1, 1.1, 2.1, 3.1):
+        aligner.add(0, Sample(t - 0.05, t + 0.05, t))
+    # the second Instrument is slow:
+    for t in (0.4, 2.4):
+        aligner.add(1, Sample(t - 0.3, t + 0.3, 10 * t))
+    for row in aligner.ready(now=5.0):
+        print(row)
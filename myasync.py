@@ -0,0 +1,262 @@
+# --- module for the asyncio acquisition engine ---
+
+import asyncio
+import threading
+import time
+import concurrent.futures
+# for the timing control of the measurements:
+from myscheduler import DeadlineScheduler, SKIP
+# the samples are stamped with the time they were measured:
+from myalign import Sample
+# for the fault isolation of the Instruments:
+from mysupervisor import InstrumentHealth, gap_sample
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncInstrument():
+    """The asynchronous interface of an Instrument, all methods are coroutines
+    so one event loop can drive many Instruments at the same time!
+    Use to_async() to get an AsyncInstrument for an Instrument object.
+    """
+    def __init__(self, instrument):
+        # the wrapped Instrument of the myinstruments module:
+        self.instrument = instrument
+        self.name = instrument.__class__.__name__
+
+    async def measure(self) -> float:
+        raise NotImplementedError("No method: measure() implemented on", self.__class__.__name__)
+
+    async def open(self):
+        raise NotImplementedError("No method: open() implemented on", self.__class__.__name__)
+
+    async def close(self):
+        raise NotImplementedError("No method: close() implemented on", self.__class__.__name__)
+
+    def __repr__(self):
+        return "{}<{}>".format(self.__class__.__name__, self.name)
+
+
+class ExecutorInstrument(AsyncInstrument):
+    """Wraps an Instrument which only has blocking methods (e.g. the Keithley2000
+    using pyvisa or the Eurotherm2416 using minimalmodbus), the blocking calls
+    run on the threads of an executor so the event loop isn't blocked!
+
+    A blocking call that timed out (asyncio.wait_for only cancels the waiting
+    coroutine) still runs on its thread, so the next call waits till it has
+    finished: there is never more than one call on the connection at once.
+    """
+    def __init__(self, instrument, executor=None):
+        AsyncInstrument.__init__(self, instrument)
+        # None -> the default executor of the event loop:
+        self.executor = executor
+        # the future of the last blocking call (done when its thread is done):
+        self.pending = None
+        # created in the event loop (see _exclusive):
+        self.lock = None
+
+    async def _wait_pending(self):
+        # (called with the lock held)
+        if self.pending is not None and not self.pending.done():
+            logger.debug("%s is still busy with a call that timed out, waiting for it...", self.name)
+            # (its result is lost)
+            await asyncio.wait([self.pending])
+
+    def _exclusive(self) -> asyncio.Lock:
+        if self.lock is None:
+            self.lock = asyncio.Lock()
+        return self.lock
+
+    async def _call(self, function):
+        async with self._exclusive():
+            await self._wait_pending()
+            self.pending = asyncio.get_running_loop().run_in_executor(self.executor, function)
+            future = self.pending
+            # the exception of a call nobody waits for anymore isn't an error
+            # of the event loop (the timeout was counted already):
+            future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        # shielded: a timeout cancels only the waiting, the call counts as
+        # busy till its thread has finished
+        return await asyncio.shield(future)
+
+    async def measure(self) -> float:
+        return await self._call(self.instrument.measure)
+
+    async def open(self):
+        await self._call(self.instrument.open)
+
+    async def close(self):
+        await self._call(self.instrument.close)
+
+
+class NativeAsyncInstrument(ExecutorInstrument):
+    """Wraps an Instrument which implements the measure_async coroutine
+    (e.g. the FMI220 and the LightSwitch with their non-blocking serial reads),
+    opening and closing the connection is rare so that still uses the executor
+    """
+    async def measure(self) -> float:
+        async with self._exclusive():
+            # (e.g. an open() of a reconnect that timed out)
+            await self._wait_pending()
+            return await self.instrument.measure_async()
+
+
+def to_async(instrument, executor=None) -> AsyncInstrument:
+    """Returns the matching AsyncInstrument for an Instrument object"""
+    if hasattr(instrument, "measure_async"):
+        return NativeAsyncInstrument(instrument, executor)
+    return ExecutorInstrument(instrument, executor)
+
+
+class AsyncAcquisitionThread(threading.Thread):
+    """Runs an asyncio event loop that drives the measurements of all Instruments,
+    every Instrument gets its own task which sleeps till the next deadline
+    (see myscheduler module) and then awaits the measurement!
+
+    Instruments with a measure_async coroutine don't need any extra thread,
+    the others are called on a bounded pool of <workers> threads. A stop()
+    cancels the tasks right away, even while they wait for a response.
+
+    note: this thread has the same interface as the MeasurementThread
+    (start, stop, wait, go, join) so the MeasurementPage can handle both the
+    same way!
+    """
+    def __init__(self, interval, count, instruments, noe, fifos, overrun=SKIP, workers=4, timeout=5.0,
+                 **health_kwargs):
+        threading.Thread.__init__(self)
+        assert noe>=0,"Number of errors must be >= 0!"
+        assert len(instruments) == len(fifos), "Each Instrument needs a fifo!"
+
+        self.interval = interval
+        self.count = count
+        self.fifos = fifos
+        self.overrun = overrun
+        # a measurement which takes longer than timeout seconds counts as error:
+        self.timeout = timeout
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers,
+                                                              thread_name_prefix="AsyncWorker")
+        self.instruments = [to_async(instrument, self.executor) for instrument in instruments]
+        self.schedulers = [DeadlineScheduler(interval, overrun) for _ in instruments]
+        # the health of every connection (see mysupervisor module for the health_kwargs):
+        self.healths = [InstrumentHealth(instrument.name, noe, **health_kwargs)
+                        for instrument in self.instruments]
+        # created in run(), they belong to the event loop of this thread:
+        self.loop = None
+        self.main_task = None
+        self.running = None
+        # a flag to stop the thread, call thread.stop() to set the flag to False
+        self.run_flag = True
+        self.wait_flag = False
+        logger.info("Created %s", self)
+
+    def run(self):
+        try:
+            asyncio.run(self.main())
+        finally:
+            self.executor.shutdown(wait=False)
+        logger.info("%s has stopped!", self)
+        for health, scheduler in zip(self.healths, self.schedulers):
+            logger.info("%s %s", health, scheduler.stats)
+
+    async def main(self):
+        self.loop = asyncio.get_running_loop()
+        self.main_task = asyncio.current_task()
+        # set while we measure, cleared in idle mode:
+        self.running = asyncio.Event()
+        if not self.wait_flag:
+            self.running.set()
+        # stop() could have been called before the loop existed:
+        if not self.run_flag:
+            return
+        start = time.perf_counter_ns()
+        try:
+            await asyncio.gather(*[self.acquire(i, start) for i in range(len(self.instruments))])
+        except asyncio.CancelledError:
+            # that's how stop() ends the measurements
+            pass
+
+    async def acquire(self, i, start):
+        """The task of Instrument i: measure on every deadline till count
+        measurements are done, if the Instrument failed more than noe times in
+        a row the connection is restarted (with the delays the health object
+        demands, see mysupervisor module) while the others keep on measuring
+        """
+        instrument = self.instruments[i]
+        scheduler = self.schedulers[i]
+        health = self.healths[i]
+        scheduler.start(start)
+        count = self.count
+        while count > 0:
+            # idle mode, do nothing till go() is called:
+            await self.running.wait()
+            remaining = scheduler.deadline - time.perf_counter_ns()
+            if remaining > 0:
+                await asyncio.sleep(remaining / 1e9)
+            scheduler.started()
+            try:
+                t_request = time.perf_counter()
+                value = await asyncio.wait_for(instrument.measure(), self.timeout)
+                self.fifos[i].push(Sample(t_request, time.perf_counter(), value))
+                count -= 1
+                health.success()
+                logger.debug("%s put value: %s of %s on data queue!", self, value, instrument.name)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("%s %s function call failed: %r", self, instrument.name, e)
+                if health.failure():
+                    # mark the gap in the data of this Instrument:
+                    self.fifos[i].push(gap_sample())
+                    await self.reconnect(instrument, health)
+            scheduler.done()
+
+    async def reconnect(self, instrument, health):
+        """Closes and opens the connection of a failing Instrument till that
+        works, the other Instruments keep on measuring meanwhile
+        """
+        logger.error("%s failed multiple times, restarting the connection...", instrument.name)
+        while True:
+            await asyncio.sleep(health.reconnect_delay())
+            try:
+                # the connection could be closed already, that's not an error:
+                await instrument.close()
+            except Exception as e:
+                logger.debug("Closing %s failed: %s", instrument.name, e)
+            try:
+                await instrument.open()
+            except Exception as e:
+                logger.error("Couldn't restart the connection of %s: %s", instrument.name, e)
+                health.reconnected(False)
+                continue
+            health.reconnected(True)
+            return
+
+    def _call_in_loop(self, function):
+        # the event loop isn't thread safe, so calls from other threads
+        # (e.g. the GUI) are handed over to the loop:
+        if self.loop is not None and not self.loop.is_closed():
+            try:
+                self.loop.call_soon_threadsafe(function)
+            except RuntimeError:
+                # the loop has been closed meanwhile
+                pass
+
+    def stop(self):
+        logger.info("%s trying to stopp!", self)
+        self.run_flag = False
+        self._call_in_loop(lambda: self.main_task.cancel())
+
+    def wait(self):
+        logger.info("%s will go into idle mode!", self)
+        self.wait_flag = True
+        self._call_in_loop(lambda: self.running.clear())
+
+    def go(self):
+        logger.info("%s will go into measurement mode!", self)
+        self.wait_flag = False
+        self._call_in_loop(lambda: self.running.set())
+
+    def __repr__(self):
+        return "AsyncAcquisitionThread with id: {}".format(id(self))
@@ -0,0 +1,154 @@
+# --- module for the binary measurement file format ---
+
+import os
+import json
+import struct
+import time
+import numpy as np
+# the interface of the UpdateThread's recording sinks:
+from mysinks import Sink
+
+# layout of a binary measurement file (<stem>.bin):
+#
+# MAGIC (8 bytes) | header length (uint32, little endian) | JSON header | padding | records
+#
+# the JSON header describes the file: names and units of the Instruments, the
+# start time, the data type and the size of one record, the records begin at
+# a multiple of ALIGNMENT bytes. A record is one row of float64 values:
+# [time, value of instrument 1, value of instrument 2, ...]
+# -> all records have the same size, so a file can be memory-mapped as one
+# 2D numpy array and the n-th row is found without reading the rows before!
+MAGIC = b"MEASBIN1"
+VERSION = 1
+DTYPE = "<f8"
+ALIGNMENT = 64
+EXTENSION = ".bin"
+
+
+def make_header(names, units, start_time) -> bytes:
+    """The bytes in front of the first record of a file"""
+    header = {"format": "measurement", "version": VERSION,
+              # time.time() at which the time column is 0:
+              "start_time": start_time,
+              "start": time.strftime("%d.%B.%Y - %H:%M:%S", time.localtime(start_time)),
+              "columns": ["Time"] + list(names),
+              "units": ["s"] + list(units),
+              "dtype": DTYPE,
+              "record_size": np.dtype(DTYPE).itemsize * (len(names) + 1)}
+    text = json.dumps(header).encode("utf-8")
+    size = len(MAGIC) + 4 + len(text)
+    # spaces are valid JSON whitespace:
+    text += b" " * (-size % ALIGNMENT)
+    return MAGIC + struct.pack("<I", len(text)) + text
+
+
+def read_header(filename) -> tuple:
+    """Returns the header dictionary of a file and the offset of its records"""
+    with open(filename, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError("{} is no binary measurement file!".format(filename))
+        (length,) = struct.unpack("<I", file.read(4))
+        header = json.loads(file.read(length).decode("utf-8"))
+    return header, len(MAGIC) + 4 + length
+
+
+def pack_row(row_time, values) -> bytes:
+    return np.array([row_time] + list(values), dtype=DTYPE).tobytes()
+
+
+class BinaryFile:
+    """A binary measurement file memory-mapped into a numpy array, nothing is
+    read before it's used so opening even huge files is instant!
+
+    data ... 2D array, one row per record: [time, value1, value2, ...]
+    time ... the time column (seconds since the start)
+    columns/units/start_time ... from the header
+    A record which isn't complete (e.g. after a crash) is ignored.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.header, self.offset = read_header(filename)
+        self.columns = self.header["columns"]
+        self.units = self.header["units"]
+        self.start_time = self.header["start_time"]
+        record_size = self.header["record_size"]
+        rows = (os.path.getsize(filename) - self.offset) // record_size
+        if rows > 0:
+            self.data = np.memmap(filename, dtype=self.header["dtype"], mode="r",
+                                  offset=self.offset, shape=(rows, len(self.columns)))
+        else:
+            self.data = np.empty((0, len(self.columns)), dtype=self.header["dtype"])
+
+    @property
+    def time(self) -> np.ndarray:
+        return self.data[:, 0]
+
+    def column(self, name) -> np.ndarray:
+        """The values of one Instrument (or "Time"), a view, nothing is copied"""
+        return self.data[:, self.columns.index(name)]
+
+    def window(self, t0, t1) -> np.ndarray:
+        """The records with t0 <= time < t1 (the time column is sorted, so the
+        rows are found by binary search)
+        """
+        start, stop = np.searchsorted(self.time, [t0, t1])
+        return self.data[start:stop]
+
+    def read(self, t0=None, t1=None, columns=None) -> np.ndarray:
+        """Same as ChunkedFile.read (see mychunks module): the rows in the time
+        window in the layout of the drawing buffer [[time, ...], [instr1, ...], ...]
+        """
+        start = 0 if t0 is None else np.searchsorted(self.time, t0)
+        stop = len(self) if t1 is None else np.searchsorted(self.time, t1)
+        names = self.columns[1:] if columns is None else columns
+        indices = [0] + [self.columns.index(name) for name in names]
+        return self.data[start:stop, indices].T
+
+    def __len__(self):
+        return self.data.shape[0]
+
+    def __repr__(self):
+        return "BinaryFile<{}, columns={}, records={}>".format(self.filename, self.columns, len(self))
+
+
+def load_binary(filename) -> BinaryFile:
+    return BinaryFile(filename)
+
+
+class BinarySink(Sink):
+    """Records the rows into <stem>.bin, the records are written by the given
+    FileWriter thread (see mywriter module), so write() never waits for the disk
+    """
+    def __init__(self, writer):
+        self.writer = writer
+        self.filename = None
+
+    def open(self, stem, names, units, start_time):
+        self.filename = stem + EXTENSION
+        self.writer.write(self.filename, make_header(names, units, start_time))
+
+    def write(self, row_time, values):
+        self.writer.write(self.filename, pack_row(row_time, values))
+
+    def close(self):
+        if self.filename is not None:
+            self.writer.close_file(self.filename)
+
+    def __repr__(self):
+        return "BinarySink<{}>".format(self.filename)
+
+
+if __name__ == '__main__':
+    from mywriter import FileWriter
+    writer = FileWriter()
+    writer.start()
+    sink = BinarySink(writer)
+    sink.open("binary_test", ["FMI220", "Keithley2000"], ["N", "OHM"], time.time())
+    for i in range(1000):
+        sink.write(i * 0.1, [i, -i])
+    sink.close()
+    writer.close()
+    f = load_binary("binary_test.bin")
+    print(f, f.header)
+    print(f.window(10.0, 10.5))
+    os.remove("binary_test.bin")
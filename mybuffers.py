@@ -0,0 +1,346 @@
+# --- module for buffers that store the measured samples ---
+
+import os
+import sys
+import threading
+# for sharing the samples between processes without pickling them:
+from multiprocessing import shared_memory
+# the samples are stored in preallocated numpy arrays:
+import numpy as np
+
+
+class RingBuffer:
+    """A ring buffer for measurement samples: one preallocated float64 column
+    per channel plus a timestamp column, saved as the rows of a 2D array:
+
+    data[0] ... timestamps
+    data[1] ... values of the first channel (Instrument)
+    data[2] ... values of the second channel
+    ...
+
+    Appending a sample just writes into the arrays, so no Python objects are
+    kept per sample! If the buffer is full the oldest samples get overwritten.
+
+    Every sample gets an absolute index (0, 1, 2, ...) and readers remember up
+    to which index they have read (their cursor), so any number of readers
+    (GraphPage, save path, ...) can read the same buffer without taking the
+    samples away from each other:
+
+    data, cursor = buffer.read(cursor)
+
+    note: read() returns views of the internal arrays whenever the requested
+    samples are stored contiguously (zero-copy), such a view is only valid till
+    <capacity> further samples are appended -> use the data right away or copy it!
+    """
+    def __init__(self, capacity=100000, channels=0):
+        self.capacity = capacity
+        # (reentrant lock because read() calls segments() while holding it)
+        self.cond = threading.Condition(threading.RLock())
+        self.data = None
+        self.channels = None
+        # the absolute index of the next sample:
+        self.written = 0
+        # the absolute index of the first sample which wasn't cleared:
+        self.first = 0
+        self.configure(channels)
+
+    def configure(self, channels):
+        """Allocates the arrays for the given number of channels, if the number
+        of channels changes all samples are discarded!
+        """
+        with self.cond:
+            if channels == self.channels:
+                return
+            self.channels = channels
+            self.data = np.full((channels + 1, self.capacity), np.nan, dtype=np.float64)
+            # the absolute index keeps counting so the cursors of the readers
+            # stay valid, but the old samples are gone:
+            self.first = self.written
+
+    def __len__(self):
+        return self.written - self.oldest()
+
+    def oldest(self) -> int:
+        """Returns the absolute index of the oldest sample still stored"""
+        return max(self.first, self.written - self.capacity)
+
+    def append(self, rows):
+        """Appends many samples at once, rows is array like with the shape
+        (n, channels + 1) where every row looks like: [time, value1, value2, ...]
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        n = rows.shape[0]
+        if n == 0:
+            return
+        assert rows.shape[1] == self.channels + 1, "Number of columns must match the channels + 1!"
+        # if more rows than capacity are given only the newest ones will survive:
+        if n > self.capacity:
+            skipped = n - self.capacity
+            rows = rows[skipped:]
+        else:
+            skipped = 0
+        with self.cond:
+            start = (self.written + skipped) % self.capacity
+            stop = start + rows.shape[0]
+            if stop <= self.capacity:
+                self.data[:, start:stop] = rows.T
+            else:
+                # the rows wrap around the end of the arrays:
+                split = self.capacity - start
+                self.data[:, start:] = rows[:split].T
+                self.data[:, :stop - self.capacity] = rows[split:].T
+            self.written += n
+            # wake up the readers waiting in wait_for_data():
+            self.cond.notify_all()
+
+    def push(self, bundle):
+        """Appends one sample: bundle = [time, value1, value2, ...]
+        (same interface as Fifo.push so it can replace the drawing buffer)
+        """
+        self.append(bundle)
+
+    def segments(self, start, stop=None) -> list:
+        """Returns the samples from absolute index start (inclusive) to stop
+        (exclusive, None = up to the newest sample) as a list of up to two
+        zero-copy views (two if they wrap around the end of the arrays)
+        """
+        with self.cond:
+            start = max(start, self.oldest())
+            stop = self.written if stop is None else min(stop, self.written)
+            if start >= stop:
+                return []
+            i = start % self.capacity
+            j = i + (stop - start)
+            if j <= self.capacity:
+                return [self.data[:, i:j]]
+            return [self.data[:, i:], self.data[:, :j - self.capacity]]
+
+    def read(self, start, stop=None) -> tuple:
+        """Returns (data, cursor): data has the shape (channels + 1, n) and holds
+        the samples from absolute index start till stop (see segments), cursor
+        is the absolute index a reader should continue reading from next time!
+        (data is a view if possible, only a wrapped range gets copied)
+        """
+        with self.cond:
+            stop = self.written if stop is None else min(stop, self.written)
+            parts = self.segments(start, stop)
+        if not parts:
+            return np.empty((self.channels + 1, 0)), max(start, stop)
+        if len(parts) == 1:
+            return parts[0], stop
+        return np.concatenate(parts, axis=1), stop
+
+    def latest(self, n) -> np.ndarray:
+        """Returns the newest n samples with the shape (channels + 1, n)"""
+        data, _ = self.read(self.written - n)
+        return data
+
+    def wait_for_data(self, cursor, timeout=None) -> bool:
+        """Blocks till there are samples newer than cursor or the timeout
+        expired, returns True if there is new data!
+        """
+        with self.cond:
+            return self.cond.wait_for(lambda: self.written > cursor, timeout)
+
+    def clear_data(self):
+        """Discards all stored samples (the absolute index continues to count
+        up so the cursors of the readers stay valid)
+        """
+        with self.cond:
+            self.first = self.written
+
+    def __repr__(self):
+        return "RingBuffer<channels={}, capacity={}, stored={}>".format(self.channels,
+                                                                         self.capacity,
+                                                                         len(self))
+
+
+class SharedRingBuffer:
+    """A ring buffer for measurement samples (same layout as the RingBuffer:
+    timestamps in data[0], channel values in data[1:]) which lives in a
+    multiprocessing.shared_memory block, so a producer and a consumer can run
+    in different processes and exchange samples without pickling!
+
+    The access is lock-free for exactly one producer and one consumer
+    (single-producer/single-consumer):
+    -> only the producer writes the head (absolute index of the next sample)
+    -> only the consumer writes the tail (absolute index of the next unread sample)
+    The producer first writes the sample values and then publishes them by
+    moving the head, the consumer first reads the values and then frees them
+    by moving the tail. Both indices are aligned 64 bit integers so a reader
+    never sees half of an update. If the buffer is full the producer doesn't
+    overwrite unread samples, they are counted as dropped instead!
+
+    Usage:
+    buffer = SharedRingBuffer(channels=1)           # in the parent (creates the memory)
+    process = Process(target=work, args=(buffer,))  # attaches in the child by name
+    buffer.push([time, value])                      # producer side
+    data, n = buffer.peek()                         # consumer side, zero-copy
+    buffer.consume(n)                               # free what was used
+
+    note: if more than one process should read the samples, the consumer
+    fans them out e.g. into a RingBuffer, the shared block itself only
+    supports one consumer!
+    """
+    # layout of the header (int64 slots) in front of the sample data:
+    HEAD, TAIL, DROPPED, CHANNELS, CAPACITY = range(5)
+    # extra float64 slots for the producer, e.g. a heartbeat timestamp:
+    HEARTBEAT = 5
+    HEADER_SLOTS = 8
+
+    def __init__(self, channels=1, capacity=100000, name=None):
+        """Creates a new shared memory block, or attaches to the existing block
+        with the given name (then channels and capacity are read from it)
+        """
+        if name is None:
+            size = 8 * (self.HEADER_SLOTS + (channels + 1) * capacity)
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            # (remember the creating process, a forked child gets a copy of
+            # this object but must not destroy the memory of the parent)
+            self.owner = os.getpid()
+            header = np.ndarray((self.HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+            header[:] = 0
+            header[self.CHANNELS] = channels
+            header[self.CAPACITY] = capacity
+            del header
+            self._map()
+        else:
+            self.shm = self._attach(name)
+            self.owner = None
+            self._map()
+
+    @staticmethod
+    def _attach(name):
+        # note: a child started with multiprocessing shares the resource
+        # tracker of the parent, so the memory is only cleaned up (if not
+        # closed properly) when the parent exits, newer versions of python
+        # let us skip the tracking completely:
+        if sys.version_info >= (3, 13):
+            return shared_memory.SharedMemory(name=name, track=False)
+        return shared_memory.SharedMemory(name=name)
+
+    def _map(self):
+        self.header = np.ndarray((self.HEADER_SLOTS,), dtype=np.int64, buffer=self.shm.buf)
+        self.floats = np.ndarray((self.HEADER_SLOTS,), dtype=np.float64, buffer=self.shm.buf)
+        self.channels = int(self.header[self.CHANNELS])
+        self.capacity = int(self.header[self.CAPACITY])
+        self.data = np.ndarray((self.channels + 1, self.capacity),
+                               dtype=np.float64,
+                               buffer=self.shm.buf,
+                               offset=8 * self.HEADER_SLOTS)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def __reduce__(self):
+        # a pickled SharedRingBuffer (e.g. as argument of a Process) only
+        # carries the name and attaches to the same memory on unpickling:
+        return (SharedRingBuffer, (None, None, self.name))
+
+    def __len__(self):
+        return int(self.header[self.HEAD] - self.header[self.TAIL])
+
+    @property
+    def dropped(self) -> int:
+        return int(self.header[self.DROPPED])
+
+    # --- producer side ---
+
+    def append(self, rows) -> int:
+        """Appends many samples, rows is array like with the shape
+        (n, channels + 1), returns the number of samples written (samples that
+        didn't fit into the buffer are dropped and counted)
+        """
+        rows = np.asarray(rows, dtype=np.float64)
+        if rows.ndim == 1:
+            rows = rows.reshape(1, -1)
+        head = int(self.header[self.HEAD])
+        free = self.capacity - (head - int(self.header[self.TAIL]))
+        n = min(rows.shape[0], free)
+        if n < rows.shape[0]:
+            self.header[self.DROPPED] += rows.shape[0] - n
+        if n == 0:
+            return 0
+        start = head % self.capacity
+        stop = start + n
+        if stop <= self.capacity:
+            self.data[:, start:stop] = rows[:n].T
+        else:
+            split = self.capacity - start
+            self.data[:, start:] = rows[:split].T
+            self.data[:, :stop - self.capacity] = rows[split:n].T
+        # publish the samples only after they have been written:
+        self.header[self.HEAD] = head + n
+        return n
+
+    def push(self, bundle) -> bool:
+        """Appends one sample: bundle = [time, value1, value2, ...],
+        returns False if the buffer was full and the sample got dropped
+        """
+        return self.append(bundle) == 1
+
+    def beat(self, timestamp):
+        """The producer can signal it's still alive (see heartbeat)"""
+        self.floats[self.HEARTBEAT] = timestamp
+
+    @property
+    def heartbeat(self) -> float:
+        return float(self.floats[self.HEARTBEAT])
+
+    # --- consumer side ---
+
+    def peek(self, max_items=None) -> tuple:
+        """Returns (data, n) with the unread samples (up to max_items) without
+        freeing them, data is a zero-copy view if the samples are stored
+        contiguously, call consume(n) after the data has been used!
+        """
+        tail = int(self.header[self.TAIL])
+        n = int(self.header[self.HEAD]) - tail
+        if max_items is not None:
+            n = min(n, max_items)
+        if n <= 0:
+            return np.empty((self.channels + 1, 0)), 0
+        i = tail % self.capacity
+        j = i + n
+        if j <= self.capacity:
+            return self.data[:, i:j], n
+        return np.concatenate((self.data[:, i:], self.data[:, :j - self.capacity]), axis=1), n
+
+    def consume(self, n):
+        """Frees n samples so the producer can overwrite them"""
+        self.header[self.TAIL] += n
+
+    def read(self, max_items=None) -> np.ndarray:
+        """Returns a copy of the unread samples and frees them"""
+        data, n = self.peek(max_items)
+        data = data.copy()
+        self.consume(n)
+        return data
+
+    def close(self):
+        """Detaches from the memory (the owner also destroys the block)"""
+        # drop our views first or the memory can't be closed:
+        self.header = self.floats = self.data = None
+        self.shm.close()
+        if self.owner == os.getpid():
+            self.shm.unlink()
+
+    def __repr__(self):
+        return "SharedRingBuffer<name={}, channels={}, capacity={}, unread={}>".format(self.name,
+                                                                                        self.channels,
+                                                                                        self.capacity,
+                                                                                        len(self))
+
+
+if __name__ == "__main__":
+    buffer = RingBuffer(capacity=5, channels=2)
+    for i in range(7):
+        buffer.push([i * 0.5, i, 10 * i])
+    data, cursor = buffer.read(0)
+    print(data, cursor)
+    buffer.append([[3.5, 7, 70], [4.0, 8, 80]])
+    print(buffer.segments(cursor))
+    print(buffer)
@@ -0,0 +1,218 @@
+# --- module for the chunked, compressed columnar measurement storage ---
+
+import os
+import json
+import zlib
+import time
+import bisect
+import warnings
+import numpy as np
+# the interface of the UpdateThread's recording sinks:
+from mysinks import Sink
+
+# a chunked recording consists of 2 files:
+#
+# <stem>.chunks ... the compressed chunks, one after the other: a chunk holds
+# <chunk_rows> rows, every column (time and the Instruments) is compressed on
+# its own with zlib (float64, little endian)
+# <stem>.idx ... the index, one JSON object per line: the first line describes
+# the recording (columns, units, start time), then one line per chunk with
+# its offset in the .chunks file, the compressed size of every column, the
+# number of rows, the time range and min/max of every column
+#
+# -> a time window is read by looking up the chunks in the index and
+# decompressing only these chunks (and only the columns needed), the min/max
+# of long time spans come from the index without decompressing anything!
+CHUNKS = ".chunks"
+INDEX = ".idx"
+VERSION = 1
+DTYPE = "<f8"
+
+
+def _nan_to_none(values) -> list:
+    # JSON has no NaN, a column with no value in a chunk has no min/max:
+    return [None if np.isnan(value) else float(value) for value in values]
+
+
+def encode_chunk(rows, level=6) -> tuple:
+    """Compresses a chunk (2D array, one row per record: [time, value1, ...]),
+    returns the compressed columns and the index entry without the offset
+    """
+    rows = np.asarray(rows, dtype=DTYPE)
+    columns = [zlib.compress(np.ascontiguousarray(rows[:, i]).tobytes(), level)
+               for i in range(rows.shape[1])]
+    with warnings.catch_warnings():
+        # all-NaN columns give a RuntimeWarning and NaN, that's fine:
+        warnings.simplefilter("ignore", RuntimeWarning)
+        minimum = np.nanmin(rows, axis=0)
+        maximum = np.nanmax(rows, axis=0)
+    entry = {"rows": rows.shape[0],
+             "t0": float(rows[0, 0]),
+             "t1": float(rows[-1, 0]),
+             "sizes": [len(column) for column in columns],
+             "min": _nan_to_none(minimum),
+             "max": _nan_to_none(maximum)}
+    return columns, entry
+
+
+class ChunkedSink(Sink):
+    """Records the rows as compressed chunks of <chunk_rows> rows (see above),
+    the rows are collected here and the compressed chunks are written by the
+    given FileWriter thread (see mywriter module)
+    level ... zlib compression level (1 fast ... 9 small)
+    """
+    def __init__(self, writer, chunk_rows=4096, level=6):
+        self.writer = writer
+        self.chunk_rows = chunk_rows
+        self.level = level
+        self.stem = None
+        self.rows = []
+        # where the next chunk starts in the .chunks file:
+        self.offset = 0
+
+    def open(self, stem, names, units, start_time):
+        self.stem = stem
+        self.rows = []
+        self.offset = 0
+        header = {"format": "chunked measurement", "version": VERSION,
+                  "start_time": start_time,
+                  "start": time.strftime("%d.%B.%Y - %H:%M:%S", time.localtime(start_time)),
+                  "columns": ["Time"] + list(names),
+                  "units": ["s"] + list(units),
+                  "dtype": DTYPE,
+                  "compression": "zlib"}
+        self.writer.write(stem + INDEX, json.dumps(header) + "\n")
+
+    def write(self, row_time, values):
+        self.rows.append([row_time] + list(values))
+        if len(self.rows) >= self.chunk_rows:
+            self.write_chunk()
+
+    def write_chunk(self):
+        if not self.rows:
+            return
+        columns, entry = encode_chunk(self.rows, self.level)
+        entry["offset"] = self.offset
+        data = b"".join(columns)
+        self.offset += len(data)
+        self.rows = []
+        # the chunk before its index entry, so an entry never points to a
+        # chunk that isn't there:
+        self.writer.write(self.stem + CHUNKS, data)
+        self.writer.write(self.stem + INDEX, json.dumps(entry) + "\n")
+
+    def close(self):
+        if self.stem is not None:
+            self.write_chunk()
+            self.writer.close_file(self.stem + CHUNKS)
+            self.writer.close_file(self.stem + INDEX)
+
+    def __repr__(self):
+        return "ChunkedSink<{}, chunk_rows={}>".format(self.stem, self.chunk_rows)
+
+
+class ChunkedFile:
+    """Reads a chunked recording (give the name of the .idx or .chunks file, or
+    the stem), only the index is loaded when it's opened:
+
+    read(t0, t1, columns) ... the rows with t0 <= time < t1 in the same layout
+    as the drawing buffer: [[time, time, ...], [instr1, instr1, ...], ...]
+    summary(t0, t1) ... min/max of every column from the index only
+    An index entry of a chunk that wasn't completely written (e.g. after a
+    crash) is ignored.
+    """
+    def __init__(self, filename):
+        self.stem = os.path.splitext(filename)[0]
+        self.entries = []
+        with open(self.stem + INDEX, "r") as file:
+            self.header = json.loads(file.readline())
+            size = os.path.getsize(self.stem + CHUNKS) if os.path.exists(self.stem + CHUNKS) else 0
+            for line in file:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # a partial last line
+                    break
+                if entry["offset"] + sum(entry["sizes"]) > size:
+                    break
+                self.entries.append(entry)
+        self.columns = self.header["columns"]
+        self.units = self.header["units"]
+        self.start_time = self.header["start_time"]
+        # the start times of the chunks for the binary search:
+        self.starts = [entry["t0"] for entry in self.entries]
+
+    def chunks(self, t0=None, t1=None) -> list:
+        """The index entries of the chunks which have rows with t0 <= time < t1"""
+        first = 0 if t0 is None else max(0, bisect.bisect_right(self.starts, t0) - 1)
+        last = len(self.entries) if t1 is None else bisect.bisect_left(self.starts, t1)
+        return [entry for entry in self.entries[first:last]
+                if t0 is None or entry["t1"] >= t0]
+
+    def _decode(self, file, entry, indices) -> np.ndarray:
+        offsets = np.cumsum([entry["offset"]] + entry["sizes"])
+        data = np.empty((len(indices), entry["rows"]), dtype=DTYPE)
+        for row, i in enumerate(indices):
+            file.seek(offsets[i])
+            data[row] = np.frombuffer(zlib.decompress(file.read(entry["sizes"][i])), dtype=DTYPE)
+        return data
+
+    def read(self, t0=None, t1=None, columns=None) -> np.ndarray:
+        """Decompresses only the chunks (and columns) needed for the time window,
+        columns ... names of the Instruments (default: all), time comes first
+        """
+        names = self.columns[1:] if columns is None else columns
+        indices = [0] + [self.columns.index(name) for name in names]
+        entries = self.chunks(t0, t1)
+        if not entries:
+            return np.empty((len(indices), 0), dtype=DTYPE)
+        with open(self.stem + CHUNKS, "rb") as file:
+            data = np.concatenate([self._decode(file, entry, indices) for entry in entries], axis=1)
+        # cut the first and the last chunk to the window:
+        start = 0 if t0 is None else np.searchsorted(data[0], t0)
+        stop = data.shape[1] if t1 is None else np.searchsorted(data[0], t1)
+        return data[:, start:stop]
+
+    def summary(self, t0=None, t1=None) -> dict:
+        """Min/max of every column of the chunks in the time window (whole
+        chunks, nothing is decompressed) as {name: (min, max)}
+        """
+        result = {}
+        entries = self.chunks(t0, t1)
+        for i, name in enumerate(self.columns):
+            minimums = [entry["min"][i] for entry in entries if entry["min"][i] is not None]
+            maximums = [entry["max"][i] for entry in entries if entry["max"][i] is not None]
+            result[name] = (min(minimums) if minimums else None, max(maximums) if maximums else None)
+        return result
+
+    def __len__(self):
+        return sum(entry["rows"] for entry in self.entries)
+
+    def __repr__(self):
+        return "ChunkedFile<{}, columns={}, chunks={}, rows={}>".format(self.stem,
+                                                                        self.columns,
+                                                                        len(self.entries),
+                                                                        len(self))
+
+
+def load_chunked(filename) -> ChunkedFile:
+    return ChunkedFile(filename)
+
+
+if __name__ == '__main__':
+    from mywriter import FileWriter
+    writer = FileWriter()
+    writer.start()
+    sink = ChunkedSink(writer, chunk_rows=1000)
+    sink.open("chunked_test", ["FMI220", "Keithley2000"], ["N", "OHM"], time.time())
+    for i in range(10000):
+        sink.write(i * 0.1, [np.sin(i / 100), i])
+    sink.close()
+    writer.close()
+    f = load_chunked("chunked_test.idx")
+    print(f)
+    print(f.read(500.0, 500.5))
+    print(f.summary(100.0, 300.0))
+    print(os.path.getsize("chunked_test.chunks"), "bytes for", len(f) * 3 * 8, "bytes of data")
+    os.remove("chunked_test.chunks")
+    os.remove("chunked_test.idx")
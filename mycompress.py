@@ -0,0 +1,78 @@
+# --- module for reading and writing compressed text files ---
+
+import os
+import gzip
+import lzma
+import zlib
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
+
+# a text file is compressed if its name ends with one of these extensions,
+# e.g. "20200101_120000.txt.gz" or "data.csv.xz":
+# "gz" ... gzip, fast and good enough for the measurement text
+# "xz" ... lzma, a lot smaller but slower (and only readable after close())
+# -> the files are compressed/decompressed while they are written/read, there
+# is never an uncompressed copy on the disk!
+# -> appending to a compressed file adds a new stream to it, the readers read
+# all streams one after the other (so the FileWriter may close and reopen it)
+COMPRESSIONS = {"gz": gzip.open, "xz": lzma.open}
+# the FileWriter writes into "<name>.part" till a segment is complete (see
+# myrecorder module), that's still compressed like <name>:
+PART = ".part"
+# what a compressed file that was cut off (e.g. it's still written) raises:
+TRUNCATED = (EOFError, OSError, zlib.error, lzma.LZMAError)
+
+
+def compression_of(filename) -> str:
+    """Returns "gz", "xz" or "" for a file that isn't compressed"""
+    if filename.endswith(PART):
+        filename = filename[:-len(PART)]
+    extension = os.path.splitext(filename)[1].lower().lstrip(".")
+    return extension if extension in COMPRESSIONS else ""
+
+
+def with_compression(filename, compression) -> str:
+    """Appends the extension of the compression to a filename (if it doesn't
+    have it yet), compression ... "gz", "xz" or "" (nothing)
+    """
+    if not compression:
+        return filename
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown compression {}, use one of: {}".format(compression, ", ".join(COMPRESSIONS)))
+    if compression_of(filename) == compression:
+        return filename
+    return filename + "." + compression
+
+
+def open_file(filename, mode="r", compression=None):
+    """Opens a file like open() but compressed if its extension is ".gz" or
+    ".xz" (or compression is "gz" or "xz", "" -> never compressed)
+    """
+    if compression is None:
+        compression = compression_of(filename)
+    if not compression:
+        return open(filename, mode)
+    # (gzip and lzma can't read and write at once)
+    mode = mode.replace("+", "")
+    if "b" not in mode and "t" not in mode:
+        # gzip and lzma open in binary mode by default:
+        mode += "t"
+    return COMPRESSIONS[compression](filename, mode)
+
+
+def read_lines(filename, binary=False):
+    """Yields the lines of a (compressed) file while it's read, a compressed
+    file that was cut off (still written or after a crash) ends at the last
+    data that could be decompressed
+    """
+    compression = compression_of(filename)
+    with open_file(filename, "rb" if binary else "r") as file:
+        if not compression:
+            yield from file
+            return
+        try:
+            yield from file
+        except TRUNCATED as e:
+            logger.warning("%s ends early: %s", filename, e)
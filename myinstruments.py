@@ -2,6 +2,13 @@
 import minimalmodbus
 import serial
 import visa
+# for the non-blocking measurements of serial instruments:
+import asyncio
+# every module logs with its own logger (see mylog module), the measured
+# values are logged with the DEBUG level only:
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 # --- abstract class which we want all innstrument classes to inherite ---
@@ -19,6 +26,10 @@ class Instrument():
     ...override it only if the Instrument is connected to some sort of a port
     that is named and it will make sense for the user to change this name
     e.g. a serial port of an Instrument could be named COM6 on one PC and COM7 on another
+    -> the measure_async coroutine
+    ...implement it if the Instrument can wait for its response without blocking
+    (e.g. serial instruments, see read_serial_async), the asyncio engine then
+    uses it directly, otherwise measure() is called on a worker thread
     """
     # of cause we want the Instrument to measure something!
     def measure(self) -> float:
@@ -45,6 +56,35 @@ class Instrument():
         raise NotImplementedError("No method: get_labels() implemented!")
 
 
+# --- helper for the asyncio acquisition (see myasync module) ---
+
+async def read_serial_async(port, size=None, terminator=None, timeout=None, poll=0.001):
+    """Reads from a serial.Serial port without blocking the event loop: only
+    the bytes already waiting in the input buffer are read, in between we
+    await asyncio.sleep(poll) so other instruments can do their work!
+    Returns as soon as <size> bytes or the <terminator> arrived (the terminator
+    is part of the returned bytes), raises TimeoutError after <timeout> seconds
+    (default: the timeout of the serial port)
+    """
+    loop = asyncio.get_running_loop()
+    if timeout is None:
+        timeout = port.timeout
+    deadline = None if timeout is None else loop.time() + timeout
+    data = bytearray()
+    while True:
+        waiting = port.in_waiting
+        if waiting:
+            # this won't block since the bytes are already there:
+            data += port.read(waiting)
+        if size is not None and len(data) >= size:
+            return bytes(data[:size])
+        if terminator is not None and terminator in data:
+            return bytes(data[:data.index(terminator) + len(terminator)])
+        if deadline is not None and loop.time() > deadline:
+            raise TimeoutError("No complete response from serial port {} after {}s".format(port.port, timeout))
+        await asyncio.sleep(poll)
+
+
 # --- custom instruments ---
 
 class LightSwitch(Instrument):
@@ -62,24 +102,24 @@ class LightSwitch(Instrument):
                                     bytesize=serial.EIGHTBITS,
                                     parity=serial.PARITY_NONE,
                                     stopbits=serial.STOPBITS_ONE)
-        print(f"{self.__class__.__name__} has been successfully initialized!\n{self.serial}")
+        logger.info("%s has been successfully initialized!\n%s", self.__class__.__name__, self.serial)
 
     def has_port_settings():
         return True
 
     def open(self):
-        print("Opening connection of:", self.__class__.__name__, "again...")
+        logger.info("Opening connection of: %s again...", self.__class__.__name__)
         self.serial.open()
         if self.serial.is_open:
-            print("Connection of instrument:", self.__class__.__name__, " has been opened!")
+            logger.info("Connection of instrument: %s has been opened!", self.__class__.__name__)
         else:
             raise IOError("Failed to open connection of instrument:", self.__class__.__name__)
 
     def close(self):
-        print("Closing connection of:", self.__class__.__name__)
+        logger.info("Closing connection of: %s", self.__class__.__name__)
         self.serial.close()
         if not self.serial.is_open:
-            print("Connection of instrument:", self.__class__.__name__, " has been closed!")
+            logger.info("Connection of instrument: %s has been closed!", self.__class__.__name__)
         else:
             raise IOError("Failed to close connection of instrument:", self.__class__.__name__)
 
@@ -88,9 +128,18 @@ class LightSwitch(Instrument):
         # wait till all data is written:
         self.serial.flush()
         msg = self.serial.readline().decode("ascii")
-        print(f"{self.__class__.__name__}: {msg}")
+        logger.debug("%s: %s", self.__class__.__name__, msg)
         return float(msg)
 
+    async def measure_async(self) -> float:
+        # same as measure() but the event loop isn't blocked while we wait
+        # for the response of the Arduino, a late response to a request that
+        # timed out must not be read as the response to this one:
+        self.serial.reset_input_buffer()
+        self.serial.write(("R\n").encode("ascii"))
+        msg = (await read_serial_async(self.serial, terminator=b"\n")).decode("ascii")
+        logger.debug("%s: %s", self.__class__.__name__, msg)
+        return float(msg)
 
     def get_labels() -> str:
         # the first is for the axis label, the second for the legend label:
@@ -106,35 +155,35 @@ class Eurotherm2416(minimalmodbus.Instrument, Instrument):
         # with the baudrate constant of the module so we need to set this:
         minimalmodbus.BAUDRATE = baudrate
 
-        print("Starting", self.__class__.__name__, "initialization...")
+        logger.info("Starting %s initialization...", self.__class__.__name__)
         # 1 is the slaveadress (1 to 247)
         minimalmodbus.Instrument.__init__(self, port, 1)
 
         # check the instrument properties, this will
         # call __repr__ of minimalmodbus.Instrument:
-        print(self)
-        print("Finished", self.__class__.__name__, "initialization...")
+        logger.info("%s", self)
+        logger.info("Finished %s initialization...", self.__class__.__name__)
 
     def has_port_settings():
         return True
 
     def open(self):
-        print("Opening connection of:", self.__class__.__name__, "again...")
+        logger.info("Opening connection of: %s again...", self.__class__.__name__)
         # in minimalmodbus.Instrument.__init__(self, port, 1) we create a Serial object:
         # self.serial = serial.Serial(port=port, baudrate=BAUDRATE, parity=PARITY,
         # bytesize=BYTESIZE, stopbits=STOPBITS, timeout=TIMEOUT)
         # so let's open this connection here again:
         self.serial.open()
         if self.serial.is_open:
-            print("Connection of instrument:", self.__class__.__name__, " has been opened!")
+            logger.info("Connection of instrument: %s has been opened!", self.__class__.__name__)
         else:
             raise IOError("Failed to open connection of instrument:", self.__class__.__name__)
 
     def close(self):
-        print("Closing connection of:", self.__class__.__name__)
+        logger.info("Closing connection of: %s", self.__class__.__name__)
         self.serial.close()
         if not self.serial.is_open:
-            print("Connection of instrument:", self.__class__.__name__, " has been closed!")
+            logger.info("Connection of instrument: %s has been closed!", self.__class__.__name__)
         else:
             raise IOError("Failed to close connection of instrument:", self.__class__.__name__)
 
@@ -147,7 +196,7 @@ class Eurotherm2416(minimalmodbus.Instrument, Instrument):
         # then use numberOfDecimals=1 which will divide the received data
         # by 10 before returning the value
         temp = self.read_register(289, 1)
-        print(self.__class__.__name__, "response:", temp)
+        logger.debug("%s response: %s", self.__class__.__name__, temp)
         return temp
 
     def get_labels() -> str:
@@ -173,31 +222,31 @@ class FMI220(Instrument):
                                     parity=serial.PARITY_NONE,
                                     stopbits=serial.STOPBITS_ONE)
 
-        print("Starting FMI220 initialization...")
+        logger.info("Starting FMI220 initialization...")
         # check instrument properties by calling __repr__ implicitly:
-        print(self)
+        logger.info("%s", self)
         # for further information see most command command list above
         self.query("AD")
         self.query("AG")
         self.query("AA")
-        print("Finished FMI220 initialization...")
+        logger.info("Finished FMI220 initialization...")
 
     def has_port_settings():
         return True
 
     def open(self):
-        print("Opening connection of:", self.__class__.__name__, "again...")
+        logger.info("Opening connection of: %s again...", self.__class__.__name__)
         self.serial.open()
         if self.serial.is_open:
-            print("Connection of instrument:", self.__class__.__name__, " has been opened!")
+            logger.info("Connection of instrument: %s has been opened!", self.__class__.__name__)
         else:
             raise IOError("Failed to open connection of instrument:", self.__class__.__name__)
 
     def close(self):
-        print("Closing connection of:", self.__class__.__name__)
+        logger.info("Closing connection of: %s", self.__class__.__name__)
         self.serial.close()
         if not self.serial.is_open:
-            print("Connection of instrument:", self.__class__.__name__, " has been closed!")
+            logger.info("Connection of instrument: %s has been closed!", self.__class__.__name__)
         else:
             raise IOError("Failed to close connection of instrument:", self.__class__.__name__)
 
@@ -218,14 +267,25 @@ class FMI220(Instrument):
         else:
             # change settings:
             msg = self.serial.read(size=3).decode("ascii")
-            print("FMI220 query response:", msg)
+            logger.debug("FMI220 query response: %s", msg)
         return msg
 
     def measure(self) -> float:
             force = float(self.query("BA"))
-            print("FMI220 response:", force)
+            logger.debug("FMI220 response: %s", force)
             return force
 
+    async def measure_async(self) -> float:
+        # same as measure() but the event loop isn't blocked while we wait
+        # for the response of the instrument:
+        self.serial.reset_input_buffer()
+        self.serial.write(("BA" + "\r").encode("ascii"))
+        # one shot measurement:
+        msg = (await read_serial_async(self.serial, size=12)).decode("ascii").replace("\r","")[4:]
+        force = float(msg)
+        logger.debug("FMI220 response: %s", force)
+        return force
+
     def get_labels() -> str:
         return ("Force in N", "Force")
 
@@ -242,7 +302,7 @@ class Keithley2000(Instrument):
         # a session!
         self.gpib = None
         self.function = function
-        print("Starting Keithley2000 initialization...")
+        logger.info("Starting Keithley2000 initialization...")
         self.open_gpib_connection()
 
         if self.function == Keithley2000.RESISTANCE:
@@ -256,21 +316,20 @@ class Keithley2000(Instrument):
         else:
             raise ValueError("Function number not supported!")
 
-        print("Keithley2000 info:", self.gpib.query('*IDN?'))
-        print("Initialize Keithley2000 with code:")
-        print(init_code)
+        logger.info("Keithley2000 info: %s", self.gpib.query('*IDN?'))
+        logger.info("Initialize Keithley2000 with code: %s", init_code)
 
         for command in init_code:
             self.gpib.write(command)
 
-        print("Check measurement properties on Keithley2000:")
+        logger.info("Check measurement properties on Keithley2000:")
         if self.function == Keithley2000.RESISTANCE:
-            print("Range auto:", self.gpib.query("fresistance:range:auto?"))
-            print("Cycles:", self.gpib.query("fresistance:nplcycles?"))
+            logger.info("Range auto: %s", self.gpib.query("fresistance:range:auto?"))
+            logger.info("Cycles: %s", self.gpib.query("fresistance:nplcycles?"))
         elif self.function == Keithley2000.VOLTAGE:
             pass
 
-        print("Finished Keithley2000 initialization...")
+        logger.info("Finished Keithley2000 initialization...")
 
     def open_gpib_connection(self):
         rm = visa.ResourceManager()
@@ -278,23 +337,23 @@ class Keithley2000(Instrument):
 
         for resource in resource_list:
             if "GPIB" in resource:
-                print("Trying to open gpib connection...", resource)
+                logger.info("Trying to open gpib connection... %s", resource)
                 self.gpib = rm.open_resource(resource)
 
         if self.gpib == None:
             raise RuntimeError("No gpib connection found!")
 
     def open(self):
-        print("Opening connection of:", self.__class__.__name__, "again...")
+        logger.info("Opening connection of: %s again...", self.__class__.__name__)
         self.gpib.open()
-        print("Connection of instrument:", self.__class__.__name__, " has been opened!")
-        print(self.gpib.resource_info)
+        logger.info("Connection of instrument: %s has been opened!", self.__class__.__name__)
+        logger.info("%s", self.gpib.resource_info)
 
 
     def close(self):
-        print("Closing connection of:", self.__class__.__name__)
+        logger.info("Closing connection of: %s", self.__class__.__name__)
         self.gpib.close()
-        print("Connection of instrument:", self.__class__.__name__, " has been closed!")
+        logger.info("Connection of instrument: %s has been closed!", self.__class__.__name__)
 
     def measure(self) -> float:
         if self.function == Keithley2000.RESISTANCE:
@@ -302,7 +361,7 @@ class Keithley2000(Instrument):
         elif self.function == Keithley2000.VOLTAGE:
             pass
 
-        print("Keithley2000 response:", response)
+        logger.debug("Keithley2000 response: %s", response)
         return response
 
     # a function to get the string label which should be used for plotting data
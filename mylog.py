@@ -0,0 +1,111 @@
+# --- module for the logging of the measurement application ---
+
+import logging
+import logging.handlers
+import collections
+import queue
+import sys
+
+# every module gets its own logger with: logger = logging.getLogger(__name__)
+# so the level can be set for each module, e.g. to see every measured value
+# of the Instruments only:
+# logging.getLogger("myinstruments").setLevel(logging.DEBUG)
+#
+# note: on the hot path (every measurement, every frame) only logger.debug()
+# with %-style arguments is used, e.g. logger.debug("value: %s", value) and
+# NOT logger.debug("value: {}".format(value)) -> if debug output is off the
+# call returns right after the level check, the message is never formatted!
+
+# the format of the records, every record knows its time, level, module
+# (logger name) and thread:
+FORMAT = "%(asctime)s %(levelname)-7s %(name)s [%(threadName)s] %(message)s"
+
+# the level used if nothing else is set:
+DEFAULT_LEVEL = logging.INFO
+
+
+class RingHandler(logging.Handler):
+    """Keeps the most recent <capacity> records in memory, so the last
+    messages can be looked at (e.g. shown in the GUI or dumped after an error)
+    even if nothing is written to the console!
+    """
+    def __init__(self, capacity=1000):
+        logging.Handler.__init__(self)
+        # a deque with maxlen drops the oldest record on its own:
+        self.records = collections.deque(maxlen=capacity)
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def recent(self, n=None, level=logging.NOTSET) -> list:
+        """Returns the last n records (all if n is None) with at least the given level"""
+        with self.lock:
+            records = [record for record in self.records if record.levelno >= level]
+        return records if n is None else records[-n:]
+
+
+# created by setup_logging():
+_ring = None
+_listener = None
+
+
+def setup_logging(level=DEFAULT_LEVEL, capacity=1000, stream=None):
+    """Sets up the logging of the application:
+
+    logger.xyz(...) -> QueueHandler -> queue -> QueueListener thread -> console
+                                                                     -> RingHandler
+
+    The threads which log only put the record into a queue, the slow writing to
+    the console happens on the thread of the QueueListener, so a measurement
+    never waits for the console! Calling it again just changes the level.
+    level ... the level of the root logger (e.g. logging.DEBUG for everything)
+    capacity ... number of recent records kept in memory (see recent_records)
+    stream ... where the records are written to (default: sys.stdout)
+    """
+    global _ring, _listener
+    root = logging.getLogger()
+    root.setLevel(level)
+    if _listener is not None:
+        return _listener
+
+    _ring = RingHandler(capacity)
+    console = logging.StreamHandler(sys.stdout if stream is None else stream)
+    console.setFormatter(logging.Formatter(FORMAT))
+    records = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(records, console, _ring, respect_handler_level=True)
+    _listener.start()
+    root.addHandler(logging.handlers.QueueHandler(records))
+    return _listener
+
+
+def shutdown_logging():
+    """Writes out the records still in the queue and stops the QueueListener"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def recent_records(n=None, level=logging.NOTSET) -> list:
+    """Returns the last n logged messages as formatted lines (see RingHandler)"""
+    if _ring is None:
+        return []
+    formatter = logging.Formatter(FORMAT)
+    return [formatter.format(record) for record in _ring.recent(n, level)]
+
+
+def set_level(level, module=None):
+    """Sets the level of a module's logger (or of all loggers if module is None),
+    the level can be a number or a name like "DEBUG"
+    """
+    logging.getLogger(module).setLevel(level)
+
+
+if __name__ == '__main__':
+    setup_logging(logging.INFO)
+    logger = logging.getLogger("demo")
+    logger.debug("not shown and not formatted: %s", list(range(10)))
+    logger.info("measurement started")
+    logger.warning("Instrument %s failed %d times", "FMI220", 3)
+    shutdown_logging()
+    print(recent_records())
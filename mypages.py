@@ -11,11 +11,44 @@ from myutils import *
 import multiprocessing
 import threading
 from tkinter import messagebox
+from tkinter import filedialog
 from myinstruments import *
 from mythreads import *
+from myscheduler import OVERRUN_POLICIES, SKIP
+from myasync import AsyncAcquisitionThread
+from myprocesses import ProcessAcquisitionThread
+from myalign import POLICIES, NEAREST
+from mybinary import BinarySink
+from mychunks import ChunkedSink
+from mysqlite import SQLiteSink
+from mycompress import COMPRESSIONS
+# the health states of the Instruments shown on the MeasurementPage:
+from mysupervisor import HEALTHY, OPEN
 # for retrieving all the classes of the myinstruments module:
 import sys, inspect
 import time
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the acquisition engines the MeasurementPage can use:
+# "threads" ... one MeasurementThread per Instrument
+# "multiplexed" ... one MultiplexThread drives all Instruments with a pool of workers
+# "asyncio" ... one AsyncAcquisitionThread drives all Instruments with an event loop
+# "processes" ... one worker process per Instrument, supervised by a ProcessAcquisitionThread
+THREADS = "threads"
+MULTIPLEXED = "multiplexed"
+ASYNCIO = "asyncio"
+PROCESSES = "processes"
+ENGINES = (THREADS, MULTIPLEXED, ASYNCIO, PROCESSES)
+
+# the recordings the MeasurementPage can do besides the text file of the
+# Terminal, the "Recording" setting is a comma separated list of these names:
+# "binary" ... fixed-size float64 records with a header, see mybinary module
+# "chunks" ... compressed chunks of columns with an index, see mychunks module
+# "sqlite" ... rows of a SQLite database with a time index, see mysqlite module
+RECORDINGS = {"binary": BinarySink, "chunks": ChunkedSink, "sqlite": SQLiteSink}
 
 
 class GraphPage(Frame):
@@ -56,6 +89,13 @@ class GraphPage(Frame):
         # and one to show the graph when the Instruments are selected:
         self.show_btn = Button(master=self, text="Show graph", command=self.show_page)
         self.show_btn.pack()
+        # a time window of a binary or chunked recording can be plotted too
+        # (from/to in seconds since the start, empty -> from the start/to the end):
+        self.recording_btn = Button(master=self, text="Plot recording", command=self.plot_recording)
+        self.t0_label = Label(master=self, text="From (s):")
+        self.t0_entry = Entry(master=self, width=8)
+        self.t1_label = Label(master=self, text="To (s):")
+        self.t1_entry = Entry(master=self, width=8)
 
     def update(self):
         self.graph.update()
@@ -63,6 +103,23 @@ class GraphPage(Frame):
     def clear(self):
         self.graph.clear()
 
+    def plot_recording(self):
+        """Asks for a recording and plots the time window of the entries"""
+        filename = filedialog.askopenfilename(title="Select recording",
+                                              filetypes=(("recordings", "*.bin *.idx *.chunks"),
+                                                         ("all files", "*.*")))
+        if not filename:
+            return
+        try:
+            t0 = float(self.t0_entry.get()) if self.t0_entry.get().strip() else None
+            t1 = float(self.t1_entry.get()) if self.t1_entry.get().strip() else None
+            # only the chunks of the time window are read (see mychunks module):
+            self.graph.plot_recording(open_recording(filename), t0, t1)
+        except Exception as e:
+            logger.exception("Couldn't plot %s", filename)
+            messagebox.showerror("Couldn't plot the recording!",
+                                 "Error message:\n{}".format(e))
+
     def show_page(self):
         # get rid of the show button:
         self.show_btn.pack_forget()
@@ -76,6 +133,11 @@ class GraphPage(Frame):
                                 self.class_info)
         self.update_btn.pack(side=LEFT)
         self.clear_btn.pack(side=LEFT)
+        self.recording_btn.pack(side=LEFT)
+        self.t0_label.pack(side=LEFT)
+        self.t0_entry.pack(side=LEFT)
+        self.t1_label.pack(side=LEFT)
+        self.t1_entry.pack(side=LEFT)
         self.hint.pack(side=LEFT)
 
 class MeasurementPage(Frame):
@@ -87,80 +149,43 @@ class MeasurementPage(Frame):
     showing the data directly in the measurement page!
     """
     def error_routine(self, sender, earg):
-        """If a measurement of a thread fails multiple times we close the Instrument's
-        connection and open it again!... then starting a new MeasurementThread!
-
-        If one thread has a problem to get data from an Instrument and calling
-        the measure() method of that Instrument multiple times still doesn't work
-        we restart the Instruments connection and let all the other threads go
-        into idle mode,... then creating a new MeasurementThread with the same
-        properties as the old one! We clear all the fifo buffers too because the
-        data in them is incomplete and then we can finally let all the threads leave
-        the idle mode and the newly created MeasurementThread can be started!
-
-        --> this error routine should work for arbitrary Instruments asuming
-        that the measurement has worked in the first place! (connection errors
-        can happen from time to time, normally for short measurements they won't
-        even occur, one has to be very unlucky... but for longer measurements
-        such routine is totally necessary!)
+        """Called whenever the health of an Instrument's connection changes
+        (earg is the InstrumentHealth object, see mysupervisor module)!
+
+        The engines take care of a failing Instrument by themselves: after more
+        than noe failed measurements in a row only the connection of that
+        Instrument is restarted (with growing delays between the attempts and a
+        circuit breaker if it doesn't come back), a gap marker (NaN) is put
+        into its data and all the other Instruments keep on measuring! So here
+        we only keep track of the states, the health label shows them to the
+        user (see show_health, this is called by the measurement threads).
         """
-        print("Handle the error from:", sender)
-        # the earg (event argument) is a tuple of all parameters the MeasurementThread
-        # has got!
-        name, interval, count, instrument, noe, fifo, error_routine = earg
-        # close the Instrument's connection:
-        instrument.close()
-        # let all the currently running threads go into idle mode:
-        # (this has no effect on the thread which fired the error event
-        # since this thread has been stopped already)
-        self.threads_lock.acquire()
-        for thread in self.threads:
-            thread.wait()
-        self.threads_lock.release()
-
-        # open the Instrument's connection:
-        instrument.open()
-        # sender is the Thread object that fired an error_event!
-        # and MeasurementPage.threads is a list of all currently running thread objects
-        # so we need to swap the old thread object with the new one!
-        old = sender
-        new = MeasurementThread(name,
-                                interval,
-                                count,
-                                instrument,
-                                noe,
-                                fifo,
-                                error_routine)
-
-        # update the list of currently used thread objects:
-        # but do that in synchronized way:
-        self.threads_lock.acquire()
-        print("Before:", self.threads)
-        swap(self.threads, old, new)
-        print("After:", self.threads)
-
-        # before we start again, clear all the fifo buffers since the values
-        # aren't complete:
-        print("Clearing the buffered data of all fifos...")
-        for fifo in self.fifos:
-            fifo.clear_data()
-
-        for thread in self.threads:
-            # leave idle mode and go again!
-            # (this call has no effect on the newly created threads since
-            # the threads are on creation set to the "go" mode)
-            thread.go()
-        self.threads_lock.release()
-
-        # if the stop button should have been pressed while we were in the error
-        # routine we don't need to start the new thread:
-        if self.stop_btn_pressed:
-            print("Stopp button pressed during error routine, new thread won't be started!")
-            return
-        # finally start the new MeasurementThread:
-        new.start()
-        print("Error handled, normal mode of operation restored!")
+        logger.info("Health of %s reported by %s is now: %s", earg.name, sender, earg.state)
+        self.health_states[earg.name] = earg.state
 
+    def show_health(self, interval_ms=500):
+        """Shows the Instruments that aren't healthy in the health label, runs
+        on the GUI thread every interval_ms milliseconds
+        """
+        states = dict(self.health_states)
+        failing = ["{}: {}".format(name, state) for name, state in states.items() if state != HEALTHY]
+        if failing:
+            # red if a circuit breaker is open, the Instrument is given up for a while:
+            color = "red" if OPEN in states.values() else "orange"
+            text = ", ".join(failing)
+        elif states:
+            color, text = "green", "All Instruments healthy"
+        else:
+            color, text = "black", "Shows Instrument health here"
+        if self.health_label.cget("text") != text:
+            self.health_label.config(text=text, bg=color, fg="white" if color in ("red", "black") else "black")
+        self.after(interval_ms, self.show_health, interval_ms)
+
+    def health_changed(self, sender):
+        """The on_change callback of an InstrumentHealth object for the engines
+        that handle all Instruments in one thread, forwards to the error_routine
+        """
+        return lambda health, old: self.error_routine(sender, health)
 
     def __init__(self, parent, buffer, class_info, *args, **kwargs):
         """The buffer and class_info is used for communication between the
@@ -180,15 +205,19 @@ class MeasurementPage(Frame):
 
         # a list of measurement instruments, will be appended later:
         self.instruments = []
+        # the keyword arguments used to create them:
+        self.instrument_kwargs = []
 
         # later append the threads for automated measurement in the threads list:
         self.threads = []
-        # in the error_routine if 2 threads try to access the self.threads list
-        # we need to synchronize this access
+        # if 2 threads try to access the self.threads list (e.g. the stop
+        # button and the measurement) we need to synchronize this access
         self.threads_lock = multiprocessing.Lock()
 
         # FIFO(First In First Out) buffers for temporaly storing measured data:
         self.fifos = []
+        # the last reported health state of every Instrument (see error_routine):
+        self.health_states = {}
 
         # reference time at which we started the measurement:
         self.start_time = None
@@ -203,10 +232,10 @@ class MeasurementPage(Frame):
             if name == "Instrument":
                 continue
             all_available_classes.append(cls)
-        print("All available Instruments are:")
-        print(all_available_classes)
+        logger.info("All available Instruments are: %s", all_available_classes)
 
-        measurement_labels = ["Interval", "Count", "Number of errors", "Fps"]
+        measurement_labels = ["Interval", "Count", "Number of errors", "Fps", "Overrun", "Engine",
+                              "Alignment", "Tolerance", "Recording", "Compression"]
         self.settingsbox1 = SettingsBox(self, measurement_labels, "Settings for the threads:")
         self.settingsbox1.grid(row=2, column=1, columnspan=1, sticky=N+E+S+W)
 
@@ -270,7 +299,14 @@ class MeasurementPage(Frame):
                                         text="Shows thread status here",
                                         bg="black", fg="white")
         self.thread_state_label.pack(side="left")
+
+        # the health of the Instrument connections (see error_routine):
+        self.health_label = Label(master=combine_frame,
+                                  text="Shows Instrument health here",
+                                  bg="black", fg="white")
+        self.health_label.pack(side="left")
         combine_frame.grid(row=4, column=3, sticky=W)
+        self.after(500, self.show_health)
 
 
         self.port_btn = Button(master=self,
@@ -283,10 +319,25 @@ class MeasurementPage(Frame):
         self.terminal_label = Label(self, text="Measurement terminal")
         self.terminal_label.grid(row=1, column=3, sticky=N+E+S+W)
 
-    def init_measurement(self, interval=1, count=100000, noe=3, fps=10):
+    def init_measurement(self, interval=1, count=100000, noe=3, fps=10, overrun=SKIP,
+                         engine=THREADS, workers=4, alignment=NEAREST, tolerance=None, recording="",
+                         compression=""):
         """Parameters: doing <count> measurements every <interval> seconds
-        noe ... number of errors that can occur before the error_routine is started
+        noe ... number of errors in a row that can occur before the connection
+        of an Instrument is restarted (see mysupervisor module)
         fps ... frames per second we want the screen to try to update with new values
+        overrun ... what to do if a measurement took longer than the interval:
+        "skip", "catch up" or "shift" (see myscheduler module)
+        engine ... "threads", "multiplexed", "asyncio" or "processes" (see ENGINES above)
+        workers ... number of worker threads of the "multiplexed" and "asyncio" engine
+        alignment ... how the samples of the Instruments are put together into
+        rows every <interval> seconds: "nearest", "hold" or "linear"
+        tolerance ... maximum time in seconds between a row and the samples
+        used for it (default: interval), see myalign module
+        recording ... comma separated names of the RECORDINGS to do besides the
+        text file, e.g. "binary" (empty -> only the text file)
+        compression ... "gz" or "xz" to compress the text file while it's
+        written (see mycompress module), empty -> plain text
         (see mythreads module for further information)
         """
         # reset the flag:
@@ -314,6 +365,24 @@ class MeasurementPage(Frame):
                 count = float(settings.get("Count", count))
                 noe = int(settings.get("Number of errors", noe))
                 fps = int(settings.get("Fps", fps))
+                overrun = settings.get("Overrun", overrun).strip().lower()
+                if overrun not in OVERRUN_POLICIES:
+                    raise ValueError("Overrun must be one of: {}".format(", ".join(OVERRUN_POLICIES)))
+                engine = settings.get("Engine", engine).strip().lower()
+                if engine not in ENGINES:
+                    raise ValueError("Engine must be one of: {}".format(", ".join(ENGINES)))
+                alignment = settings.get("Alignment", alignment).strip().lower()
+                if alignment not in POLICIES:
+                    raise ValueError("Alignment must be one of: {}".format(", ".join(POLICIES)))
+                if "Tolerance" in settings:
+                    tolerance = float(settings["Tolerance"])
+                recording = settings.get("Recording", recording).strip().lower()
+                for name in filter(None, (name.strip() for name in recording.split(","))):
+                    if name not in RECORDINGS:
+                        raise ValueError("Recording must be a list of: {}".format(", ".join(RECORDINGS)))
+                compression = settings.get("Compression", compression).strip().lower().lstrip(".")
+                if compression and compression not in COMPRESSIONS:
+                    raise ValueError("Compression must be one of: {}".format(", ".join(COMPRESSIONS)))
             except Exception as e:
                 messagebox.showerror("Couldn't set the thread settings!",
                                      "Error message:\n{}".format(e))
@@ -321,11 +390,11 @@ class MeasurementPage(Frame):
 
         # in any case (thread settings set in GUI or not -> use default ones) show
         # what thread settings will be used:
-        print("--- thread settings ---")
-        print("Interval:", interval,
-              "Count:", count,
-              "Number of errors:", noe,
-              "Fps:", fps)
+        logger.info("--- thread settings --- Interval: %s Count: %s Number of errors: %s Fps: %s "
+                    "Overrun: %s Engine: %s Alignment: %s Tolerance: %s Recording: %s Compression: %s",
+                    interval, count, noe, fps, overrun, engine, alignment, tolerance, recording, compression)
+        # the next save file of the Terminal:
+        self.terminal.recorder.compression = compression
 
         # now settings is a dict with the port names as values and
         # keys like: Eurotherm2416 port -> Instrument name in key!
@@ -346,13 +415,18 @@ class MeasurementPage(Frame):
                 # use default port settings if the dictionary hasn't the
                 # given key in it (that's the case if the entry was left empty):
                 if cls.has_port_settings() and settings != None:
-                    temp = cls(port=settings.get(cls.__name__ + " port", None))
+                    kwargs = {"port": settings.get(cls.__name__ + " port", None)}
                 else:
                     # this is used for Instrument classes where it makes no sense
                     # to use port settings, e.g. the Keithley2000 is connected over
                     # GPIB and it is the only Instrument with GPIB so it simply searches
                     # for an Ni Visa resource with GPIB in it
-                    temp = cls()
+                    kwargs = {}
+                # with the "processes" engine only the worker processes
+                # create the Instrument objects (else the port would be
+                # opened here and in the worker):
+                if engine != PROCESSES:
+                    self.instruments.append(cls(**kwargs))
             except Exception as e:
                 messagebox.showerror("Instrument initialization error!",
                                      "Error message:\n{}".format(e))
@@ -365,31 +439,75 @@ class MeasurementPage(Frame):
                 self.stop_btn.config(state=NORMAL)
                 return
 
-            # and then append the instrument objects to the instruments list:
-            self.instruments.append(temp)
+            # the worker processes of the "processes" engine create their
+            # objects with these arguments:
+            self.instrument_kwargs.append(kwargs)
             # for each instrument we want to have a FIFO data buffer:
             self.fifos.append(Fifo())
             # and for each instrument we need a MeasurementThread:
-            self.threads.append(MeasurementThread(self.instruments[-1].__class__.__name__,
-                                                  interval,
-                                                  count,
-                                                  self.instruments[-1],
-                                                  noe,
-                                                  self.fifos[-1],
-                                                  self.error_routine))
+            if engine == THREADS:
+                self.threads.append(MeasurementThread(self.instruments[-1].__class__.__name__,
+                                                      interval,
+                                                      count,
+                                                      self.instruments[-1],
+                                                      noe,
+                                                      self.fifos[-1],
+                                                      self.error_routine,
+                                                      overrun))
+
+        # ...or one MultiplexThread/AsyncAcquisitionThread/ProcessAcquisitionThread
+        # for all of them:
+        # (they report the health of the connections to the error_routine too)
+        if engine == MULTIPLEXED:
+            self.threads.append(MultiplexThread(interval,
+                                                count,
+                                                self.instruments,
+                                                noe,
+                                                self.fifos,
+                                                overrun,
+                                                workers,
+                                                on_change=self.health_changed(engine)))
+        elif engine == ASYNCIO:
+            self.threads.append(AsyncAcquisitionThread(interval,
+                                                       count,
+                                                       self.instruments,
+                                                       noe,
+                                                       self.fifos,
+                                                       overrun,
+                                                       workers,
+                                                       on_change=self.health_changed(engine)))
+        elif engine == PROCESSES:
+            self.threads.append(ProcessAcquisitionThread(interval,
+                                                         count,
+                                                         list(self.classes),
+                                                         self.instrument_kwargs,
+                                                         noe,
+                                                         self.fifos,
+                                                         overrun,
+                                                         on_change=self.health_changed(engine)))
+
+        # the drawing buffer needs one column for each Instrument:
+        self.buffer.configure(len(self.classes))
 
         # create an UpdateThread to update the terminal and the save file
         # with the new measured data:
         self.threads.append(UpdateThread(fps,
                                          self.terminal,
                                          self.fifos,
-                                         self.instruments,
-                                         self.buffer))
+                                         list(self.classes),
+                                         self.buffer,
+                                         interval,
+                                         alignment,
+                                         tolerance,
+                                         sinks=self.create_sinks(recording)))
 
         # update the status of initialization:
         self.status_label.config(text="Finished initialization", bg="green", fg="white")
         # enable all measurement related button:
-        self.measurement_btn.config(state=NORMAL)
+        # (a single measurement needs the Instrument objects, with the
+        # "processes" engine they are in the worker processes)
+        if engine != PROCESSES:
+            self.measurement_btn.config(state=NORMAL)
         self.auto_measure_btn.config(state=NORMAL)
         self.stop_btn.config(state=NORMAL)
         # and disable the initialization button:
@@ -399,6 +517,13 @@ class MeasurementPage(Frame):
         # (will be enabled in stop method when stop button pushed!)
         self.apply_btn.config(state=DISABLED)
 
+    def create_sinks(self, recording) -> list:
+        """Creates the sinks for the comma separated names of RECORDINGS, they
+        write their files with the FileWriter of the Terminal
+        """
+        names = filter(None, (name.strip() for name in recording.split(",")))
+        return [RECORDINGS[name](self.terminal.writer) for name in names]
+
     def apply(self):
         """Uses the current Instrument selection for upcomming initialization!"""
         # clear the Instrument class list:
@@ -409,8 +534,7 @@ class MeasurementPage(Frame):
 
         # this classes will be used in the init_measurement method!
         self.classes.extend(self.checkbuttons.get_selected_classes())
-        print("Following classes were selected:")
-        print(self.classes)
+        logger.info("Following classes were selected: %s", self.classes)
 
 
     def atomated_measurement(self):
@@ -463,12 +587,12 @@ class MeasurementPage(Frame):
             # save that to the shared FIFO buffer for drawing on the graph
             # (shared between this page and the GraphPage)
             self.buffer.push(bundle)
-            print("Data bundle sent to GraphPage:", bundle)
+            logger.debug("Data bundle sent to GraphPage: %s", bundle)
 
             # show the measured data in the terminal and save it to a file:
             self.terminal.update(msg)
-        except Exception as e:
-            print(e)
+        except Exception:
+            logger.exception("Single measurement failed")
 
     def stop(self):
         """Stops the automated measurement manually and clears the Terminal screen,
@@ -493,7 +617,7 @@ class MeasurementPage(Frame):
         # and enable the apply button again to select different Instruments:
         self.apply_btn.config(state=NORMAL)
         # clear terminal:
-        self.terminal.delete(1.0, END)
+        self.terminal.clear()
         # reset status label:
         self.status_label.config(text="Not initialized", bg="red", fg="white")
         # resest the start time:
@@ -516,22 +640,37 @@ class MeasurementPage(Frame):
 
         # here we can wait till threads have stopped and meanwhile we aren't
         # blocking the GUI so we can prepare our settings for the next run
-        def wait_for_thread_join(label):
+        # (the threads wake up immediately on stop(), only a measurement that is
+        # in progress has to finish, so we wait at most join_timeout seconds)
+        def wait_for_thread_join(label, threads, join_timeout=5.0):
             threads_even_started = True
-            self.threads_lock.acquire()
+            still_running = []
+            deadline = time.perf_counter() + join_timeout
             # wait till they are really closed
-            for thread in self.threads:
-                # try block so if we didn't started the threads we will get an
-                # error here like: can't join thread which never started
-                try:
-                    thread.join()
-                except Exception as e:
-                    print(e)
+            for thread in threads:
+                # if we didn't started the threads there is nothing to join:
+                if thread.ident is None:
                     threads_even_started = False
+                    continue
+                thread.join(max(0, deadline - time.perf_counter()))
+                if thread.is_alive():
+                    still_running.append(thread)
+
+            # the last segment of the save file is complete now (only if it's
+            # still the recording of this run, a new run could have started
+            # meanwhile):
+            self.terminal.recorder.stop(generation)
+            # the last lines of the run should be on the disk now:
+            if not self.terminal.writer.flush(join_timeout):
+                logger.warning("The save file isn't written completely yet: %s", self.terminal.writer.stats)
+            logger.info("%s", self.terminal.writer.stats)
 
-            self.threads_lock.release()
             # change the thread status label accordingly:
-            if threads_even_started:
+            if still_running:
+                logger.warning("Threads still running after %ss: %s", join_timeout, still_running)
+                label.config(text="{} thread(s) still busy!".format(len(still_running)),
+                             bg="orange", fg="black")
+            elif threads_even_started:
                 label.config(text="Threads have stopped!",
                              bg="red", fg="white")
             else:
@@ -539,13 +678,21 @@ class MeasurementPage(Frame):
                 bg="black", fg="white")
 
         # by running that on a thread we won't block GUI:
+        # (with a copy of the thread list because the list is cleared below)
+        self.threads_lock.acquire()
+        threads = list(self.threads)
+        self.threads_lock.release()
+        # the recording of this run (read here, before a new run can start):
+        generation = self.terminal.recorder.generation
         threading.Thread(target=wait_for_thread_join,
-                         args=(self.thread_state_label,)).start()
+                         args=(self.thread_state_label, threads)).start()
 
         # clear all lists
         self.instruments.clear()
+        self.instrument_kwargs.clear()
         self.fifos.clear()
         self.threads.clear()
+        self.health_states.clear()
 
         # then enable initialization button again:
         self.init_btn.config(state=NORMAL)
@@ -1,67 +1,901 @@
 # --- parse a measurement file ---
 
+import os
+import json
+import bisect
+import time
+import mmap
+import warnings
+import multiprocessing
+import numpy as np
+from contextlib import closing
+# every module logs with its own logger (see mylog module):
+import logging
+# compressed files (.gz/.xz) are read and written on the fly:
+from mycompress import open_file, read_lines, compression_of, TRUNCATED
+# the binary recordings (see mybinary and mychunks module):
+from mybinary import BinaryFile, EXTENSION as BINARY
+from mychunks import ChunkedFile, CHUNKS, INDEX
+# the index of the measurements in a file is saved like a manifest:
+from myrecorder import write_manifest
+# the time index is written by the SegmentRecorder while it records:
+from myrecorder import TIME_INDEX, TIME_STRIDE, time_of
+from mycompress import PART
+
+logger = logging.getLogger(__name__)
+
+# the extensions of the recordings and their readers, every reader has the
+# read(t0, t1, columns) method which returns [[time, ...], [instr1, ...], ...]
+RECORDINGS = {BINARY: BinaryFile, CHUNKS: ChunkedFile, INDEX: ChunkedFile}
+
+def open_recording(filename):
+    """Returns the reader for a binary or chunked recording"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in RECORDINGS:
+        raise ValueError("{} is no recording, the extension must be one of: {}".format(filename,
+                                                                                     ", ".join(RECORDINGS)))
+    return RECORDINGS[extension](filename)
+
+def is_recording(filename) -> bool:
+    return os.path.splitext(filename)[1].lower() in RECORDINGS
+
+def recording_to_sv_lines(filename, header=True, separator=",", t0=None, t1=None):
+    """Same as file_to_sv_lines but for a binary or chunked recording, only
+    the rows with t0 <= time < t1 are yield (default: all)
+    """
+    recording = open_recording(filename)
+    if header:
+        yield "Starting new measurement at {}\n{}".format(recording.header["start"],
+                                                           ", ".join(recording.columns))
+    data = recording.read(t0, t1)
+    for row in data.T.tolist():
+        yield separator.join(repr(value) for value in row)
+
 def file_to_sv_lines(filename, header=True, separator=","):
     """Takes a filename as argument and yield it's lines
     in csv style with/without header!
     optional argument: header=True (default) or header=False
+    A file that is still written or was cut off by a crash may end with a
+    partial line, that line is skipped (and so are broken lines).
+    A compressed file (.gz/.xz) is decompressed while it's read.
     """
-    with open(filename, "r") as file:
-        if header:
-            header_str = file.readline()
-            is_first = True
-            # slicing a list: start, stop, step!
-            for label in file.readline().split(" ")[::2][:-1]:
-                # get rid of the comma:
-                label = label[:-1]
-                if is_first:
-                    header_str += label
-                    is_first = False
-                else:
-                    header_str += ", " + label
-
-            # yield the optional first line of the parsed file
-            yield header_str
-
-
+    with closing(read_lines(filename)) as lines:
+        # the first line only contains the information about the start date
+        # and time of a measurement:
+        header_str = next(lines, "")
+        if not header_str.endswith("\n"):
+            # empty file (or not even the first line is complete)
+            return
         is_first_line = True
-        # File objects are iterable and yield lines until EOF
-        for line in file:
-            # skip the first line, because it only contains the
-            # information about the start date and time of a measurement:
-            if is_first_line:
-                is_first_line = False
+        for line in lines:
+            if not line.endswith("\n"):
+                # a partial last line
+                break
+            if header and is_first_line:
+                # the labels are taken from the first data line,
+                # slicing a list: start, stop, step!
+                labels = [label[:-1] for label in line.split(" ")[::2][:-1]]
+                # yield the optional first line of the parsed file
+                yield header_str + ", ".join(labels)
+            is_first_line = False
+            parsed_line = parse_line(line, separator)
+            if parsed_line is None:
                 continue
-            is_first_entry = True
-            parsed_line = ""
-            # build the parsed_line:
-            for entry in line.split(",")[:-1]:
-                # (the last entry is newline character \n therefore [:-1])
-                if is_first_entry:
-                    parsed_line += entry.split(" ")[1]
-                    is_first_entry = False
-                else:
-                    parsed_line += separator + entry.split(" ")[2]
             # yield all the other lines for the parsed file
             yield parsed_line
 
-def file_to_sv(in_filename, out_filename, **kwargs):
+def parse_line(line, separator=","):
+    """Parses one complete line "Time: 0.1, FMI220: 3.2, \n" into "0.1,3.2",
+    returns None for a blank or broken line
+    """
+    is_first_entry = True
+    parsed_line = ""
+    # build the parsed_line:
+    try:
+        for entry in line.split(",")[:-1]:
+            # (the last entry is newline character \n therefore [:-1])
+            if is_first_entry:
+                parsed_line += entry.split(" ")[1]
+                is_first_entry = False
+            else:
+                parsed_line += separator + entry.split(" ")[2]
+    except IndexError:
+        # a broken line
+        return None
+    if not parsed_line or not line.endswith(", \n"):
+        # a blank line or one that was cut off
+        return None
+    return parsed_line
+
+# the block parser: the parser above only cares about the spaces and commas
+# of a line, the text between them is either a label (dropped) or a value:
+# "Time: 0.1, FMI220: 3.2, Keithley2000: 7, \n" -> "0.1,3.2,7\n"
+# so a whole block of lines is parsed with numpy: the positions of all
+# spaces, commas and newlines are found at once and checked to be in the
+# right order in every line (" " after the first label, ",  " around every
+# further label, ", \n" at the end), then the labels are cut out with one
+# boolean mask (no string per line). A block which doesn't look like that
+# (e.g. a second header line) is parsed line by line with parse_line, the
+# result is the same.
+BLOCK_SIZE = 1 << 22
+SPACE, COMMA, NEWLINE, RETURN = ord(" "), ord(","), ord("\n"), ord("\r")
+# (a "\r" of old mac or windows newlines is in no valid place, so such a
+# block is left to parse_line)
+SEPARATORS = np.zeros(256, dtype=bool)
+SEPARATORS[[SPACE, COMMA, NEWLINE, RETURN]] = True
+
+def _cut_labels(data):
+    """The fast path of parse_block: returns the parsed lines of the block as
+    bytes separated by "," (None if the block doesn't look right)
+    """
+    array = np.frombuffer(data, dtype=np.uint8)
+    positions = np.flatnonzero(SEPARATORS[array])
+    # (3 more so kinds[i + 3] always exists)
+    kinds = np.concatenate((array[positions], np.zeros(3, dtype=np.uint8)))
+    commas = np.flatnonzero(kinds == COMMA)
+    newlines = np.flatnonzero(kinds == NEWLINE)
+    # the first separator of every line is the space after the label and a
+    # comma comes next:
+    firsts = np.r_[0, newlines[:-1] + 1]
+    if not (np.all(kinds[firsts] == SPACE) and np.all(kinds[firsts + 1] == COMMA)):
+        return None
+    # every line ends with ", \n":
+    if not (np.all(kinds[newlines - 1] == SPACE) and np.all(kinds[newlines - 2] == COMMA)):
+        return None
+    if not np.array_equal(positions[newlines], positions[newlines - 1] + 1):
+        return None
+    # every comma is followed by its space right away and then by the newline
+    # or by the space after the next label and the next comma:
+    if not np.all(kinds[commas + 1] == SPACE):
+        return None
+    if not np.array_equal(positions[commas + 1], positions[commas] + 1):
+        return None
+    last = kinds[commas + 2] == NEWLINE
+    middle = commas[~last]
+    if not (np.all(kinds[middle + 2] == SPACE) and np.all(kinds[middle + 3] == COMMA)):
+        return None
+    # the parts that are cut out (from start to end, both included):
+    # "Time: " (start of the line to the first space), " FMI220: " (the space
+    # after a comma to the space after the label) and ", " at the end
+    starts = np.concatenate((np.r_[0, positions[newlines[:-1]] + 1],
+                             positions[middle + 1],
+                             positions[commas[last]]))
+    ends = np.concatenate((positions[firsts],
+                           positions[middle + 2],
+                           positions[commas[last] + 1]))
+    # the mask flips at every start and after every end (twice -> not at all,
+    # where a part starts right after the one before, e.g. an empty value):
+    flips = np.zeros(len(array) + 1, dtype=bool)
+    flips[starts] ^= True
+    flips[ends + 1] ^= True
+    parsed = array[~np.logical_xor.accumulate(flips[:-1])].tobytes()
+    # (parse_line drops a line without any value)
+    if parsed.startswith(b"\n") or b"\n\n" in parsed:
+        return None
+    return parsed
+
+def parse_block(data, separator=","):
+    """Parses a block of complete lines (bytes or any other buffer, e.g. a
+    view of a MappedFile, ending with a newline), returns the parsed lines
+    (str), each one followed by a newline
+    """
+    parsed = _cut_labels(data)
+    if parsed is not None:
+        if separator != ",":
+            parsed = parsed.replace(b",", separator.encode())
+        return parsed.decode()
+    text = bytes(data).decode(errors="replace").replace("\r\n", "\n").replace("\r", "\n")
+    parsed = (parse_line(line, separator) for line in text.splitlines(True))
+    return "".join(line + "\n" for line in parsed if line is not None)
+
+class MappedFile:
+    """A measurement text file mapped into memory (mmap): the blocks and lines
+    are memoryviews into the file, nothing is read or copied before it's used
+    and there is no str per line, so even a file of many GB can be scanned:
+
+    with MappedFile("20200101_120000.txt") as mapped:
+        for block in mapped.blocks():         # complete lines, about block_size bytes
+            parsed = parse_block(block)
+        names, values = mapped.columns()      # the values as numpy array
+
+    A partial last line (the file is still written) is never part of a block.
+    A block (or line) is released when the next one is taken, so keep a copy
+    (bytes(block)) of what's needed later: the file is only unmapped (and on
+    Windows only unlocked, e.g. for the rename of a .part segment) when no
+    view of it is left. Only for uncompressed files.
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, "rb")
+        self.size = os.fstat(self.file.fileno()).st_size
+        # an empty file can't be mapped:
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else None
+        self.view = memoryview(self.map if self.map is not None else b"")
+
+    @property
+    def array(self) -> np.ndarray:
+        """The whole file as numpy array of bytes (a view)"""
+        return np.frombuffer(self.view, dtype=np.uint8)
+
+    def find(self, sub, start=0, end=None) -> int:
+        if self.map is None:
+            return -1
+        return self.map.find(sub, start, self.size if end is None else end)
+
+    def rfind(self, sub, start=0, end=None) -> int:
+        if self.map is None:
+            return -1
+        return self.map.rfind(sub, start, self.size if end is None else end)
+
+    def line_end(self, offset) -> int:
+        """The offset after the newline of the line at offset (-1 if that line
+        has no newline yet)
+        """
+        index = self.find(b"\n", offset)
+        return index + 1 if index >= 0 else -1
+
+    def blocks(self, start=0, end=None, block_size=BLOCK_SIZE):
+        """Yields the complete lines from the byte offset start (a line start)
+        to end (a line start or the end of the file) as memoryviews of about
+        block_size bytes
+        """
+        end = self.size if end is None else min(end, self.size)
+        while start < end:
+            stop = min(start + block_size, end)
+            cut = self.rfind(b"\n", start, stop) + 1
+            if cut <= start:
+                # a line longer than block_size:
+                cut = self.line_end(stop)
+                if cut < 0 or cut > end:
+                    return
+            block = self.view[start:cut]
+            try:
+                yield block
+            finally:
+                block.release()
+            start = cut
+
+    def lines(self, start=0, end=None):
+        """Yields the complete lines (with newline) as memoryviews"""
+        end = self.size if end is None else min(end, self.size)
+        while start < end:
+            cut = self.find(b"\n", start, end) + 1
+            if cut <= 0:
+                # (a partial last line)
+                return
+            line = self.view[start:cut]
+            try:
+                yield line
+            finally:
+                line.release()
+            start = cut
+
+    def columns(self, start=None, end=None) -> tuple:
+        """Returns the names of the columns and their values as 2D numpy array
+        (one row per line) of the lines from start (default: the first data
+        line) to end, the lines must all have the same Instruments
+        """
+        header_str, first = sv_header(self.filename)
+        names = header_str.splitlines()[-1].split(", ") if header_str else []
+        parts = []
+        for block in self.blocks(first if start is None else start, end):
+            parsed = _cut_labels(block)
+            if parsed is None:
+                raise ValueError("{} has lines which aren't measured values "
+                                 "(e.g. a second measurement)".format(self.filename))
+            # every line must have a value per column:
+            array = np.frombuffer(parsed, dtype=np.uint8)
+            commas = np.cumsum(array == COMMA)[array == NEWLINE]
+            if not names or np.any(np.diff(commas, prepend=0) != len(names) - 1):
+                raise ValueError("{} has lines with other Instruments than {}".format(self.filename, names))
+            text = parsed.replace(b"\n", b",")[:-1]
+            with warnings.catch_warnings():
+                # numpy only warns if a value isn't a number:
+                warnings.simplefilter("error", DeprecationWarning)
+                try:
+                    values = np.fromstring(text, dtype=np.float64, sep=",")
+                except DeprecationWarning:
+                    values = None
+            if values is None or values.size != text.count(b",") + 1:
+                # (a ValueError for the value that isn't a number)
+                values = np.array(text.split(b","), dtype=np.float64)
+            parts.append(values)
+        values = np.concatenate(parts) if parts else np.empty(0)
+        return names, values.reshape(-1, max(1, len(names)))
+
+    def close(self):
+        if self.map is not None:
+            try:
+                # the view exports the buffer of the map, so it goes first:
+                self.view.release()
+                self.map.close()
+            except BufferError:
+                # e.g. an array of the file is still used: the map is only
+                # closed when the last view of it is gone
+                logger.warning("%s is still used, it can't be unmapped now", self.filename)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def __repr__(self):
+        return "MappedFile<{}, {} bytes>".format(self.filename, self.size)
+
+def read_blocks(filename, block_size=BLOCK_SIZE):
+    """Yields the content of a (compressed) file in blocks of complete lines
+    (bytes or memoryviews), a partial last line is dropped
+    """
+    if not compression_of(filename):
+        with MappedFile(filename) as mapped:
+            yield from mapped.blocks(block_size=block_size)
+        return
+    rest = b""
+    ended = False
+    with open_file(filename, "rb") as file:
+        while not ended:
+            pieces = [rest]
+            size = 0
+            # read1 gives what could be decompressed before a compressed file
+            # that was cut off ends:
+            while size < block_size:
+                try:
+                    piece = file.read1(block_size - size)
+                except TRUNCATED:
+                    if not compression_of(filename):
+                        raise
+                    logger.warning("%s ends early", filename)
+                    piece = b""
+                if not piece:
+                    ended = True
+                    break
+                pieces.append(piece)
+                size += len(piece)
+            data = b"".join(pieces)
+            end = data.rfind(b"\n") + 1
+            rest = data[end:]
+            if end:
+                yield data[:end]
+
+def file_to_sv_blocks(filename, header=True, separator=",", block_size=BLOCK_SIZE, series=None):
+    """Same as file_to_sv_lines but yields big blocks of parsed lines (each
+    line followed by a newline), many times faster for big files!
+    series ... only the measurement with this index (see index_series) of a
+    file with several measurements (None -> the whole file)
+    """
+    if not compression_of(filename):
+        offset, end = series_range(filename, series)
+        header_str, start = sv_header(filename, offset, end)
+        if header and header_str:
+            yield header_str
+        with MappedFile(filename) as mapped:
+            for block in mapped.blocks(start, end, block_size=block_size):
+                yield parse_block(block, separator)
+        return
+    if series is not None:
+        raise ValueError("The measurements of the compressed file {} can't be converted "
+                         "one by one".format(filename))
+    with closing(read_blocks(filename, block_size)) as blocks:
+        block = next(blocks, b"")
+        # the first line only contains the information about the start date
+        # and time of a measurement:
+        end = block.find(b"\n") + 1
+        if not end:
+            return
+        header_line, block = block[:end], block[end:]
+        if header:
+            # the labels are taken from the first data line (see file_to_sv_lines):
+            if not block:
+                block = next(blocks, b"")
+            line = block[:block.find(b"\n") + 1].decode(errors="replace").replace("\r\n", "\n")
+            if line:
+                labels = [label[:-1] for label in line.split(" ")[::2][:-1]]
+                header_str = header_line.decode(errors="replace").rstrip("\r\n") + "\n"
+                yield header_str + ", ".join(labels) + "\n"
+        while True:
+            if block:
+                yield parse_block(block, separator)
+            block = next(blocks, None)
+            if block is None:
+                return
+
+def file_to_sv(in_filename, out_filename, compression=None, processes=1, **kwargs):
     """Takes a measurement data filename and the filename the parsed file
     should have... optional parameter: header=True/False as keyword argument!
+    series=<index> converts only one measurement of a file with several ones
+    (see index_series).
+    The output is compressed if out_filename ends with .gz/.xz or with
+    compression="gz"/"xz" ("" -> never).
+    processes ... number of processes that convert a big text file in parallel
+    (see file_to_sv_parallel, None -> one per CPU core), the output is the same
+    """
+    if processes != 1 and not is_recording(in_filename) and not compression_of(in_filename):
+        return file_to_sv_parallel(in_filename, out_filename, compression=compression,
+                                   processes=processes, **kwargs)
+    # the recordings have their own reader:
+    with open_file(out_filename, "w", compression) as file:
+        if is_recording(in_filename):
+            # for further information on yield see: python generator
+            for parsed_line in recording_to_sv_lines(in_filename, **kwargs):
+                file.write(parsed_line + "\n")
+        else:
+            # one write per block of lines:
+            for parsed_block in file_to_sv_blocks(in_filename, **kwargs):
+                file.write(parsed_block)
+
+# the parallel conversion: a text file is split at line starts into byte
+# ranges of about RANGE_SIZE bytes, the ranges are parsed by a pool of
+# processes (parse_block, each process reads its range itself) and the parsed
+# ranges are written in order -> the same output as file_to_sv_blocks, as
+# every line is parsed on its own
+RANGE_SIZE = 1 << 24
+
+def sv_header(filename, offset=0, end=None):
+    """Returns the header of the parsed file (see file_to_sv_lines, "" if
+    there is none) and the byte offset of the first data line, for the
+    measurement from the byte offset offset to end (default: the whole file)
+    """
+    with open(filename, "rb") as file:
+        file.seek(offset)
+        if not file.readline().endswith(b"\n"):
+            return "", file.tell()
+        data_offset = file.tell()
+        if not file.readline().endswith(b"\n") or (end is not None and file.tell() > end):
+            return "", data_offset
+    # the header and the labels like file_to_sv_lines reads them:
+    with open(filename, "r", errors="replace") as file:
+        file.seek(offset)
+        header_line = file.readline()
+        line = file.readline()
+    labels = [label[:-1] for label in line.split(" ")[::2][:-1]]
+    return header_line + ", ".join(labels) + "\n", data_offset
+
+def line_ranges(filename, start, parts, end=None):
+    """Splits the file from the byte offset start (a line start) to end (a
+    line start, default: the end of the file) into (up to) parts byte ranges
+    (start, end) which begin at line starts
+    """
+    size = os.path.getsize(filename) if end is None else end
+    bounds = [start]
+    with open(filename, "rb") as file:
+        for i in range(1, parts):
+            position = start + (size - start) * i // parts
+            if position <= bounds[-1]:
+                continue
+            # the next line starts after the next newline:
+            file.seek(position - 1)
+            file.readline()
+            position = file.tell()
+            if bounds[-1] < position < size:
+                bounds.append(position)
+    bounds.append(size)
+    return [(a, b) for a, b in zip(bounds[:-1], bounds[1:]) if b > a]
+
+def _convert_range(task) -> str:
+    # runs in a worker process of file_to_sv_parallel:
+    filename, start, end, separator = task
+    with MappedFile(filename) as mapped:
+        return "".join(parse_block(block, separator) for block in mapped.blocks(start, end))
+
+def file_to_sv_parallel(in_filename, out_filename, header=True, separator=",", compression=None,
+                        processes=None, range_size=RANGE_SIZE, series=None):
+    """Same as file_to_sv (same output) but the text file is parsed by
+    <processes> processes (None -> one per CPU core) in ranges of range_size
+    bytes, the output is written in order while the pool parses on (a file
+    of at most 2 * range_size bytes is parsed without a pool)
+    """
+    processes = processes or os.cpu_count() or 1
+    offset, end = series_range(in_filename, series)
+    header_str, start = sv_header(in_filename, offset, end)
+    size = os.path.getsize(in_filename) if end is None else end
+    with open_file(out_filename, "w", compression) as file:
+        if header:
+            file.write(header_str)
+        if processes == 1 or size - start <= 2 * range_size:
+            # starting the pool takes longer than parsing a small file (every
+            # "spawn" process imports the modules again):
+            with MappedFile(in_filename) as mapped:
+                for block in mapped.blocks(start, end):
+                    file.write(parse_block(block, separator))
+            return
+        # at least one range per process, more for big files (less memory):
+        parts = max(processes, -(-(size - start) // range_size))
+        tasks = [(in_filename, a, b, separator) for a, b in line_ranges(in_filename, start, parts, end)]
+        # "spawn" like the processes engine (see myprocesses module):
+        context = multiprocessing.get_context("spawn")
+        with context.Pool(min(processes, len(tasks))) as pool:
+            for parsed in pool.imap(_convert_range, tasks):
+                file.write(parsed)
+
+# a file can hold several measurements, each one starts with its own header
+# line "Starting new measurement at ..." (e.g. the old SaveFile.txt).
+# index_series finds them in one pass over the file and keeps the result in
+# the sidecar file <filename>.series.json: the next time only what was
+# appended to the file since then is scanned.
+SERIES_HEADER = b"Starting new measurement at "
+SERIES_INDEX = ".series.json"
+SERIES_TIME_FORMAT = "%d.%B.%Y - %H:%M:%S"
+
+def _scan_series(mapped, offset) -> list:
+    """Finds the measurements in a MappedFile from the byte offset offset (a
+    line start) to its end
+    """
+    series = []
+    position = offset
+    while True:
+        position = mapped.find(SERIES_HEADER, position)
+        if position < 0:
+            break
+        # only at the start of a line:
+        if position == 0 or mapped.view[position - 1] == NEWLINE:
+            series.append({"offset": position})
+        position += len(SERIES_HEADER)
+    array = mapped.array
+    for i, entry in enumerate(series):
+        end = series[i + 1]["offset"] if i + 1 < len(series) else mapped.size
+        entry["end"] = end
+        data_offset = mapped.line_end(entry["offset"])
+        if data_offset < 0 or data_offset > end:
+            data_offset = end
+        start = bytes(mapped.view[entry["offset"] + len(SERIES_HEADER):data_offset]).decode(errors="replace").strip()
+        entry["start"] = start
+        try:
+            entry["start_time"] = time.mktime(time.strptime(start, SERIES_TIME_FORMAT))
+        except ValueError:
+            entry["start_time"] = None
+        # the Instruments of the first data line:
+        line_end = mapped.line_end(data_offset) if data_offset < end else -1
+        if 0 < line_end <= end:
+            line = bytes(mapped.view[data_offset:line_end]).decode(errors="replace")
+            entry["instruments"] = [label[:-1] for label in line.split(" ")[::2][:-1]][1:]
+        else:
+            entry["instruments"] = []
+        # one row per complete line:
+        entry["rows"] = sum(int(np.count_nonzero(array[a:min(a + BLOCK_SIZE, end)] == NEWLINE))
+                            for a in range(data_offset, end, BLOCK_SIZE))
+    return series
+
+def index_series(filename, cache=True) -> list:
+    """Returns the measurements of a text file, one dictionary per measurement:
+    offset/end ... byte offsets of its header line and of its end
+    start/start_time ... the time in its header (as text and time.time() value)
+    instruments ... names of the Instruments, rows ... number of lines
+    With cache=True the index is kept in <filename>.series.json.
+    """
+    if compression_of(filename):
+        raise ValueError("The compressed file {} can't be indexed".format(filename))
+    status = os.stat(filename)
+    cached = None
+    if cache:
+        try:
+            with open(filename + SERIES_INDEX, "r") as file:
+                cached = json.load(file)
+        except (OSError, ValueError):
+            cached = None
+    if cached is not None and cached["size"] == status.st_size and cached["mtime"] == status.st_mtime:
+        return cached["series"]
+    with MappedFile(filename) as mapped:
+        series = []
+        offset = 0
+        if cached is not None and cached["series"] and cached["size"] <= mapped.size:
+            # the file has grown: the measurements before the last one are
+            # still the same if the last one still starts where it did
+            last = cached["series"][-1]
+            if bytes(mapped.view[last["offset"]:last["offset"] + len(SERIES_HEADER)]) == SERIES_HEADER:
+                series = cached["series"][:-1]
+                offset = last["offset"]
+        series += _scan_series(mapped, offset)
+    if cache:
+        try:
+            write_manifest(filename + SERIES_INDEX, {"size": status.st_size,
+                                                    "mtime": status.st_mtime,
+                                                    "series": series})
+        except OSError as e:
+            logger.warning("Couldn't save the index of %s: %s", filename, e)
+    return series
+
+def series_range(filename, series=None) -> tuple:
+    """The byte offsets (header line, end) of a measurement in a file, (0, None)
+    -> the whole file for series=None
     """
-    with open(out_filename, "w+") as file:
-        # for further information on yield see: python generator
-        for parsed_line in file_to_sv_lines(in_filename, **kwargs):
-            file.write(parsed_line + "\n")
+    if series is None:
+        return 0, None
+    index = index_series(filename)
+    if not -len(index) <= series < len(index):
+        raise IndexError("{} has {} measurement(s), there is no measurement {}".format(filename,
+                                                                                       len(index),
+                                                                                       series))
+    return index[series]["offset"], index[series]["end"]
+
+# the time index of a text file <filename>.tidx: "<time> <byte offset>\n" of
+# every TIME_STRIDE-th measured line (see myrecorder module). It's written
+# while the file is recorded or built here on the first access, only the
+# lines appended since the last entry are scanned to bring it up to date.
+# -> read_range looks up the entries around a time window and reads only
+# the lines between them, the time is ascending within a measurement
+
+def _entry_valid(mapped, line_time, offset) -> bool:
+    # the line at the offset must still have the time of the entry:
+    if offset >= mapped.size:
+        return False
+    end = mapped.line_end(offset)
+    if end < 0:
+        return False
+    return time_of(bytes(mapped.view[offset:end]).decode(errors="replace")) == line_time
+
+def _scan_times(mapped, start, stride) -> list:
+    """The (time, offset) of every stride-th measured line from the byte
+    offset start (a line start) to the end of the file
+    """
+    entries = []
+    count = 0
+    for block in mapped.blocks(start):
+        # (an array of the map, the block is released when the next is taken)
+        array = mapped.array[start:start + len(block)]
+        starts = np.r_[0, np.flatnonzero(array == NEWLINE)[:-1] + 1]
+        # the measured lines begin with "T" of "Time: "
+        measured = starts[array[starts] == ord("T")]
+        chosen = measured[(np.arange(count, count + len(measured)) % stride) == 0]
+        count += len(measured)
+        for offset in chosen.tolist():
+            line = bytes(block[offset:offset + 64])
+            line_time = time_of(line.split(b"\n", 1)[0].decode(errors="replace"))
+            if line_time is not None:
+                entries.append((line_time, start + offset))
+        start += len(block)
+    return entries
+
+def time_index(filename, stride=TIME_STRIDE, cache=True) -> list:
+    """Returns the time index of a text file as list of (time, byte offset)
+    (see above), with cache=True it's saved in <filename>.tidx
+    """
+    if compression_of(filename):
+        raise ValueError("The compressed file {} has no time index".format(filename))
+    # (the time index of the active segment is written by the SegmentRecorder)
+    cache = cache and not filename.endswith(PART)
+    entries = []
+    if cache:
+        try:
+            with open(filename + TIME_INDEX, "r") as file:
+                for line in file:
+                    parts = line.split()
+                    # (a partial last line)
+                    if len(parts) == 2 and line.endswith("\n"):
+                        entries.append((parts[0], int(parts[1])))
+        except (OSError, ValueError):
+            entries = []
+    with MappedFile(filename) as mapped:
+        # only the entries that still point to their line, the index is
+        # written before the file (e.g. cut off by a crash recovery)
+        loaded = len(entries)
+        while entries and not _entry_valid(mapped, *entries[-1]):
+            entries.pop()
+        if entries:
+            # the scan starts with the last entry again (the stride counts
+            # from there), so that one is left out:
+            entries += _scan_times(mapped, entries[-1][1], stride)[1:]
+        else:
+            entries = _scan_times(mapped, 0, stride)
+    if cache and (len(entries) != loaded or not os.path.exists(filename + TIME_INDEX)):
+        try:
+            # written anew, so a broken end of the file is gone:
+            with open(filename + TIME_INDEX, "w") as file:
+                file.write("".join("{} {}\n".format(line_time, offset) for line_time, offset in entries))
+        except OSError as e:
+            logger.warning("Couldn't save the time index of %s: %s", filename, e)
+    return [(float(line_time), offset) for line_time, offset in entries]
+
+def read_range(filename, t0=None, t1=None, separator=",", series=None):
+    """Yields the parsed lines (like file_to_sv_lines without header) with
+    t0 <= time < t1 (None -> no limit), only the lines around the time window
+    are read (see time_index)
+    series ... the index of the measurement in a file with several ones (see
+    index_series), None -> the whole file (only right for a file with one
+    measurement, the time starts at 0 in every measurement)
+    """
+    offset, end = series_range(filename, series)
+    with MappedFile(filename) as mapped:
+        end = mapped.size if end is None else end
+        _, data_offset = sv_header(filename, offset, end)
+        entries = [(line_time, position) for line_time, position in time_index(filename)
+                   if data_offset <= position < end]
+        times = [line_time for line_time, _ in entries]
+        start, stop = data_offset, end
+        if t0 is not None:
+            # the last entry before t0, the lines before it are all earlier:
+            i = bisect.bisect_left(times, t0) - 1
+            if i >= 0:
+                start = entries[i][1]
+        if t1 is not None:
+            # the first entry at or after t1, the lines after it are all later:
+            j = bisect.bisect_left(times, t1)
+            if j < len(entries):
+                stop = entries[j][1]
+        for block in mapped.blocks(start, stop):
+            for line in parse_block(block).splitlines():
+                try:
+                    line_time = float(line.split(",", 1)[0])
+                except ValueError:
+                    continue
+                if t0 is not None and line_time < t0:
+                    continue
+                if t1 is not None and line_time >= t1:
+                    return
+                yield line if separator == "," else line.replace(",", separator)
+
+def line_offset(filename, line, block=1 << 20):
+    """Returns the byte offset at which the line with the given index (0 is
+    the first line) starts, only the newline characters are counted so this
+    is fast even for huge files! (not for compressed files)
+    """
+    offset = 0
+    with open(filename, "rb") as file:
+        while line > 0:
+            data = file.read(block)
+            if not data:
+                break
+            count = data.count(b"\n")
+            if count < line:
+                line -= count
+                offset += len(data)
+                continue
+            # the line starts after the line-th newline of this block:
+            position = -1
+            for _ in range(line):
+                position = data.index(b"\n", position + 1)
+            return offset + position + 1
+    return offset
+
+def lines_before(filename, offset, n, block=1 << 16):
+    """Reads the (up to) n lines which end right before the byte offset
+    (which must be the start of a line) by reading the file backwards, returns
+    the byte offsets of the lines and the lines (with newline)
+    """
+    start = offset
+    pieces = []
+    newlines = 0
+    with open(filename, "rb") as file:
+        # one more newline than lines needed, so the first line is complete
+        # (only the newlines of the piece just read are counted):
+        while start > 0 and newlines <= n:
+            size = min(block, start)
+            start -= size
+            file.seek(start)
+            piece = file.read(size)
+            if len(piece) < size:
+                raise OSError("{} has less than {} bytes".format(filename, offset))
+            pieces.append(piece)
+            newlines += piece.count(b"\n")
+    lines = b"".join(reversed(pieces)).split(b"\n")[:-1]
+    if start > 0:
+        # the first piece is (part of) a line we don't want:
+        lines = lines[1:]
+    lines = [line + b"\n" for line in lines[-n:]] if n > 0 else []
+    offsets = []
+    position = offset - sum(len(line) for line in lines)
+    for line in lines:
+        offsets.append(position)
+        position += len(line)
+    return offsets, [line.decode(errors="replace").replace("\r\n", "\n") for line in lines]
+
+def copy_file(in_filename, out_filename, compression=None):
+    """Copies the content of one file into the other (decompressed or
+    compressed on the fly if a name ends with .gz/.xz, see file_to_sv)
+    """
+    if not compression_of(in_filename) and not (compression or
+                                                compression is None and compression_of(out_filename)):
+        # straight from the mapped file into the new one:
+        with MappedFile(in_filename) as mapped, open(out_filename, "wb") as out_file:
+            for start in range(0, len(mapped), BLOCK_SIZE):
+                out_file.write(mapped.view[start:start + BLOCK_SIZE])
+        return
+    with open_file(out_filename, "w", compression) as out_file:
+        for line in read_lines(in_filename):
+            out_file.write(line)
+
+# the follow mode: a text file that is still recorded is converted again and
+# again, each time only the lines appended since the last time (see
+# follow_to_sv). The checkpoint <out_filename>.checkpoint.json (replaced
+# atomically like a manifest) holds where the conversion is:
+# offset ... byte offset of the first line in the input that isn't converted
+# output_size ... size of the output with everything before offset
+# header_line ... the first line of the input (another file -> start again)
+# header/separator ... how the output is made (changed -> start again)
+# -> the parser has no other state, every line is parsed on its own, so the
+# output is the same as file_to_sv of the whole file
+# -> the checkpoint is saved after the output is on the disk, an output
+# which is longer (a crash in between) is cut back to output_size (a
+# compressed output can't be cut, it may get those lines twice)
+CHECKPOINT = ".checkpoint.json"
+
+def _follow_checkpoint(filename) -> dict:
+    try:
+        with open(filename, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def _follow_once(in_filename, out_filename, header, separator, compression, checkpoint_filename) -> int:
+    # (a segment of the SegmentRecorder is "<name>.part" till it's finished,
+    # the renamed file has the same content)
+    try:
+        mapped = MappedFile(in_filename)
+    except FileNotFoundError:
+        try:
+            mapped = MappedFile(in_filename + PART)
+            in_filename += PART
+        except FileNotFoundError:
+            # (renamed just now)
+            mapped = MappedFile(in_filename)
+    with mapped:
+        header_end = mapped.line_end(0)
+        if header_end < 0:
+            # not even the header line yet
+            return 0
+        header_line = bytes(mapped.view[:header_end]).decode(errors="replace")
+        state = _follow_checkpoint(checkpoint_filename)
+        if (state is None or state["header_line"] != header_line or state["header"] != header or
+                state["separator"] != separator or state["offset"] > mapped.size or
+                not os.path.exists(out_filename)):
+            state = None
+        elif not compression_of(out_filename) and not compression:
+            if os.path.getsize(out_filename) < state["output_size"]:
+                state = None
+            elif os.path.getsize(out_filename) > state["output_size"]:
+                with open(out_filename, "rb+") as file:
+                    file.truncate(state["output_size"])
+        if state is None:
+            # the labels are in the first data line (see sv_header):
+            header_str, data_offset = sv_header(in_filename, 0, mapped.size)
+            if not header_str:
+                return 0
+            with open_file(out_filename, "w", compression) as file:
+                if header:
+                    file.write(header_str)
+            state = {"header_line": header_line, "header": header, "separator": separator,
+                     "offset": data_offset, "output_size": os.path.getsize(out_filename)}
+            write_manifest(checkpoint_filename, state)
+        start = state["offset"]
+        for block in mapped.blocks(start):
+            with open_file(out_filename, "a", compression) as file:
+                file.write(parse_block(block, separator))
+                file.flush()
+                os.fsync(file.fileno())
+            state["offset"] += len(block)
+            state["output_size"] = os.path.getsize(out_filename)
+            write_manifest(checkpoint_filename, state)
+        return state["offset"] - start
 
-def copy_file(in_filename, out_filename):
-    """Copies the content of one file into the other
+def follow_to_sv(in_filename, out_filename, header=True, separator=",", compression=None,
+                 checkpoint=None, interval=None, stop=None) -> int:
+    """Converts a text file that is still written like file_to_sv, but only
+    the lines appended since the last call (see above), returns the number of
+    bytes of the input converted now:
+    checkpoint ... the checkpoint file (default: <out_filename>.checkpoint.json)
+    interval ... None -> convert once, otherwise look for new lines every
+    interval seconds till the threading.Event stop is set (then once more,
+    stop=None -> forever)
+    Only for uncompressed text files (the partial last line waits for its newline).
     """
-    in_file = open(in_filename, "r")
-    out_file = open(out_filename, "w+")
-    for line in in_file:
-        out_file.write(line)
-    in_file.close()
-    out_file.close()
+    if compression_of(in_filename) or is_recording(in_filename):
+        raise ValueError("{} can't be followed, only text files can".format(in_filename))
+    checkpoint_filename = out_filename + CHECKPOINT if checkpoint is None else checkpoint
+    converted = 0
+    while True:
+        stopped = stop is not None and stop.is_set()
+        converted += _follow_once(in_filename, out_filename, header, separator, compression,
+                                  checkpoint_filename)
+        if interval is None or stopped:
+            return converted
+        if stop is not None:
+            stop.wait(interval)
+        else:
+            time.sleep(interval)
 
 if __name__ == '__main__':
     out_filename = "data.txt"
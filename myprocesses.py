@@ -0,0 +1,304 @@
+# --- module for the process acquisition engine ---
+
+import threading
+import multiprocessing
+import time
+# the samples come back from the worker processes over shared memory:
+from mybuffers import SharedRingBuffer
+# for the timing control of the measurements:
+from myscheduler import DeadlineScheduler, SKIP
+# the samples are stamped with the time they were measured:
+from myalign import Sample
+# for the fault isolation of the Instruments:
+from mysupervisor import InstrumentHealth, gap_sample
+# every module logs with its own logger (see mylog module):
+import logging
+from mylog import setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+# exit codes of a worker process:
+FINISHED = 0
+FAILED = 1
+
+
+def instrument_worker(cls, kwargs, interval, count, noe, overrun, buffer, running, stop_event,
+                      ready, connected):
+    """Runs in a worker process: creates its own Instrument object (connections
+    can't be shared between processes) and measures on every deadline, the
+    samples [t_request, t_response, value] are pushed into the shared buffer
+    (time.perf_counter() is the same clock in every process). The heartbeat of
+    the buffer shows the parent that we are still alive!
+
+    The worker sets ready when its Instrument is connected and starts to
+    measure when the parent sets connected (all workers are ready), so the
+    Instruments start together.
+    If a measurement fails more than noe times the process exits with FAILED
+    and the parent starts a fresh worker (new process, new connection).
+    """
+    instrument = cls(**kwargs)
+    try:
+        ready.set()
+        while not connected.wait(0.5) and not stop_event.is_set():
+            buffer.beat(time.monotonic())
+        scheduler = DeadlineScheduler(interval, overrun)
+        scheduler.start()
+        errors = noe
+        while count > 0 and not stop_event.is_set():
+            buffer.beat(time.monotonic())
+            # idle mode, do nothing till the parent lets us go on:
+            if not running.is_set():
+                running.wait(0.5)
+                continue
+            scheduler.wait(sleep=stop_event.wait)
+            if stop_event.is_set():
+                break
+            buffer.beat(time.monotonic())
+            try:
+                t_request = time.perf_counter()
+                value = instrument.measure()
+                t_response = time.perf_counter()
+            except Exception as e:
+                logger.warning("%s worker: function call failed: %s", cls.__name__, e)
+                errors -= 1
+                if errors < 0:
+                    return FAILED
+                scheduler.done()
+                continue
+            # wait till the parent has taken some samples if the buffer is full:
+            while not buffer.push([t_request, t_response, value]) and not stop_event.is_set():
+                stop_event.wait(0.01)
+            count -= 1
+            scheduler.done()
+    finally:
+        try:
+            instrument.close()
+        except Exception as e:
+            logger.warning("Closing %s failed: %s", cls.__name__, e)
+        buffer.close()
+    return FINISHED
+
+
+def _worker_main(log_level, *args):
+    # a spawned process starts without the logging setup of the parent:
+    setup_logging(log_level)
+    try:
+        result = instrument_worker(*args)
+    finally:
+        shutdown_logging()
+    # the exit code tells the parent if the worker finished or failed:
+    raise SystemExit(result)
+
+
+class InstrumentProcess:
+    """The parent side of one worker process: the shared buffer, the process
+    itself and what's needed to start it again
+    """
+    def __init__(self, context, cls, kwargs, capacity):
+        self.context = context
+        self.cls = cls
+        self.kwargs = kwargs
+        self.name = cls.__name__
+        # a row of the buffer: [t_request, t_response, value]
+        self.buffer = SharedRingBuffer(channels=2, capacity=capacity)
+        self.process = None
+        # number of samples received from all processes of this Instrument:
+        self.received = 0
+        self.restarts = 0
+        self.done = False
+        # perf_counter() time of the next start, None if no restart is planned:
+        self.restart_at = None
+        # set by the worker when its Instrument is connected:
+        self.ready = context.Event()
+
+    def start(self, interval, count, noe, overrun, running, stop_event, connected):
+        self.buffer.beat(time.monotonic())
+        self.ready.clear()
+        self.process = self.context.Process(target=_worker_main,
+                                            args=(logging.getLogger().getEffectiveLevel(),
+                                                  self.cls,
+                                                  self.kwargs,
+                                                  interval,
+                                                  count - self.received,
+                                                  noe,
+                                                  overrun,
+                                                  self.buffer,
+                                                  running,
+                                                  stop_event,
+                                                  self.ready,
+                                                  connected),
+                                            name="{}Worker".format(self.name),
+                                            daemon=True)
+        self.process.start()
+        logger.info("Started worker process %s for %s", self.process.pid, self.name)
+
+    def kill(self):
+        if self.process is not None and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(1)
+            if self.process.is_alive():
+                self.process.kill()
+                self.process.join()
+
+    def __repr__(self):
+        return "InstrumentProcess<{}, pid={}, restarts={}>".format(self.name,
+                                                                   None if self.process is None else self.process.pid,
+                                                                   self.restarts)
+
+
+class ProcessAcquisitionThread(threading.Thread):
+    """Runs every Instrument in its own worker process, a hanging pyvisa or
+    minimalmodbus call (even in the constructor) then can't stall the other
+    Instruments or the GUI!
+
+    This thread supervises the workers: it moves the samples from the shared
+    buffers (see mybuffers.SharedRingBuffer) to the fifos, and it starts a new
+    worker if one failed or hasn't shown a heartbeat for <hang_timeout> seconds
+    (then the hanging process is terminated).
+
+    note: the worker processes create the Instrument objects with
+    cls(**kwargs), the GUI process never opens their ports. They start to
+    measure when all of them are connected (or after hang_timeout seconds).
+    This thread has the same interface as the MeasurementThread (start, stop,
+    wait, go, join) so the MeasurementPage can handle both the same way.
+    """
+    def __init__(self, interval, count, classes, kwargs, noe, fifos, overrun=SKIP,
+                 hang_timeout=10.0, capacity=10000, poll=0.01, **health_kwargs):
+        threading.Thread.__init__(self)
+        assert noe>=0,"Number of errors must be >= 0!"
+        assert len(classes) == len(fifos) == len(kwargs), "Each Instrument needs a fifo and kwargs!"
+        self.interval = interval
+        self.count = count
+        self.noe = noe
+        self.overrun = overrun
+        self.fifos = fifos
+        # a worker that needs longer than that for one sample is seen as hanging:
+        self.hang_timeout = interval + hang_timeout
+        self.poll = poll
+        # "spawn" works the same on every OS and doesn't copy the threads and
+        # open connections of the GUI process:
+        self.context = multiprocessing.get_context("spawn")
+        self.workers = [InstrumentProcess(self.context, cls, kw, capacity)
+                        for cls, kw in zip(classes, kwargs)]
+        # the health of every Instrument, a worker only fails after more than
+        # noe errors in a row, so one failed worker is enough for a restart
+        # (see mysupervisor module for the health_kwargs):
+        self.healths = [InstrumentHealth(worker.name, 0, **health_kwargs) for worker in self.workers]
+        # shared with the workers:
+        self.running = self.context.Event()
+        self.running.set()
+        self.stop_event = self.context.Event()
+        # set when all the workers are connected (a restarted worker measures
+        # right away):
+        self.connected = self.context.Event()
+        self.connect_timeout = hang_timeout
+        self.run_flag = True
+        self.wait_flag = False
+        logger.info("Created %s", self)
+
+    def run(self):
+        for worker in self.workers:
+            self.start_worker(worker)
+        connect_deadline = time.perf_counter() + self.connect_timeout
+
+        while self.run_flag and not all(worker.done for worker in self.workers):
+            if not self.connected.is_set():
+                # a worker that doesn't get connected isn't waited for longer
+                # than connect_timeout (it's restarted by supervise()):
+                if (all(worker.ready.is_set() for worker in self.workers) or
+                        time.perf_counter() >= connect_deadline):
+                    logger.info("%s: the workers are connected, start measuring", self)
+                    self.connected.set()
+            for worker, fifo, health in zip(self.workers, self.fifos, self.healths):
+                if self.collect(worker, fifo) > 0:
+                    if health.needs_reconnect:
+                        # the restarted worker delivers again:
+                        health.reconnected(True)
+                    health.success()
+                if not worker.done:
+                    self.supervise(worker, fifo, health)
+            self.stop_event.wait(self.poll)
+
+        # let the workers finish their current measurement, then kill the rest:
+        self.stop_event.set()
+        for worker, fifo in zip(self.workers, self.fifos):
+            if worker.process is not None:
+                worker.process.join(max(1.0, self.interval))
+            worker.kill()
+            self.collect(worker, fifo)
+            worker.buffer.close()
+        logger.info("%s has stopped!", self)
+        for worker, health in zip(self.workers, self.healths):
+            logger.info("%s %s received: %d", worker, health, worker.received)
+
+    def start_worker(self, worker):
+        worker.start(self.interval,
+                     self.count,
+                     self.noe,
+                     self.overrun,
+                     self.running,
+                     self.stop_event,
+                     self.connected)
+
+    def collect(self, worker, fifo) -> int:
+        """Moves the new samples of a worker to its fifo, returns their number"""
+        data, n = worker.buffer.peek()
+        for t_request, t_response, value in data.T.tolist():
+            fifo.push(Sample(t_request, t_response, value))
+        worker.buffer.consume(n)
+        worker.received += n
+        return n
+
+    def supervise(self, worker, fifo, health):
+        """Restarts a worker which failed or hangs, with the delays the health
+        object demands (see mysupervisor module) so a dead Instrument doesn't
+        get a new process every poll!
+        """
+        if worker.restart_at is not None:
+            # a restart is planned, wait for it:
+            if time.perf_counter() >= worker.restart_at and self.run_flag:
+                worker.restart_at = None
+                worker.restarts += 1
+                self.start_worker(worker)
+            return
+        process = worker.process
+        if process.is_alive():
+            # a paused worker is still beating, so no special case for that:
+            if time.monotonic() - worker.buffer.heartbeat < self.hang_timeout:
+                return
+            logger.error("%s hangs, terminating it...", worker)
+            worker.kill()
+        # the process is gone now, so the buffer can't change anymore and we
+        # can take the last samples before deciding what to do:
+        if self.collect(worker, fifo) > 0:
+            health.success()
+        if process.exitcode == FINISHED:
+            worker.done = True
+            return
+        logger.error("%s failed with exit code %s", worker, process.exitcode)
+        if health.needs_reconnect:
+            # the restarted worker failed before it delivered a sample:
+            health.reconnected(False)
+        else:
+            health.failure()
+            # mark the gap in the data of this Instrument:
+            fifo.push(gap_sample())
+        worker.restart_at = time.perf_counter() + health.reconnect_delay()
+
+    def stop(self):
+        logger.info("%s trying to stopp!", self)
+        self.run_flag = False
+        self.stop_event.set()
+
+    def wait(self):
+        logger.info("%s will go into idle mode!", self)
+        self.wait_flag = True
+        self.running.clear()
+
+    def go(self):
+        logger.info("%s will go into measurement mode!", self)
+        self.wait_flag = False
+        self.running.set()
+
+    def __repr__(self):
+        return "ProcessAcquisitionThread with id: {}".format(id(self))
@@ -0,0 +1,341 @@
+# --- module for the crash-safe text recording with file rotation ---
+
+import os
+import json
+import glob
+import time
+import locale
+import threading
+# the segments can be compressed (.gz/.xz) while they are written:
+from mycompress import PART, compression_of, with_compression, open_file, read_lines
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
+
+# a recording of a measurement "<stem>.txt" is split into segments:
+# <stem>.txt, <stem>_0001.txt, <stem>_0002.txt, ...
+# every segment starts with the header line of the measurement, so each one
+# can be converted on its own (see myparse module)!
+#
+# -> a segment is written as "<segment>.part" and renamed when it's complete,
+# a finished segment never changes again
+# -> <stem>.manifest.json lists the finished segments (lines, bytes, time
+# range) and the active one, it is replaced atomically (write a temporary
+# file, then rename it) so it's always complete, even after a crash
+# -> recover() turns the .part file left by a crash into a finished segment
+# (without the partial last line)
+# -> with compression="gz" the segments are <stem>.txt.gz, <stem>_0001.txt.gz, ...
+# (the bytes in the manifest are those of the uncompressed text)
+# -> the time index <segment>.tidx has a line "<time> <byte offset>\n" for
+# every TIME_STRIDE-th measured line of a (not compressed) segment, so a time
+# window can be read without reading the segment from the start (see
+# myparse.read_range, which also builds it for files that have none)
+MANIFEST = ".manifest.json"
+TIME_INDEX = ".tidx"
+TIME_STRIDE = 1000
+
+
+def time_of(line) -> str:
+    """The time of a measured line "Time: 0.1, ..." as written (None for
+    any other line)
+    """
+    if not line.startswith("Time: "):
+        return None
+    end = line.find(",")
+    return line[6:end] if end > 6 else None
+
+
+def segment_name(stem, number, compression="") -> str:
+    name = stem + ".txt" if number == 0 else "{}_{:04d}.txt".format(stem, number)
+    return with_compression(name, compression)
+
+
+def write_manifest(filename, manifest):
+    """Replaces the manifest file atomically"""
+    temp = filename + ".tmp"
+    with open(temp, "w") as file:
+        json.dump(manifest, file, indent=1)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temp, filename)
+
+
+def read_manifest(filename) -> dict:
+    with open(filename, "r") as file:
+        return json.load(file)
+
+
+def truncate_partial_line(filename) -> int:
+    """Cuts a partial last line (no newline at the end) off a file, returns the
+    number of bytes removed (of the uncompressed data for a compressed file)
+    """
+    if compression_of(filename):
+        return _truncate_compressed(filename)
+    with open(filename, "rb+") as file:
+        size = file.seek(0, os.SEEK_END)
+        # look for the last newline from the end:
+        position = size
+        block = 4096
+        while position > 0:
+            start = max(0, position - block)
+            file.seek(start)
+            data = file.read(position - start)
+            index = data.rfind(b"\n")
+            if index >= 0:
+                end = start + index + 1
+                break
+            position = start
+        else:
+            end = 0
+        if end < size:
+            file.truncate(end)
+        return size - end
+
+
+def _truncate_compressed(filename) -> int:
+    # the end of a compressed file can't be cut off, so the complete lines
+    # (as far as they can be decompressed) are compressed into a new file:
+    temp = filename + ".tmp"
+    removed = 0
+    with open_file(temp, "wb", compression_of(filename)) as file:
+        for line in read_lines(filename, binary=True):
+            if line.endswith(b"\n"):
+                file.write(line)
+            else:
+                removed = len(line)
+    os.replace(temp, filename)
+    return removed
+
+
+def count_lines(filename) -> int:
+    return sum(1 for line in read_lines(filename, binary=True) if line.endswith(b"\n"))
+
+
+def count_bytes(filename) -> int:
+    """The size of the complete lines of a file, of the uncompressed text for
+    a compressed file (like the "bytes" of a segment in the manifest)
+    """
+    return sum(len(line) for line in read_lines(filename, binary=True) if line.endswith(b"\n"))
+
+
+def recover(manifest_filename) -> bool:
+    """Finishes the active segment of a recording that was interrupted (e.g. by
+    a crash): the partial last line is removed, the segment is renamed and put
+    into the manifest. Returns True if something was recovered.
+    """
+    manifest = read_manifest(manifest_filename)
+    active = manifest.get("active")
+    if active is None:
+        return False
+    directory = os.path.dirname(manifest_filename)
+    final = os.path.join(directory, active["file"])
+    part = final + PART
+    if os.path.exists(part):
+        removed = truncate_partial_line(part)
+        os.replace(part, final)
+        logger.warning("Recovered %s (%d bytes of a partial line removed)", final, removed)
+    elif not os.path.exists(final):
+        # nothing was written into the segment
+        manifest["active"] = None
+        write_manifest(manifest_filename, manifest)
+        return True
+    active["lines"] = count_lines(final)
+    active["bytes"] = count_bytes(final)
+    active["recovered"] = True
+    manifest["segments"].append(active)
+    manifest["active"] = None
+    write_manifest(manifest_filename, manifest)
+    return True
+
+
+def recover_all(directory=".") -> list:
+    """Recovers all the interrupted recordings in a directory (call it on start),
+    returns the manifest filenames of the recovered recordings
+    """
+    recovered = []
+    for manifest_filename in glob.glob(os.path.join(directory, "*" + MANIFEST)):
+        try:
+            if recover(manifest_filename):
+                recovered.append(manifest_filename)
+        except Exception:
+            logger.exception("Couldn't recover %s", manifest_filename)
+    return recovered
+
+
+def segments(stem) -> list:
+    """The filenames of the finished segments of a recording in time order"""
+    manifest = read_manifest(stem + MANIFEST)
+    directory = os.path.dirname(stem)
+    return [os.path.join(directory, segment["file"]) for segment in manifest["segments"]]
+
+
+class SegmentRecorder:
+    """Writes the text recording of the measurements in segments (see above),
+    a new segment is started when the active one has max_bytes or is older
+    than max_seconds (None -> no limit), so week long measurements give files
+    of a manageable size!
+
+    All the file operations (writing, closing, renaming, the manifest) are
+    done in order by the FileWriter thread (see mywriter module), so write()
+    never waits for the disk.
+    compression ... "gz" or "xz" to compress the segments ("" -> text files),
+    max_bytes is the size of the uncompressed text then
+    time_stride ... every time_stride-th line goes into the time index (see
+    above, None -> no time index)
+    """
+    def __init__(self, writer, max_bytes=64 * 1024 * 1024, max_seconds=24 * 3600, compression="",
+                 time_stride=TIME_STRIDE):
+        self.writer = writer
+        # check it before anything is recorded:
+        with_compression("", compression)
+        self.compression = compression
+        self.max_bytes = max_bytes
+        self.max_seconds = max_seconds
+        self.time_stride = time_stride
+        # the text is written in text mode: the encoding and the newline of
+        # the system make the byte offsets in the file
+        self.encoding = locale.getpreferredencoding(False)
+        self.newline = len(os.linesep) - 1
+        # write() is called from the UpdateThread and the GUI thread:
+        self.lock = threading.Lock()
+        self.stem = None
+        self.header = None
+        self.manifest = None
+        # counts the recordings started (see stop):
+        self.generation = 0
+        # the active segment:
+        self.number = 0
+        self.segment = None
+        self.lines = 0
+        self.bytes = 0
+        # the byte offset of the next line in the segment:
+        self.offset = 0
+        self.started = 0.0
+
+    def start(self, filename):
+        """Starts the recording of a new measurement <stem>.txt, the first line
+        written is the header line (the first line of every segment)
+        """
+        with self.lock:
+            if self.segment is not None:
+                self._finish_segment()
+            self.generation += 1
+            self.stem = os.path.splitext(filename)[0]
+            self.header = None
+            self.number = 0
+
+    def write(self, line) -> tuple:
+        """Records a line (with newline), returns the segment it belongs to and
+        the byte offset of the line in it ((None, None) if nothing is recorded)
+        """
+        with self.lock:
+            if self.stem is None:
+                return None, None
+            if self.header is None:
+                self.header = line.rstrip("\n")
+                self.manifest = {"stem": os.path.basename(self.stem),
+                                 "header": self.header,
+                                 "segments": [],
+                                 "active": None}
+                self._start_segment()
+                return self.segment, 0
+            segment, offset = self.segment, self.offset
+            self.writer.write(segment + PART, line)
+            if (self.time_stride and not self.compression and
+                    (self.lines - 1) % self.time_stride == 0):
+                self._index_time(line)
+            self.lines += 1
+            self.bytes += self._size(line)
+            self.offset += self._size(line)
+            if ((self.max_bytes is not None and self.bytes >= self.max_bytes) or
+                    (self.max_seconds is not None and time.time() - self.started >= self.max_seconds)):
+                self._finish_segment()
+                self.number += 1
+                self._start_segment()
+            return segment, offset
+
+    def stop(self, generation=None):
+        """Finishes the active segment
+        generation ... only if it's still the recording started as this
+        generation (see start), so a late stop of an older run doesn't end a
+        new one (None -> whatever is recorded)
+        """
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                logger.info("%s isn't recording generation %d anymore", self, generation)
+                return
+            if self.segment is not None:
+                self._finish_segment()
+            self.stem = None
+
+    def readable(self, filename) -> str:
+        """The file a segment can be read from right now (the .part file while
+        the segment is active)
+        """
+        with self.lock:
+            if self.segment == filename:
+                return filename + PART
+        return filename
+
+    def _start_segment(self):
+        self.segment = segment_name(self.stem, self.number, self.compression)
+        self.lines = 1
+        self.bytes = self._size(self.header + "\n")
+        self.offset = self._size(self.header + "\n")
+        self.started = time.time()
+        self.manifest["active"] = {"file": os.path.basename(self.segment), "start": self.started}
+        # (a copy, the manifest changes before the writer thread gets to it)
+        manifest, filename = json.loads(json.dumps(self.manifest)), self.stem + MANIFEST
+        # the manifest names the segment before anything is written into it:
+        self.writer.call(lambda: write_manifest(filename, manifest))
+        self.writer.write(self.segment + PART, self.header + "\n")
+
+    def _size(self, text) -> int:
+        return len(text.encode(self.encoding, errors="replace")) + self.newline * text.count("\n")
+
+    def _index_time(self, line):
+        line_time = time_of(line)
+        if line_time is not None:
+            # (named after the finished segment, it isn't renamed)
+            self.writer.write(self.segment + TIME_INDEX, "{} {}\n".format(line_time, self.offset))
+
+    def _finish_segment(self):
+        segment = self.manifest["active"]
+        segment.update({"lines": self.lines, "bytes": self.bytes, "end": time.time()})
+        self.manifest["segments"].append(segment)
+        self.manifest["active"] = None
+        manifest = json.loads(json.dumps(self.manifest))
+        part, final, stem = self.segment + PART, self.segment, self.stem
+        self.writer.close_file(part)
+        self.writer.close_file(final + TIME_INDEX)
+
+        def finish():
+            # the segment is complete on the disk now (closed with fsync):
+            os.replace(part, final)
+            write_manifest(stem + MANIFEST, manifest)
+        self.writer.call(finish)
+        self.segment = None
+
+    def __repr__(self):
+        return "SegmentRecorder<{}, segment={}>".format(self.stem, self.number)
+
+
+if __name__ == '__main__':
+    from mywriter import FileWriter
+    writer = FileWriter()
+    writer.start()
+    recorder = SegmentRecorder(writer, max_bytes=1000)
+    recorder.start("recorder_test.txt")
+    recorder.write("Starting new measurement at now\n")
+    for i in range(100):
+        recorder.write("Time: {}, Value: {}, \n".format(i, i * i))
+    recorder.stop()
+    writer.close()
+    print(read_manifest("recorder_test" + MANIFEST))
+    for filename in segments("recorder_test"):
+        print(filename, count_lines(filename))
+        os.remove(filename)
+        if os.path.exists(filename + TIME_INDEX):
+            os.remove(filename + TIME_INDEX)
+    os.remove("recorder_test" + MANIFEST)
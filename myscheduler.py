@@ -0,0 +1,147 @@
+# --- module for timing control of the measurements ---
+
+import time
+import math
+# for the recent lateness values:
+import collections
+
+# what should happen if a measurement took longer than the interval and
+# one or more deadlines have already passed:
+SKIP = "skip"           # drop the missed samples, stay on the original time grid
+CATCH_UP = "catch up"   # measure the missed samples right away till we are back on time
+SHIFT = "shift"         # start a new time grid from now on
+OVERRUN_POLICIES = (SKIP, CATCH_UP, SHIFT)
+
+
+class TimingStats:
+    """Collects how late the samples were started compared to their deadlines
+    (lateness), the mean/min/max and the standard deviation (jitter) are updated
+    with every sample, the most recent lateness values are kept too!
+    All values are in seconds.
+    """
+    def __init__(self, recent=1000):
+        self.count = 0
+        self.mean = 0.0
+        # sum of squared differences from the mean (Welford's algorithm):
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        # number of samples which weren't finished before the next deadline:
+        self.overruns = 0
+        # number of samples skipped due to overruns (SKIP policy only):
+        self.skipped = 0
+        self.recent = collections.deque(maxlen=recent)
+
+    def add(self, lateness):
+        self.count += 1
+        delta = lateness - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (lateness - self.mean)
+        self.min = min(self.min, lateness)
+        self.max = max(self.max, lateness)
+        self.recent.append(lateness)
+
+    @property
+    def jitter(self) -> float:
+        """Standard deviation of the lateness"""
+        if self.count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self.count - 1))
+
+    def __repr__(self):
+        if self.count == 0:
+            return "TimingStats<no samples>"
+        return ("TimingStats<samples={}, lateness mean={:.6f}s min={:.6f}s max={:.6f}s, "
+                "jitter={:.6f}s, overruns={}, skipped={}>").format(self.count,
+                                                                   self.mean,
+                                                                   self.min,
+                                                                   self.max,
+                                                                   self.jitter,
+                                                                   self.overruns,
+                                                                   self.skipped)
+
+
+class DeadlineScheduler:
+    """Schedules samples on absolute deadlines: start + k * interval
+
+    The deadlines are measured with the monotonic time.perf_counter_ns() clock,
+    so the schedule doesn't drift with the duration of the measurements and
+    doesn't jump when the wall clock is changed!
+
+    Usage:
+    scheduler = DeadlineScheduler(interval, overrun=SKIP)
+    scheduler.start()
+    while ...:
+        scheduler.wait()      # sleeps till the next deadline
+        ... measure ...
+        scheduler.done()      # plans the next deadline
+    """
+    def __init__(self, interval, overrun=SKIP):
+        assert overrun in OVERRUN_POLICIES, "Overrun policy must be one of: {}".format(OVERRUN_POLICIES)
+        self.interval_ns = int(round(interval * 1e9))
+        self.overrun = overrun
+        self.deadline = None
+        self.stats = TimingStats()
+
+    def start(self, start_ns=None):
+        """The first deadline is now (or the given perf_counter_ns() value)"""
+        self.deadline = time.perf_counter_ns() if start_ns is None else start_ns
+
+    def wait(self, sleep=time.sleep) -> int:
+        """Sleeps till the current deadline and returns it (in ns), the lateness
+        of the start is recorded in the stats!
+        sleep ... function that takes the time to sleep in seconds, e.g.
+        threading.Event().wait for a sleep that can be interrupted
+        """
+        if self.deadline is None:
+            self.start()
+        remaining = self.deadline - time.perf_counter_ns()
+        if remaining > 0:
+            sleep(remaining / 1e9)
+            if time.perf_counter_ns() < self.deadline:
+                # woken up early (e.g. the thread got stopped), so no sample
+                # is started and nothing is recorded:
+                return self.deadline
+        return self.started()
+
+    def started(self) -> int:
+        """Records the lateness of a sample started now and returns its
+        deadline (in ns), use this instead of wait() if someone else takes
+        care of the sleeping (e.g. the MultiplexThread)
+        """
+        self.stats.add((time.perf_counter_ns() - self.deadline) / 1e9)
+        return self.deadline
+
+    def done(self) -> int:
+        """Plans the deadline of the next sample according to the overrun
+        policy and returns it (in ns)
+        """
+        now = time.perf_counter_ns()
+        self.deadline += self.interval_ns
+        if now > self.deadline:
+            self.stats.overruns += 1
+            if self.overrun == SKIP:
+                # the next deadline on the grid which is still in the future:
+                missed = (now - self.deadline) // self.interval_ns + 1
+                self.deadline += missed * self.interval_ns
+                self.stats.skipped += missed
+            elif self.overrun == SHIFT:
+                self.deadline = now
+            # CATCH_UP: keep the passed deadline, the next sample starts right away
+        return self.deadline
+
+    def __repr__(self):
+        return "DeadlineScheduler<interval={}s, overrun={}, {}>".format(self.interval_ns / 1e9,
+                                                                       self.overrun,
+                                                                       self.stats)
+
+
+if __name__ == '__main__':
+    scheduler = DeadlineScheduler(0.05, overrun=SKIP)
+    scheduler.start()
+    for i in range(20):
+        scheduler.wait()
+        # every 5th "measurement" takes too long:
+        time.sleep(0.12 if i % 5 == 4 else 0.01)
+        scheduler.done()
+    print(scheduler)
@@ -0,0 +1,50 @@
+# --- module for the recording sinks of the UpdateThread ---
+
+import re
+
+
+class Sink():
+    """Abstract class for a recording sink: besides the text in the Terminal
+    the UpdateThread gives every row of aligned values to its sinks, a sink
+    stores them in some other format (e.g. binary, see mybinary module).
+
+    Usage (done by the UpdateThread):
+    sink.open(stem, names, units, start_time)   # at the start of a measurement
+    sink.write(row_time, values)                # for every row
+    sink.close()                                # at the end of the measurement
+    """
+    def open(self, stem, names, units, start_time):
+        """stem ... the filename of the measurement without extension (the text
+        file is <stem>.txt), names/units ... of the Instruments (one per column),
+        start_time ... time.time() at which the row time is 0
+        """
+        raise NotImplementedError("No method: open() implemented on", self.__class__.__name__)
+
+    def write(self, row_time, values):
+        """row_time ... seconds since the start, values ... one per Instrument"""
+        raise NotImplementedError("No method: write() implemented on", self.__class__.__name__)
+
+    def close(self):
+        raise NotImplementedError("No method: close() implemented on", self.__class__.__name__)
+
+    def __repr__(self):
+        return "{}<>".format(self.__class__.__name__)
+
+
+def unit_of(cls) -> str:
+    """Returns the unit of an Instrument class taken from its axis label,
+    e.g. "Force in N" -> "N", "Sensor ON/OFF (1/0)" -> "1/0" ("" if unknown)
+    """
+    try:
+        y_label = cls.get_labels()[0]
+    except Exception:
+        return ""
+    match = re.search(r"\(([^()]*)\)\s*$", y_label) or re.search(r"\bin\s+(\S+)\s*$", y_label)
+    return match.group(1) if match else ""
+
+
+def instrument_info(classes) -> tuple:
+    """Returns the names and units of the given Instrument classes"""
+    names = [cls.__name__ for cls in classes]
+    units = [unit_of(cls) for cls in classes]
+    return names, units
@@ -0,0 +1,237 @@
+# --- module for recording the measurements into a SQLite database ---
+
+import os
+import time
+import sqlite3
+# the interface of the UpdateThread's recording sinks:
+from mysinks import Sink
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
+
+# all the runs (measurements) of a directory go into one database file:
+#
+# runs ... one row per run: its name (the stem of the text file, e.g.
+# "20200101_120000"), time.time() at which its time is 0, number of rows
+# instruments ... the names and units of the Instruments of a run
+# samples ... one row per measured value: run, Instrument, time (seconds
+# since the start of the run) and value (NULL if the Instrument had none)
+#
+# -> the index on (run, instrument, time) finds the values of an Instrument in
+# a time window without looking at any other row!
+# -> the database is in WAL mode: the queries (e.g. from another program)
+# don't block the recording and the recording doesn't block them
+DATABASE = "measurements.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    start_time REAL NOT NULL,
+    start TEXT NOT NULL,
+    rows INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS instruments (
+    run INTEGER NOT NULL REFERENCES runs(id),
+    name TEXT NOT NULL,
+    unit TEXT NOT NULL,
+    PRIMARY KEY (run, name)
+);
+CREATE TABLE IF NOT EXISTS samples (
+    run INTEGER NOT NULL,
+    instrument TEXT NOT NULL,
+    time REAL NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS samples_run_instrument_time ON samples (run, instrument, time);
+"""
+
+
+def connect(filename) -> sqlite3.Connection:
+    """Opens (or creates) a database in WAL mode with the tables above"""
+    connection = sqlite3.connect(filename)
+    connection.execute("PRAGMA journal_mode=WAL")
+    # in WAL mode a commit is safe without a sync of every transaction:
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    connection.commit()
+    return connection
+
+
+class SQLiteSink(Sink):
+    """Records the rows into the database measurements.db next to the text
+    file (see above), a run per measurement.
+
+    The rows are collected here and inserted in one transaction per batch (at
+    most batch_rows rows or every batch_interval seconds). The database is only
+    used by the given FileWriter thread (see mywriter module), so write() never
+    waits for the disk and the connection stays on one thread.
+    """
+    def __init__(self, writer, batch_rows=1000, batch_interval=1.0):
+        self.writer = writer
+        self.batch_rows = batch_rows
+        self.batch_interval = batch_interval
+        self.names = []
+        self.rows = []
+        self.last_batch = time.perf_counter()
+        # only used on the writer thread:
+        self.connection = None
+        self.run = None
+
+    def open(self, stem, names, units, start_time):
+        self.names = list(names)
+        self.rows = []
+        self.last_batch = time.perf_counter()
+        filename = os.path.join(os.path.dirname(stem), DATABASE)
+        name = os.path.basename(stem)
+        start = time.strftime("%d.%B.%Y - %H:%M:%S", time.localtime(start_time))
+        instruments = list(zip(self.names, units))
+
+        def open_run():
+            self.connection = connect(filename)
+            with self.connection:
+                cursor = self.connection.execute("INSERT INTO runs (name, start_time, start) VALUES (?, ?, ?)",
+                                                 (name, start_time, start))
+                self.run = cursor.lastrowid
+                self.connection.executemany("INSERT INTO instruments VALUES (?, ?, ?)",
+                                            [(self.run, name, unit) for name, unit in instruments])
+            logger.info("Recording run %d (%s) into %s", self.run, name, filename)
+        self.writer.call(open_run)
+
+    def write(self, row_time, values):
+        self.rows.append((row_time, values))
+        if (len(self.rows) >= self.batch_rows or
+                time.perf_counter() - self.last_batch >= self.batch_interval):
+            self.write_batch()
+
+    def write_batch(self):
+        if not self.rows:
+            return
+        rows, names = self.rows, self.names
+        self.rows = []
+        self.last_batch = time.perf_counter()
+
+        def insert():
+            if self.connection is None:
+                return
+            samples = [(self.run, name, row_time, value)
+                       for row_time, values in rows
+                       for name, value in zip(names, values)]
+            # one transaction for the whole batch:
+            with self.connection:
+                self.connection.executemany("INSERT INTO samples VALUES (?, ?, ?, ?)", samples)
+                self.connection.execute("UPDATE runs SET rows = rows + ? WHERE id = ?",
+                                        (len(rows), self.run))
+        self.writer.call(insert)
+
+    def close(self):
+        self.write_batch()
+
+        def close_run():
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+        self.writer.call(close_run)
+
+    def __repr__(self):
+        return "SQLiteSink<run={}, batch_rows={}>".format(self.run, self.batch_rows)
+
+
+class MeasurementDatabase:
+    """Queries a database written by the SQLiteSink, e.g. the force between
+    14:00 and 14:05 in a run:
+
+    db = MeasurementDatabase("measurements.db")
+    run = db.run_id("20200101_120000")
+    t0 = datetime(2020, 1, 1, 14, 0).timestamp()
+    t1 = datetime(2020, 1, 1, 14, 5).timestamp()
+    db.samples(run, t0, t1, ["FMI220"], absolute=True)
+
+    The time is in seconds since the start of the run, with absolute=True the
+    times are time.time() values (t0 and t1 as well as the returned ones).
+    """
+    def __init__(self, filename=DATABASE):
+        self.filename = filename
+        self.connection = connect(filename)
+
+    def runs(self) -> list:
+        """All runs as (id, name, start_time, start, rows)"""
+        return self.connection.execute("SELECT id, name, start_time, start, rows FROM runs ORDER BY id").fetchall()
+
+    def run_id(self, name) -> int:
+        """The id of the latest run with the given name (the stem of its text file)"""
+        row = self.connection.execute("SELECT max(id) FROM runs WHERE name = ?", (name,)).fetchone()
+        if row[0] is None:
+            raise KeyError("No run {} in {}".format(name, self.filename))
+        return row[0]
+
+    def instruments(self, run) -> list:
+        """The Instruments of a run as (name, unit)"""
+        return self.connection.execute("SELECT name, unit FROM instruments WHERE run = ? ORDER BY rowid",
+                                       (run,)).fetchall()
+
+    def start_time(self, run) -> float:
+        return self.connection.execute("SELECT start_time FROM runs WHERE id = ?", (run,)).fetchone()[0]
+
+    def _window(self, run, t0, t1, absolute) -> tuple:
+        offset = self.start_time(run) if absolute else 0.0
+        t0 = float("-inf") if t0 is None else t0 - offset
+        t1 = float("inf") if t1 is None else t1 - offset
+        return t0, t1, offset
+
+    def samples(self, run, t0=None, t1=None, instruments=None, absolute=False) -> dict:
+        """The values with t0 <= time < t1 as {instrument: [(time, value), ...]},
+        instruments ... names of the Instruments (default: all of the run)
+        """
+        t0, t1, offset = self._window(run, t0, t1, absolute)
+        names = [name for name, _ in self.instruments(run)] if instruments is None else instruments
+        result = {}
+        for name in names:
+            rows = self.connection.execute("SELECT time, value FROM samples "
+                                           "WHERE run = ? AND instrument = ? AND time >= ? AND time < ? "
+                                           "ORDER BY time", (run, name, t0, t1)).fetchall()
+            result[name] = [(row_time + offset, value) for row_time, value in rows]
+        return result
+
+    def aggregates(self, run, t0=None, t1=None, instruments=None, absolute=False) -> dict:
+        """Count, min, max and mean of the values with t0 <= time < t1 as
+        {instrument: (count, min, max, mean)} (missing values aren't counted)
+        """
+        t0, t1, _ = self._window(run, t0, t1, absolute)
+        names = [name for name, _ in self.instruments(run)] if instruments is None else instruments
+        result = {}
+        for name in names:
+            result[name] = self.connection.execute("SELECT count(value), min(value), max(value), avg(value) "
+                                                   "FROM samples "
+                                                   "WHERE run = ? AND instrument = ? AND time >= ? AND time < ?",
+                                                   (run, name, t0, t1)).fetchone()
+        return result
+
+    def close(self):
+        self.connection.close()
+
+    def __repr__(self):
+        return "MeasurementDatabase<{}>".format(self.filename)
+
+
+if __name__ == '__main__':
+    import tempfile
+    from mywriter import FileWriter
+    # (not next to a real measurements.db)
+    directory = tempfile.mkdtemp()
+    writer = FileWriter()
+    writer.start()
+    sink = SQLiteSink(writer)
+    start_time = time.time()
+    sink.open(os.path.join(directory, "sqlite_test"), ["FMI220", "Keithley2000"], ["N", "OHM"], start_time)
+    for i in range(10000):
+        sink.write(i * 0.1, [i, float("nan") if i % 10 == 0 else -i])
+    sink.close()
+    writer.close()
+    db = MeasurementDatabase(os.path.join(directory, DATABASE))
+    run = db.run_id("sqlite_test")
+    print(db.runs())
+    print(db.samples(run, start_time + 10.0, start_time + 10.5, absolute=True))
+    print(db.aggregates(run, 100.0, 200.0))
+    db.close()
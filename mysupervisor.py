@@ -0,0 +1,149 @@
+# --- module for the supervision of the Instrument connections ---
+
+import math
+import time
+# gap markers are samples too:
+from myalign import Sample
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
+
+# the health states of an Instrument:
+HEALTHY = "healthy"             # the last measurement worked
+DEGRADED = "degraded"           # measurements failed, but not more than noe times in a row
+RECONNECTING = "reconnecting"   # the connection is restarted, with growing delays
+OPEN = "open"                   # circuit breaker open: too many failed restarts,
+                                # only one attempt every <open_time> seconds
+
+# the value of a gap marker, a sample with this value marks the time from
+# which on the Instrument didn't deliver values (NaN is shown as "nan"):
+GAP = math.nan
+
+
+def gap_sample() -> Sample:
+    """A sample which marks the start of a gap in the data of an Instrument"""
+    now = time.perf_counter()
+    return Sample(now, now, GAP)
+
+
+class InstrumentHealth:
+    """Keeps track of the health of one Instrument's connection, every engine
+    reports the results of the measurements and of the restarts here and asks
+    how long to wait before the next restart:
+
+    -> more than noe failed measurements in a row: restart the connection
+    -> a failed restart: wait base_delay, 2*base_delay, 4*base_delay, ...
+       (exponential backoff, at most max_delay) before the next restart
+    -> <threshold> failed restarts in a row: the circuit breaker opens, then
+       only one restart is tried every <open_time> seconds so a dead Instrument
+       doesn't keep the port (and us) busy all the time
+
+    on_change ... called with (health, old state) whenever the state changes
+    """
+    def __init__(self, name, noe, base_delay=1.0, max_delay=60.0, threshold=5, open_time=300.0,
+                 on_change=None):
+        assert noe>=0,"Number of errors must be >= 0!"
+        self.name = name
+        self.noe = noe
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.threshold = threshold
+        self.open_time = open_time
+        self.on_change = on_change
+        self.state = HEALTHY
+        # failed measurements and failed restarts in a row:
+        self.errors = 0
+        self.attempts = 0
+        # for the statistics:
+        self.total_errors = 0
+        self.reconnects = 0
+
+    def _set_state(self, state):
+        if state != self.state:
+            old, self.state = self.state, state
+            logger.info("Health of %s changed: %s -> %s", self.name, old, state)
+            if self.on_change is not None:
+                self.on_change(self, old)
+
+    def success(self):
+        """A measurement worked"""
+        self.errors = 0
+        self.attempts = 0
+        self._set_state(HEALTHY)
+
+    def failure(self) -> bool:
+        """A measurement failed, returns True if the connection should be
+        restarted now (more than noe failures in a row)
+        """
+        self.errors += 1
+        self.total_errors += 1
+        if self.errors > self.noe:
+            self._set_state(RECONNECTING)
+            return True
+        self._set_state(DEGRADED)
+        return False
+
+    @property
+    def needs_reconnect(self) -> bool:
+        return self.state in (RECONNECTING, OPEN)
+
+    def reconnect_delay(self) -> float:
+        """Seconds to wait before the next restart of the connection"""
+        if self.state == OPEN:
+            return self.open_time
+        if self.attempts == 0:
+            # the first restart is done right away:
+            return 0.0
+        return min(self.max_delay, self.base_delay * 2 ** (self.attempts - 1))
+
+    def reconnected(self, ok):
+        """Reports the result of a restart of the connection"""
+        if ok:
+            self.reconnects += 1
+            self.errors = 0
+            self.attempts = 0
+            # only a successful measurement makes it HEALTHY again:
+            self._set_state(DEGRADED)
+        else:
+            self.attempts += 1
+            if self.attempts >= self.threshold:
+                self._set_state(OPEN)
+
+    def __repr__(self):
+        return "InstrumentHealth<{}: {}, errors={}, reconnects={}>".format(self.name,
+                                                                         self.state,
+                                                                         self.total_errors,
+                                                                         self.reconnects)
+
+
+def try_reconnect(instrument, health) -> bool:
+    """Closes and opens the connection of an Instrument once, reports the result
+    to the health object and returns True if it worked
+    """
+    logger.info("Restarting the connection of %s ...", health.name)
+    try:
+        # the connection could be closed already, that's not an error:
+        instrument.close()
+    except Exception as e:
+        logger.debug("Closing %s failed: %s", health.name, e)
+    try:
+        instrument.open()
+    except Exception as e:
+        logger.error("Couldn't restart the connection of %s: %s", health.name, e)
+        health.reconnected(False)
+        return False
+    health.reconnected(True)
+    return True
+
+
+def reconnect(instrument, health, sleep) -> bool:
+    """Restarts the connection of an Instrument till it works, waits with the
+    given sleep function (takes seconds, returns True if we should stop) as
+    the health object demands, returns False if we should stop meanwhile
+    """
+    while True:
+        if sleep(health.reconnect_delay()):
+            return False
+        if try_reconnect(instrument, health):
+            return True
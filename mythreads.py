@@ -1,5 +1,7 @@
 import threading
 import time
+# Fifo.get raises queue.Empty like queue.Queue.get:
+import queue
 # we will need the next import for the DrawingProcess and the Lock
 # -> note: threading.Lock works with threads only while the
 # multiprocessing.Lock will work with both threads and processes!
@@ -10,23 +12,46 @@ import random
 
 # this is for the event handling e.g. of an error event in the MeasurementThread:
 from myevent import Event
+# for the timing control of the measurements:
+from myscheduler import DeadlineScheduler, SKIP
+# the samples are stamped with their time and put together into rows by time:
+from myalign import Sample, TimeAligner, NEAREST
+# for the supervision of the Instrument connections:
+from mysupervisor import InstrumentHealth, gap_sample, reconnect, try_reconnect
 # for deque:
 import collections
+# for the MultiplexThread, the heap of deadlines and the pool of worker threads:
+import heapq
+import concurrent.futures
+# the recording sinks get the names and units of the Instruments:
+import os
+from mysinks import instrument_info
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Fifo:
     """FIFO ... First In First Out buffer
     in such a buffer the threads will temporaly store the data
-    the access is synchronized wich is needed when multiple threads accessing it
-    with Lock.acquire() and Lock.release() used internally we ensure that only
+    the access is synchronized wich is needed when multiple threads accessing it,
+    a condition variable (a lock plus a wait/notify mechanism) ensures that only
     one thread at a time can access the fifo buffer -> no data corruption possible
+
+    Consumers don't need to poll has_item() any more:
+    -> get(timeout) blocks until an item arrives (e.g. the FileWriter), raises
+    queue.Empty if the timeout expires
+    -> drain(max_items) takes a whole batch of items with one lock acquisition
+    (e.g. the UpdateThread once per frame)
+    Items always leave the buffer in the order they were pushed (oldest first)!
     """
     def __init__(self, maxlen=None):
         self.data = collections.deque(maxlen=maxlen)
-        # self.lock = threading.Lock()
-        # the above code is for pure thread use only, with processes we need:
-        # (nothing else changes due to the same interface of both Lock implementations)
-        self.lock = multiprocessing.Lock()
+        # note: the deque lives in the memory of this process only, so a
+        # multiprocessing.Lock gave us nothing but extra overhead, a
+        # threading.Condition is all we need to synchronize the threads:
+        self.cond = threading.Condition(threading.Lock())
 
     def has_item(self) -> bool:
         return len(self.data) > 0
@@ -34,16 +59,14 @@ class Fifo:
     # a higher order function that executes an access function synchronized:
     def synchronized_access(self, access_function, *args):
         obj = None
-        try:
-            self.lock.acquire()
-            # here an error could be raised!
-            obj = access_function(*args)
-        except Exception as e:
-            print(e)
-        finally:
-            # make sure to release the lock even in error case or
-            # it will block forever!
-            self.lock.release()
+        # the with statement makes sure the lock is released even in error
+        # case or it will block forever!
+        with self.cond:
+            try:
+                # here an error could be raised!
+                obj = access_function(*args)
+            except Exception:
+                logger.exception("Synchronized access of %s failed", self)
         return obj
 
     def _clear_data(self):
@@ -54,214 +77,484 @@ class Fifo:
 
     def _push(self, data):
         self.data.append(data)
+        # wake up one consumer waiting in get():
+        self.cond.notify()
 
     def push(self, data):
         self.synchronized_access(self._push, data)
 
     def _pop(self):
-        return self.data.pop()
+        # popleft() -> the oldest item leaves the buffer first (real FIFO),
+        # raises IndexError if the buffer is empty!
+        return self.data.popleft()
 
     def pop(self) -> object:
         return self.synchronized_access(self._pop)
 
+    def get(self, timeout=None) -> object:
+        """Removes and returns the oldest item, blocks until an item is
+        available or <timeout> seconds passed (timeout=None waits forever),
+        raises queue.Empty if the timeout expired without an item arriving
+        (None is an item like any other)!
+        """
+        with self.cond:
+            if not self.cond.wait_for(self.has_item, timeout):
+                raise queue.Empty
+            return self.data.popleft()
+
+    def drain(self, max_items=None) -> list:
+        """Removes and returns up to <max_items> items (all if None) as a list,
+        oldest first, with a single lock acquisition, never blocks!
+        """
+        with self.cond:
+            if max_items is None or max_items >= len(self.data):
+                items = list(self.data)
+                self.data.clear()
+            else:
+                items = [self.data.popleft() for _ in range(max_items)]
+        return items
+
+    def __len__(self):
+        return len(self.data)
+
     def __repr__(self):
         return f"{self.data}"
 
 
+class ThreadControl:
+    """The run/idle/stop state of a thread built on a condition variable:
+    a thread that sleeps with sleep() or idles in wait_while_idle() is woken up
+    immediately when stop() or go() is called, no polling needed and an idle
+    thread doesn't use any CPU!
+    """
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.running = True
+        self.idle = False
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+
+    def wait(self):
+        with self.cond:
+            self.idle = True
+            self.cond.notify_all()
+
+    def go(self):
+        with self.cond:
+            self.idle = False
+            self.cond.notify_all()
+
+    def sleep(self, timeout) -> bool:
+        """Sleeps for timeout seconds or till stop() is called,
+        returns True if the thread should stop
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: not self.running, timeout)
+            return not self.running
+
+    def wait_while_idle(self) -> bool:
+        """Blocks as long as we are in idle mode (and not stopped),
+        returns True if the thread should go on running
+        """
+        with self.cond:
+            self.cond.wait_for(lambda: not self.idle or not self.running)
+            return self.running
+
+
 class MeasurementThread(threading.Thread):
 
-    def __init__(self, name, interval, count, instrument, noe, fifo, error_routine):
+    def __init__(self, name, interval, count, instrument, noe, fifo, error_routine, overrun=SKIP,
+                 retry_delay=1.0, **health_kwargs):
         threading.Thread.__init__(self)
         # noe ... number of errors --> this must be >= 0
         assert noe>=0,"Number of errors must be >= 0!"
 
         self.name = name
         self.interval = interval
+        # the measurements are started on absolute deadlines, overrun decides
+        # what happens if a measurement took longer than the interval
+        # (see myscheduler module for further information):
+        self.scheduler = DeadlineScheduler(interval, overrun)
         # count ... numer of measurements we want to do
         self.count = count
         self.instrument = instrument
-        self.noe = noe
+        # seconds to wait before a failed measurement is tried again:
+        self.retry_delay = retry_delay
         # a fifo buffer object to save the measured data in:
         self.fifo = fifo
-        # a flag to stop the thread, call thread.stop() to set the flag to False
-        self.run_flag = True
+        # the state of the thread, call thread.stop() to stop it or thread.wait()
+        # and thread.go() to go into and leave the idle mode:
+        # (if an error occurs in one thread than the other should wait with the
+        # measurement of new data)
+        self.control = ThreadControl()
         # every MeasurementThread has an event object which can have multiple
         # handlers registered (added) to it... this handlers will execute their
-        # code if the event is fired!
+        # code if the event is fired! (it's fired whenever the health state of
+        # the Instrument changes, the event argument is the InstrumentHealth)
         self.error_event = Event()
         self.error_event.add(error_routine)
-        # save the arguments in a tuple for the error_event handling!
-        self.args = (name, interval, count, instrument, noe, fifo, error_routine)
-        # if an error occurs in one thread than the other should wait with the
-        # measurement of new data:
-        self.wait_flag = False
-        print("Created", self)
+        # if more than noe measurements fail in a row this thread restarts the
+        # connection of its Instrument by itself, with growing delays and a
+        # circuit breaker (see mysupervisor module for the health_kwargs):
+        self.health = InstrumentHealth(name,
+                                       noe,
+                                       on_change=lambda health, old: self.error_event(self, earg=health),
+                                       **health_kwargs)
+        logger.info("Created %s", self)
 
     def run(self):
-        while self.count > 0 and self.run_flag:
+        # the first deadline is now:
+        self.scheduler.start()
+        while self.count > 0 and self.control.running:
+            # sleep till the deadline of this measurement, a stop() wakes us up:
+            self.scheduler.wait(sleep=self.control.sleep)
+            if not self.control.running:
+                break
             self.count -= 1
             success = False
-            start = time.time()
+            start = time.perf_counter()
             # the function can have errors from time to time, try count times
             # e.g. could happen when fetching data from an instrument
             while not success:
+                # go into idle state while one thread triggered the error event,
+                # go() or stop() will wake us up again:
+                if not self.control.wait_while_idle():
+                    # if stop button is pressed meanwhile we can leave the loop
+                    break
                 try:
-                    if self.wait_flag and self.run_flag:
-                        # go into idle state, this should be done if one thread
-                        # triggered the error event!
-                        time.sleep(0.2)
-                        # here we don't set success to True as long as wait is True!
-                    elif self.run_flag:
-                        # call the instruments measure function, here an error could happen:
-                        value = self.instrument.measure()
-                        # we only get here if we succesfuly called the function!
-                        success = True
-                    else:
-                        # if stop button is pressed meanwhile we can leave the loop
-                        break
+                    # call the instruments measure function, here an error could happen:
+                    t_request = time.perf_counter()
+                    value = self.instrument.measure()
+                    t_response = time.perf_counter()
+                    # we only get here if we succesfuly called the function!
+                    success = True
+                    self.health.success()
                 except Exception as e:
-                    print(self, "function call failed!")
-                    print("Error message:")
-                    print(e)
-                    self.noe -= 1
-                    # try again after 1 second!
-                    time.sleep(1)
-                # if more failures then specified raise RuntimeError:
-                if self.noe < 0:
-                    print(self, "failed multiple times!")
-                    # stop the thread:
-                    self.stop()
-                    print("Starting error routine...")
-                    self.error_event(self, earg=self.args)
-                    break
+                    logger.warning("%s function call failed: %s", self, e)
+                    if self.health.failure():
+                        logger.error("%s failed multiple times!", self)
+                        # mark the gap in the data of this Instrument...
+                        self.fifo.push(gap_sample())
+                        # ...and restart its connection, only this thread waits
+                        # for that, all the other Instruments keep on measuring:
+                        if not reconnect(self.instrument, self.health, self.control.sleep):
+                            # stop button pressed meanwhile
+                            break
+                    else:
+                        # try again after retry_delay seconds (or stop right away!)
+                        self.control.sleep(self.retry_delay)
 
             if success == False:
                 # if we don't do that the last succesfully measured value
                 # will be pushed on data queue in error case!
                 break
-            # put the result of the measure method on the fifo buffer:
-            self.fifo.push(value)
-            print(self, "put value:", value, "on data queue!")
-
-            # for timing control of measurement:
-            dur = time.time() - start
-            print("{} needed {}s to execute measurement succesfuly!".format(self, dur))
-            if dur < self.interval:
-                time.sleep(self.interval - dur)
+            # put the result of the measure method on the fifo buffer,
+            # together with the time it was measured:
+            self.fifo.push(Sample(t_request, t_response, value))
+            # (the arguments are only formatted if debug output is on)
+            logger.debug("%s put value: %s on data queue, needed %.6fs",
+                         self, value, time.perf_counter() - start)
+            # plan the deadline of the next measurement:
+            self.scheduler.done()
 
         # if stop button pressed we will come to this point, where the thread
         # really has stopped!
-        print(self, "has stopped!")
+        logger.info("%s has stopped! %s %s", self, self.scheduler.stats, self.health)
 
     def stop(self):
         if self.count == 0:
-            print(self, "has already finished the work")
+            logger.info("%s has already finished the work", self)
         else:
-            print(self, "trying to stopp!")
-            self.run_flag = False
+            logger.info("%s trying to stopp!", self)
+            self.control.stop()
 
     def wait(self):
-        print(self, "will go into idle mode!")
-        self.wait_flag = True
+        logger.info("%s will go into idle mode!", self)
+        self.control.wait()
 
     def go(self):
-        print(self, "will go into measurement mode!")
-        self.wait_flag = False
+        logger.info("%s will go into measurement mode!", self)
+        self.control.go()
 
     def __repr__(self):
         return "MeasurementThread: {} with id: {}".format(self.name, id(self))
 
+
+class MultiplexThread(threading.Thread):
+    """One thread that drives the measurements of all Instruments instead of
+    one MeasurementThread per Instrument!
+
+    The next deadline of every Instrument is kept in a heap (so the earliest
+    deadline is always on top), when a deadline is reached the blocking
+    measure() call is handed to a bounded pool of worker threads. An Instrument
+    gets its next deadline only after its measurement has finished, so one
+    Instrument is never measured by two workers at the same time. The number
+    of threads stays the same no matter how many Instruments are used:
+    1 scheduling thread + <workers> worker threads
+
+    note: this thread has the same interface as the MeasurementThread
+    (start, stop, wait, go, join) so the MeasurementPage can handle both the
+    same way!
+    """
+    def __init__(self, interval, count, instruments, noe, fifos, overrun=SKIP, workers=4,
+                 **health_kwargs):
+        threading.Thread.__init__(self)
+        assert noe>=0,"Number of errors must be >= 0!"
+        assert len(instruments) == len(fifos), "Each Instrument needs a fifo!"
+
+        self.instruments = instruments
+        self.fifos = fifos
+        # for every Instrument: the remaining measurements and the health of
+        # the connection (see mysupervisor module for the health_kwargs):
+        self.counts = [count] * len(instruments)
+        self.healths = [InstrumentHealth(instrument.__class__.__name__, noe, **health_kwargs)
+                        for instrument in instruments]
+        # every Instrument gets its own deadlines (see myscheduler module):
+        self.schedulers = [DeadlineScheduler(interval, overrun) for _ in instruments]
+        self.workers = workers
+        # the heap of (deadline in ns, Instrument index) entries which are due
+        # next, it's shared with the worker threads so we need to synchronize
+        # the access, the condition also wakes us up for new entries:
+        self.heap = []
+        self.cond = threading.Condition()
+        # number of measurements currently done by the workers:
+        self.busy = 0
+        self.run_flag = True
+        self.wait_flag = False
+        logger.info("Created %s", self)
+
+    def run(self):
+        start = time.perf_counter_ns()
+        with self.cond:
+            for i, scheduler in enumerate(self.schedulers):
+                scheduler.start(start)
+                if self.counts[i] > 0:
+                    heapq.heappush(self.heap, (scheduler.deadline, i))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers,
+                                                   thread_name_prefix="MultiplexWorker") as pool:
+            with self.cond:
+                while self.run_flag and (self.heap or self.busy):
+                    # idle mode, do nothing till go() or stop() is called:
+                    if self.wait_flag or not self.heap:
+                        self.cond.wait()
+                        continue
+                    deadline, i = self.heap[0]
+                    remaining = deadline - time.perf_counter_ns()
+                    if remaining > 0:
+                        # sleep till the deadline, a new heap entry or a
+                        # stop/wait call will wake us up earlier:
+                        self.cond.wait(remaining / 1e9)
+                        continue
+                    heapq.heappop(self.heap)
+                    self.busy += 1
+                    pool.submit(self.measure, i)
+
+        logger.info("%s has stopped!", self)
+        for health, scheduler in zip(self.healths, self.schedulers):
+            logger.info("%s %s", health, scheduler.stats)
+
+    def measure(self, i):
+        """Runs on a worker thread: measures Instrument i once and puts it
+        back on the heap with its next deadline, if the Instrument failed more
+        than noe times in a row the job restarts its connection instead and the
+        next restart (if needed) is put on the heap with the delay the health
+        object demands (see mysupervisor module), no worker is blocked while
+        we wait for that and all the other Instruments keep on measuring!
+        """
+        instrument = self.instruments[i]
+        scheduler = self.schedulers[i]
+        health = self.healths[i]
+        if health.needs_reconnect:
+            if try_reconnect(instrument, health):
+                deadline = scheduler.done()
+            else:
+                deadline = time.perf_counter_ns() + int(health.reconnect_delay() * 1e9)
+        else:
+            scheduler.started()
+            try:
+                t_request = time.perf_counter()
+                value = instrument.measure()
+                self.fifos[i].push(Sample(t_request, time.perf_counter(), value))
+                self.counts[i] -= 1
+                health.success()
+                logger.debug("%s put value: %s of %s on data queue!", self, value, health.name)
+                deadline = scheduler.done()
+            except Exception as e:
+                logger.warning("%s %s function call failed: %s", self, health.name, e)
+                if health.failure():
+                    logger.error("%s failed multiple times!", health.name)
+                    # mark the gap in the data of this Instrument:
+                    self.fifos[i].push(gap_sample())
+                    deadline = time.perf_counter_ns() + int(health.reconnect_delay() * 1e9)
+                else:
+                    deadline = scheduler.done()
+        with self.cond:
+            self.busy -= 1
+            if self.counts[i] > 0 and self.run_flag:
+                heapq.heappush(self.heap, (deadline, i))
+            self.cond.notify()
+
+    def stop(self):
+        logger.info("%s trying to stopp!", self)
+        with self.cond:
+            self.run_flag = False
+            self.cond.notify()
+
+    def wait(self):
+        logger.info("%s will go into idle mode!", self)
+        with self.cond:
+            self.wait_flag = True
+            self.cond.notify()
+
+    def go(self):
+        logger.info("%s will go into measurement mode!", self)
+        with self.cond:
+            self.wait_flag = False
+            self.cond.notify()
+
+    def __repr__(self):
+        return "MultiplexThread with id: {}".format(id(self))
+
 class UpdateThread(threading.Thread):
 
-    def __init__(self, fps, container, fifos, instruments, buffer):
+    def __init__(self, fps, container, fifos, classes, buffer,
+                 period=1.0, policy=NEAREST, tolerance=None, max_wait=None, sinks=()):
         threading.Thread.__init__(self)
         # interval ... interval in which the thread calls container.update()
         self.interval = 1.0/fps
         # the container object which should be updated,
         # must have a update() and a create_header() method!
         self.container = container
-        # fifos are the fifo buffers where all the different Instrument values
+        # fifos are the fifo buffers where all the different Instrument samples
         # where collected, this is a list containing Fifo objects!
         self.fifos = fifos
         self.start_time = None
-        # a list containing Instrument objects:
-        self.instruments = instruments
+        # a list containing the Instrument classes (one per fifo, the names and
+        # units come from them, so no Instrument object is needed here, e.g.
+        # they live in the worker processes of the "processes" engine):
+        self.classes = classes
         # we need the buffer to collect all the data and send it to the GraphPage:
         self.buffer = buffer
-        # a flag to stop the thread, call thread.stop() to set the flag to False
-        self.run_flag = True
-        self.wait_flag = False
-        print("Created", self)
+        # the samples of the Instruments are put together into rows by their
+        # time stamps, one row every <period> seconds (the measurement interval)
+        # see myalign module for the policy, tolerance and max_wait parameters:
+        self.period = period
+        self.policy = policy
+        self.tolerance = tolerance
+        self.max_wait = max_wait
+        self.aligner = None
+        # the rows are recorded by the sinks too (see mysinks module):
+        self.sinks = list(sinks)
+        # the state of the thread, see ThreadControl:
+        self.control = ThreadControl()
+        logger.info("Created %s", self)
 
     def run(self):
         #  we need a reference time:
-        self.start_time = time.time()
+        # (the same clock the samples are stamped with)
+        self.start_time = time.perf_counter()
+        self.aligner = TimeAligner(len(self.fifos),
+                                   self.period,
+                                   self.start_time,
+                                   self.policy,
+                                   self.tolerance,
+                                   self.max_wait)
+        logger.info("%s uses %s", self, self.aligner)
         # update the container with the header message:
         self.container.update(self.container.new_measurement_init())
-
-        while self.run_flag:
-            start = time.time()
-            all_have_item = True
-
-            # for debbug purpose only:
-            for fifo in self.fifos:
-                print(fifo.data)
-
-            for fifo in self.fifos:
-                if not fifo.has_item():
-                    all_have_item = False
-                    # if one fifo has no item we can escape the for loop:
-                    break
-
-            # when all fifos have items:
-            if all_have_item:
-                # a bundle of all the measured data we also want to get plotted:
-                bundle = []
-                # create a message containing all the measurement information:
-                # (time is trunctated to only show 3 digits after comma)
-                time_ = float("%.3f" % (time.time() - self.start_time))
-                bundle.append(time_)
-                msg = "Time: {}, ".format(bundle[-1])
-                # zip returns an iterator of tuples, so we can loop through
-                # multiple lists in parallel:
-                for fifo, instrument in zip(self.fifos, self.instruments):
-                    # synchronized data access:
-                    bundle.append(fifo.pop())
-                    msg += "{}: {}, ".format(instrument.__class__.__name__, bundle[-1])
-                # call the update function of the container:
-                self.container.update(msg)
-                # add the bundle of data to the buffer for the GraphPage,
-                # synchronized data access:
-                self.buffer.push(bundle)
-                print("Data bundle sent to GraphPage:", bundle)
+        # the sinks record into files with the same name as the container's:
+        stem = os.path.splitext(self.container.filename)[0]
+        names, units = instrument_info(self.classes)
+        # time.time() at the start_time:
+        start = time.time() - (time.perf_counter() - self.start_time)
+        for sink in self.sinks:
+            sink.open(stem, names, units, start)
+
+        while self.control.running:
+            start = time.perf_counter()
+
+            # for debbug purpose only (the level check keeps this cheap):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("Samples waiting in the fifos: %s", [len(fifo) for fifo in self.fifos])
+
+            # take all the samples that arrived meanwhile, one lock acquisition
+            # per fifo is enough (no blocking get() per fifo: the rows are made
+            # by time, so the thread runs once per frame and never waits for
+            # one Instrument):
+            for channel, fifo in enumerate(self.fifos):
+                for sample in fifo.drain():
+                    self.aligner.add(channel, sample)
+
+            # send all the rows for which the samples of all the Instruments
+            # are there (or the slow ones have been waited for long enough):
+            for row_time, values in self.aligner.ready(time.perf_counter()):
+                self.send_bundle(row_time, values)
 
             # for timing control of the updates:
-            dur = time.time() - start
+            # (a stop() ends the sleep right away)
+            dur = time.perf_counter() - start
             if dur < self.interval:
-                time.sleep(self.interval - dur)
+                self.control.sleep(self.interval - dur)
 
             # going into idle mode, if meanwhile the stop button is pressed
             # we leave the loop!
-            while self.wait_flag and self.run_flag:
-                print(self, "waiting...")
-                # idle mode do nothing while wait is True!
-                time.sleep(0.2)
-
-        # if stop button pressed we will come to this point, where the thread
-        # really has stopped!
-        print(self, "has stopped!")
+            if self.control.idle:
+                logger.info("%s waiting...", self)
+                # idle mode do nothing till go() or stop() is called!
+                self.control.wait_while_idle()
+
+        # if stop button pressed we will come to this point, the samples that
+        # are still in the fifos and the rows the aligner holds back (waiting
+        # for a slow Instrument) are the last ones of the measurement:
+        for channel, fifo in enumerate(self.fifos):
+            for sample in fifo.drain():
+                self.aligner.add(channel, sample)
+        for row_time, values in self.aligner.ready(time.perf_counter()) + self.aligner.flush():
+            self.send_bundle(row_time, values)
+
+        # the thread really has stopped now!
+        for sink in self.sinks:
+            sink.close()
+        logger.info("%s has stopped!", self)
+
+    def send_bundle(self, row_time, values):
+        # a bundle of all the measured data we also want to get plotted:
+        bundle = []
+        # create a message containing all the measurement information:
+        # (time is trunctated to only show 3 digits after comma)
+        time_ = float("%.3f" % (row_time - self.start_time))
+        bundle.append(time_)
+        msg = "Time: {}, ".format(bundle[-1])
+        # zip returns an iterator of tuples, so we can loop through
+        # multiple lists in parallel:
+        for value, cls in zip(values, self.classes):
+            bundle.append(value)
+            msg += "{}: {}, ".format(cls.__name__, bundle[-1])
+        # call the update function of the container:
+        self.container.update(msg)
+        # add the bundle of data to the buffer for the GraphPage,
+        # synchronized data access:
+        self.buffer.push(bundle)
+        # and record the row with the full time resolution:
+        for sink in self.sinks:
+            sink.write(row_time - self.start_time, values)
+        logger.debug("Data bundle sent to GraphPage: %s", bundle)
 
     def stop(self):
-        print(self, "trying to stopp!")
-        self.run_flag = False
+        logger.info("%s trying to stopp!", self)
+        self.control.stop()
 
     def wait(self):
-        print(self, "in idle mode!")
-        self.wait_flag = True
+        logger.info("%s in idle mode!", self)
+        self.control.wait()
 
     def go(self):
-        print(self, "in update mode!")
-        self.wait_flag = False
+        logger.info("%s in update mode!", self)
+        self.control.go()
 
     def __repr__(self):
         return "UpdateThread with id: {}".format(id(self))
@@ -1,5 +1,8 @@
 # --- module for general utility functions ---
 import os
+import logging
+
+logger = logging.getLogger(__name__)
 
 def swap(list, old, new):
     """Swaps the old element of a list with the new element"""
@@ -25,7 +28,7 @@ def delete_empty_dict_entries(dictionary) -> dict:
     # delete invalid entries from dictionary:
     for key in invalid_keys:
         del dictionary[key]
-    print("Empty entries got deleted, new dictionary:", dictionary)
+    logger.info("Empty entries got deleted, new dictionary: %s", dictionary)
     return dictionary
 
 if __name__ == '__main__':
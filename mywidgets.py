@@ -6,11 +6,19 @@ from PIL import ImageTk
 import tkinter
 from tkinter import *
 import json
+import threading
+import collections
 from tkinter import messagebox
 from tkinter import filedialog
 from myparse import *
+# the Terminal saves the data with a writer thread:
+from mywriter import FileWriter
+from myrecorder import SegmentRecorder
+# the lines wait in a fifo till the GUI thread shows them:
+from mythreads import Fifo
 
 # for the Graph:
+import numpy as np
 import matplotlib
 matplotlib.use('TkAgg')
 from matplotlib.figure import Figure
@@ -21,6 +29,10 @@ from matplotlib.backends.backend_tkagg import (FigureCanvasTkAgg,
 
 # to create the time information for the header in the Container widget:
 import time
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
 
 
 class Graph():
@@ -44,7 +56,7 @@ class FancyGraph(Graph):
         Params:
         frame ... a frame in which we want to have a graph with
         update and clear functionality
-        buffer ... the fifo buffer from which we get data
+        buffer ... the ring buffer from which we get data
         title ... title of the graph
         x_label ... label for the x axis
         class_info ... a list of selected instrument classes
@@ -54,7 +66,7 @@ class FancyGraph(Graph):
         # a frame in which we want to have a graph with
         # update and clear functionality:
         self.frame = frame
-        # the fifo buffer from which we get data:
+        # the ring buffer from which we get data:
         self.buffer = buffer
         # set up the graph:
         self.figure = Figure(figsize=(6,5), dpi=100)
@@ -72,6 +84,8 @@ class FancyGraph(Graph):
         ]
         # if we want to draw a line between the points we need to know the previous point:
         self.prev_data = None
+        # the absolute index of the next sample we want to read from the buffer:
+        self.cursor = 0
 
         # set the axes up with all the properties defined above:
         self.setup_axes()
@@ -140,10 +154,12 @@ class FancyGraph(Graph):
 
     def update(self):
         # instr1, instr2 ... measured data from each instrument,
-        # the buffer data looks like: [[time, instr1, instr2,...], [...], ...]
-        while self.buffer.has_item():
-            data = self.buffer.pop()
-            print("Data:", data)
+        # the buffer data looks like: [[time, time, ...], [instr1, instr1, ...], ...]
+        # (read all the samples that arrived since the last update at once,
+        # the data is a view of the buffer -> no copy is made)
+        data, self.cursor = self.buffer.read(self.cursor)
+        logger.debug("Data: %d new samples", data.shape[1])
+        if data.shape[1] > 0:
             # the isntrument data starts at index 1 of data buffer:
             index = 1
             for axe, style in zip(self.axes, self.styles):
@@ -156,14 +172,31 @@ class FancyGraph(Graph):
                 axe.autoscale(enable=True, axis='both', tight=None)
                 # if we have no previous data or we don't want to have a line,
                 # else we will draw a line which is why we need previous data
-                if self.prev_data == None or "-" not in format:
-                    axe.plot(data[0], data[index], format)
+                # to connect it with the new points:
+                # (matplotlib keeps the arrays it gets, so hand it copies and
+                # not the views which will be overwritten by newer samples)
+                if self.prev_data is None or "-" not in format:
+                    axe.plot(data[0].copy(), data[index].copy(), format)
                 else:
-                    axe.plot((self.prev_data[0], data[0]),
-                             (self.prev_data[index], data[index]),
+                    axe.plot(np.concatenate(([self.prev_data[0]], data[0])),
+                             np.concatenate(([self.prev_data[index]], data[index])),
                              format)
                 index += 1
-            self.prev_data = data
+            # copy the last sample, the view could be overwritten meanwhile:
+            self.prev_data = data[:, -1].copy()
+        self.canvas.draw()
+
+    def plot_recording(self, recording, t0=None, t1=None):
+        """Plots the time window t0 <= time < t1 of a recording (a reader of
+        the myparse.open_recording function), the recording must have the
+        Instruments of class_info as columns
+        """
+        names = [cls.__name__ for cls in self.class_info]
+        data = recording.read(t0, t1, names)
+        for axe, style, values in zip(self.axes, self.styles, data[1:]):
+            _, format = style
+            axe.autoscale(enable=True, axis='both', tight=None)
+            axe.plot(data[0], values, format)
         self.canvas.draw()
 
     def clear(self):
@@ -185,7 +218,7 @@ class FancyGraph(Graph):
         self.y_legend_labels.clear()
 
         # in class_info there are all Instrument classes we want to plot measured data from!
-        print("Classes used:", self.class_info)
+        logger.info("Classes used: %s", self.class_info)
         # raises an AssertionError if there are more than 3 Instruments selected
         assert len(self.class_info) <= 3, "A maximum of 3 axes are supported!"
 
@@ -255,19 +288,159 @@ class Terminal(Text, Container):
     """Create a terminal class which inherites from tkinter.Text class and
     from the abstract class Container which is the interface we
     need to pass an object as a container to the UpdateThread!
+
+    The data is saved by a FileWriter thread (see mywriter module), update()
+    only puts the line on its queue, so a slow disk doesn't slow down the
+    UpdateThread! flush_interval and fsync_interval are passed to the FileWriter.
+    The save file is split into segments of at most max_bytes bytes or
+    max_seconds seconds which are written crash-safe (see myrecorder module),
+    with compression="gz" or "xz" they are compressed while they are written.
+
+    update() can be called from any thread: tkinter widgets must only be touched
+    by the GUI thread, so the lines wait in a fifo and the Tk event loop takes
+    all of them every <frame_time> seconds (with after()) and inserts them at
+    once -> one redraw per frame and not one per line!
+
+    The terminal shows at most about <max_lines> lines, the oldest lines are
+    deleted in blocks of max_lines // 10 lines (one delete instead of one per
+    line), so memory and update time stay the same even for runs of days.
+    With virtual=True the deleted lines aren't lost: scrolling to the top loads
+    the <page_lines> lines before from the save file again (not possible for
+    a compressed save file).
     """
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, *args, flush_interval=1.0, fsync_interval=10.0, frame_time=0.05,
+                 max_lines=10000, virtual=False, page_lines=500,
+                 max_bytes=64 * 1024 * 1024, max_seconds=24 * 3600, compression="", **kwargs):
         Text.__init__(self, parent, *args, **kwargs)
+        self.writer = FileWriter(flush_interval, fsync_interval)
+        self.writer.start()
+        self.recorder = SegmentRecorder(self.writer, max_bytes, max_seconds, compression)
+        # the lines that weren't shown yet, as (filename, line, byte offset) tuples:
+        self.pending = Fifo()
+        self.frame_ms = max(1, int(frame_time * 1000))
+        self.max_lines = max_lines
+        self.trim_lines = max(1, max_lines // 10)
+        self.virtual = virtual
+        self.page_lines = page_lines
+        # number of lines in the terminal:
+        self.lines = 0
+        # the file of the lines shown, lines at the top which belong to an older
+        # file and the lines of the file which aren't shown (above the first line):
+        self.view_file = None
+        self.foreign = 0
+        self.hidden = 0
+        # the byte offsets of the shown lines of the file (from the recorder,
+        # so paging in never has to search the file):
+        self.offsets = collections.deque()
+        if virtual:
+            # scrolling with the mouse wheel or the keys doesn't go through yview():
+            for sequence in ("<MouseWheel>", "<Button-4>", "<Prior>", "<Up>", "<Control-Home>"):
+                self.bind(sequence, lambda event: self.after_idle(self._page_in), add="+")
+        self.after_id = self.after(self.frame_ms, self.render)
+
+    def new_measurement_init(self) -> str:
+        header = Container.new_measurement_init(self)
+        # the header is the first line of the new recording:
+        self.recorder.start(self.filename)
+        return header
 
     def update(self, msg):
-        # save msg to file (append data if file already filled with content,
-        # or create file if no file with that name exists)
-        with open(self.filename, "a+") as f:
-            f.write(msg + "\n")
-        # show msg in the terminal:
-        self.insert(END, msg + "\n")
-        # for autoscrolling to the bottom position:
-        self.yview_moveto(1)
+        # save msg to the active segment of the save file:
+        segment, offset = self.recorder.write(msg + "\n")
+        # show msg in the terminal with the next frame:
+        self.pending.push((segment, msg + "\n", offset))
+
+    def render(self):
+        """Runs on the GUI thread once per frame: shows all pending lines"""
+        items = self.pending.drain()
+        if items:
+            # only scroll with the new lines if the user looks at the end:
+            follow = self.yview()[1] >= 1.0
+            # one insert for all the lines of this frame (and file):
+            lines = []
+            for filename, line, offset in items:
+                if filename != self.view_file:
+                    self._insert(lines)
+                    lines = []
+                    # the lines shown so far belong to an other file:
+                    self.view_file = filename
+                    self.foreign = self.lines
+                    # the header line of a later segment isn't shown:
+                    self.hidden = 0 if line.startswith("Starting new measurement") else 1
+                    self.offsets.clear()
+                lines.append(line)
+                self.offsets.append(offset)
+            self._insert(lines)
+            # while the user looks at older lines they are only deleted if
+            # there are far too many:
+            limit = self.max_lines if follow else 2 * self.max_lines
+            if self.lines > limit + self.trim_lines:
+                self._trim(self.lines - self.max_lines)
+            if follow:
+                # for autoscrolling to the bottom position:
+                self.yview_moveto(1)
+        self.after_id = self.after(self.frame_ms, self.render)
+
+    def _insert(self, lines):
+        if lines:
+            self.insert(END, "".join(lines))
+            self.lines += len(lines)
+
+    def _trim(self, n):
+        """Deletes the n oldest lines at once"""
+        self.delete("1.0", "{}.0".format(n + 1))
+        self.lines -= n
+        dropped = min(n, self.foreign)
+        self.foreign -= dropped
+        self.hidden += n - dropped
+        # the first line left has its offset at offsets[0] now:
+        for _ in range(n - dropped):
+            self.offsets.popleft()
+
+    def yview(self, *args):
+        result = Text.yview(self, *args)
+        # the scrollbar calls yview("moveto"/"scroll", ...):
+        if args and self.virtual:
+            self.after_idle(self._page_in)
+        return result
+
+    def _page_in(self):
+        """Loads older lines from the save file if the user scrolled to the top"""
+        if self.hidden == 0 or self.foreign > 0 or self.yview()[0] > 0.0:
+            return
+        # a compressed file can't be read backwards:
+        if self.recorder.compression or not self.offsets:
+            return
+        try:
+            # the active segment is still a .part file:
+            filename = self.recorder.readable(self.view_file)
+            # (no flush here, the GUI must not wait for the disk: the deleted
+            # lines are old, the FileWriter has written them long ago)
+            offsets, lines = lines_before(filename, self.offsets[0], min(self.page_lines, self.hidden))
+        except OSError as e:
+            logger.warning("Couldn't read older lines from %s: %s", self.view_file, e)
+            return
+        if not lines:
+            return
+        self.insert("1.0", "".join(lines))
+        self.lines += len(lines)
+        self.hidden -= len(lines)
+        self.offsets.extendleft(reversed(offsets))
+        # stay at the line we looked at before:
+        self.see("{}.0".format(len(lines) + 1))
+
+    def clear(self):
+        """Clears the terminal and drops the lines that weren't shown yet"""
+        self.pending.clear_data()
+        self.delete(1.0, END)
+        self.lines = 0
+        self.foreign = 0
+        self.hidden = 0
+        self.offsets.clear()
+
+    def destroy(self):
+        self.after_cancel(self.after_id)
+        Text.destroy(self)
 
 
 class Checkbuttons(Frame):
@@ -290,7 +463,7 @@ class Checkbuttons(Frame):
 
     # this is used to get all the class objects in a list:
     def get_selected_classes(self) -> list:
-        print("Selected buttons:", [var.get() for var in self.vars])
+        logger.info("Selected buttons: %s", [var.get() for var in self.vars])
         selection = []
         for cls, var in zip(self.classes, self.vars):
             # a selected button has a variable value of 1, 0 otherwise!
@@ -403,11 +576,13 @@ class SettingsBox(Frame):
         # note: file has to have extension!
         return filedialog.asksaveasfilename(initialdir=path,
                                             title="Select setting file location you want to save the current settings",
-                                            filetypes=(("text files","*.txt"),("all files","*.*")))
+                                            filetypes=(("text files","*.txt"),
+                                                       ("compressed text files","*.gz *.xz"),
+                                                       ("all files","*.*")))
 
     def get_current_directory_path(self):
         self._path = os.path.dirname(os.path.abspath( __file__ ))
-        print("Current directory:", self._path)
+        logger.info("Current directory: %s", self._path)
 
     def _fetch(self) -> dict:
         """Returns a dictionary with the text labels as keys and the entry values
@@ -421,7 +596,7 @@ class SettingsBox(Frame):
         a file!
         """
         self._settings = self._fetch()
-        print("SettingsBox._settings = {}".format(self._settings))
+        logger.info("SettingsBox._settings = %s", self._settings)
 
     def save(self):
         """Save the dictionary with the settings to the file with the given
@@ -437,8 +612,7 @@ class SettingsBox(Frame):
             try:
                 f.write(json.dumps(self._settings))
             except Exception as e:
-                print("Couldn't save settings to file!")
-                print(e)
+                logger.error("Couldn't save settings to file! %s", e)
 
     def load(self):
         """Load the dictionary with the settings from the file with the given
@@ -458,11 +632,10 @@ class SettingsBox(Frame):
             with open(filename, "r") as f:
                 json_str = f.read()
                 self._settings = json.loads(json_str)
-                print("SettingsBox._settings = {}".format(self._settings))
+                logger.info("SettingsBox._settings = %s", self._settings)
 
         except Exception as e:
-            print("Couldn't load settings from file!")
-            print(e)
+            logger.error("Couldn't load settings from file! %s", e)
 
         try:
             i = 0
@@ -473,8 +646,7 @@ class SettingsBox(Frame):
                 i += 2
 
         except Exception as e:
-            print("Couldn't set widgets accordingly!")
-            print(e)
+            logger.error("Couldn't set widgets accordingly! %s", e)
 
 
 class PreviewBox(Frame):
@@ -553,14 +725,65 @@ class PreviewBox(Frame):
             self.canvas.image = self.image
 
 
+class SeriesDialog(Toplevel):
+    """Asks which measurement of a file with several ones should be converted,
+    index ... the measurements of the file (see myparse.index_series)
+    after the dialog is closed:
+    cancelled ... True if nothing was chosen
+    choice ... the index of the measurement or None for the whole file
+    """
+    def __init__(self, parent, index, *args, **kwargs):
+        Toplevel.__init__(self, parent, *args, **kwargs)
+        self.title("Select measurement")
+        self.cancelled = True
+        self.choice = None
+        Label(self, text="The file holds {} measurements:".format(len(index))).grid(row=0, column=0,
+                                                                                   columnspan=2,
+                                                                                   sticky="w")
+        self.listbox = Listbox(self, width=90, height=min(15, len(index) + 1))
+        self.listbox.grid(row=1, column=0, columnspan=2, sticky="nesw")
+        self.listbox.insert(END, "All measurements (the whole file)")
+        for i, entry in enumerate(index):
+            self.listbox.insert(END, "{}: {} - {} rows - {}".format(i + 1,
+                                                                   entry["start"],
+                                                                   entry["rows"],
+                                                                   ", ".join(entry["instruments"])))
+        self.listbox.selection_set(1)
+        self.listbox.bind("<Double-Button-1>", lambda event: self.ok())
+        Button(self, text="Convert", command=self.ok).grid(row=2, column=0, sticky="ew")
+        Button(self, text="Cancel", command=self.destroy).grid(row=2, column=1, sticky="ew")
+        # modal: wait here till the dialog is closed
+        self.transient(parent)
+        self.grab_set()
+        self.wait_window(self)
+
+    def ok(self):
+        selection = self.listbox.curselection()
+        if not selection:
+            return
+        self.cancelled = False
+        self.choice = None if selection[0] == 0 else selection[0] - 1
+        self.destroy()
+
+
 class ParsingBox(Frame):
     """A Frame for parsing a selected measurement file from the system explorer,
     (this is in my own format I used for logging the measured data)
     --> this Frame contains a preview of the parsed output for the currently
     selected output format using my PreviewBox class!
+
+    The conversion runs in a background thread (so the GUI doesn't freeze for
+    big files) and big text files are parsed by <processes> processes (None ->
+    one per CPU core, see myparse.file_to_sv_parallel).
     """
-    def __init__(self, parent, *args, **kwargs):
+    def __init__(self, parent, *args, processes=None, **kwargs):
         Frame.__init__(self, parent, *args, **kwargs)
+        self.processes = processes
+        # the thread of the running conversion (or indexing) and its error (if any):
+        self.convert_thread = None
+        self.convert_error = None
+        # the measurements of the file to convert (see myparse.index_series):
+        self.index = []
         # IntVar to save last pressed button selection code of PreviewBox:
         self.selected = IntVar()
         self.previewbox = PreviewBox(self, self.selected)
@@ -575,31 +798,109 @@ class ParsingBox(Frame):
         # note: file has to have extension!
         return filedialog.askopenfilename(initialdir=path,
                                           title="Select measurement file",
-                                          filetypes=(("text files","*.txt"),("all files","*.*")))
+                                          filetypes=(("text files","*.txt"),
+                                                     ("compressed text files","*.txt.gz *.txt.xz"),
+                                                     ("recordings","*.bin *.idx"),
+                                                     ("all files","*.*")))
 
     def get_out_filename(self, path):
         # note: file has to have extension!
         return filedialog.asksaveasfilename(initialdir=path,
                                             title="Select parsed file location",
-                                            filetypes=(("text files","*.txt"),("all files","*.*")))
+                                            filetypes=(("text files","*.txt"),
+                                                       ("compressed text files","*.gz *.xz"),
+                                                       ("all files","*.*")))
 
     def convert(self):
-        print("Option choosen:", self.selected.get())
+        logger.info("Option choosen: %s", self.selected.get())
         path = os.path.dirname(os.path.abspath( __file__ ))
-        print("Current directory:", path)
+        logger.info("Current directory: %s", path)
         in_filename = self.get_in_filename(path)
-        print("Filename for input:", in_filename)
+        logger.info("Filename for input: %s", in_filename)
+        if not in_filename:
+            return
+        # the tkinter variables must only be read by the GUI thread:
+        selected = self.selected.get()
+        if selected == 0 or is_recording(in_filename) or compression_of(in_filename):
+            self.start_convert(selected, in_filename, None)
+            return
+        # a file with several measurements -> which one? (indexing a big file
+        # takes a while, so that runs in the background thread too)
+        self.index = []
+        self.convert_thread = threading.Thread(target=self.run_index, args=(in_filename,),
+                                               name="Index", daemon=True)
+        self.convert_btn.config(text="Indexing...", state=DISABLED)
+        self.convert_thread.start()
+        self.after(100, self.index_done, selected, in_filename)
+
+    def run_index(self, in_filename):
+        """Runs in the background thread, no tkinter in here!"""
+        try:
+            self.index = index_series(in_filename)
+        except Exception as e:
+            logger.warning("Couldn't index %s: %s", in_filename, e)
+            self.index = []
+
+    def index_done(self, selected, in_filename):
+        # polled by the GUI thread till the file is indexed:
+        if self.convert_thread.is_alive():
+            self.after(100, self.index_done, selected, in_filename)
+            return
+        self.convert_btn.config(text="Convert measurement data file", state=NORMAL)
+        series = None
+        if len(self.index) > 1:
+            dialog = SeriesDialog(self, self.index)
+            if dialog.cancelled:
+                return
+            series = dialog.choice
+        self.start_convert(selected, in_filename, series)
+
+    def start_convert(self, selected, in_filename, series):
+        path = os.path.dirname(os.path.abspath( __file__ ))
         out_filename = self.get_out_filename(path)
-        print("Filename for output:", out_filename)
-        # just make a copy of the original file:
-        if self.selected.get() == 0:
-            copy_file(in_filename, out_filename)
-        # parse as CSV without header:
-        elif self.selected.get() == 1:
-            file_to_sv(in_filename, out_filename, header=False)
-        # parse as CSV with header:
-        elif self.selected.get() == 2:
-            file_to_sv(in_filename, out_filename, header=True)
-        # parse as TSV with header:
-        elif self.selected.get() == 3:
-            file_to_sv(in_filename, out_filename, header=True, separator="\t")
+        logger.info("Filename for output: %s", out_filename)
+        if not out_filename:
+            return
+        self.convert_error = None
+        self.convert_thread = threading.Thread(target=self.run_convert,
+                                               args=(selected, in_filename, out_filename, series),
+                                               name="Convert", daemon=True)
+        self.convert_btn.config(text="Converting...", state=DISABLED)
+        self.convert_thread.start()
+        self.after(100, self.convert_done)
+
+    def run_convert(self, selected, in_filename, out_filename, series=None):
+        """Runs in the background thread, no tkinter in here!
+        series ... index of the measurement to convert (None -> the whole file)
+        """
+        start = time.perf_counter()
+        # (only given if the file has several measurements)
+        kwargs = {} if series is None else {"series": series}
+        try:
+            # just make a copy of the original file:
+            if selected == 0:
+                copy_file(in_filename, out_filename)
+            # parse as CSV without header:
+            elif selected == 1:
+                file_to_sv(in_filename, out_filename, header=False, processes=self.processes, **kwargs)
+            # parse as CSV with header:
+            elif selected == 2:
+                file_to_sv(in_filename, out_filename, header=True, processes=self.processes, **kwargs)
+            # parse as TSV with header:
+            elif selected == 3:
+                file_to_sv(in_filename, out_filename, header=True, separator="\t",
+                           processes=self.processes, **kwargs)
+            logger.info("Converted %s in %.1fs", in_filename, time.perf_counter() - start)
+        except Exception as e:
+            logger.exception("Couldn't convert %s", in_filename)
+            self.convert_error = e
+
+    def convert_done(self):
+        # polled by the GUI thread till the conversion has finished:
+        if self.convert_thread.is_alive():
+            self.after(100, self.convert_done)
+            return
+        self.convert_btn.config(text="Convert measurement data file", state=NORMAL)
+        if self.convert_error is not None:
+            messagebox.showerror("Couldn't convert the file!",
+                                 "Error message:\n{}".format(self.convert_error))
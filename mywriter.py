@@ -0,0 +1,253 @@
+# --- module for writing the measured data to files in the background ---
+
+import os
+import queue
+import threading
+import time
+import collections
+# the lines wait in a fifo till the writer thread takes them:
+from mythreads import Fifo
+# mean/min/max/jitter of the write latency:
+from myscheduler import TimingStats
+# compressed files (.gz/.xz) are compressed while they are written:
+from mycompress import open_file
+# every module logs with its own logger (see mylog module):
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class WriterStats:
+    """Statistics of a FileWriter:
+    latency ... TimingStats of the time between write() and the moment the text
+    was handed over to the file (in seconds)
+    depth/max_depth ... number of texts waiting in the queue now/at most
+    """
+    def __init__(self):
+        self.latency = TimingStats()
+        self.depth = 0
+        self.max_depth = 0
+        # number of group writes, bytes (characters) written, flushes and fsyncs:
+        self.writes = 0
+        self.written = 0
+        self.flushes = 0
+        self.fsyncs = 0
+        self.errors = 0
+
+    def __repr__(self):
+        return ("WriterStats<writes={}, written={}, flushes={}, fsyncs={}, errors={}, "
+                "queue depth={} (max {}), latency mean={:.6f}s max={:.6f}s>").format(self.writes,
+                                                                                self.written,
+                                                                                self.flushes,
+                                                                                self.fsyncs,
+                                                                                self.errors,
+                                                                                self.depth,
+                                                                                self.max_depth,
+                                                                                self.latency.mean,
+                                                                                self.latency.max if self.latency.count else 0.0)
+
+
+class FileWriter(threading.Thread):
+    """A thread that writes text to files, the threads which produce the text
+    only put it on a queue with write() and never wait for the disk (e.g. a slow
+    USB stick), so neither the acquisition nor the display is blocked by file I/O!
+
+    Everything that waits in the queue is written with one write() call per file
+    (group write), the file stays open between the writes. Texts (str) are
+    written in text mode and binary records (bytes) in binary mode, a file
+    ending with .gz or .xz is compressed on the fly (see mycompress module):
+    flush_interval ... the written data is flushed to the OS at least every
+    flush_interval seconds (0 -> after every group write)
+    fsync_interval ... and forced onto the disk with os.fsync at least every
+    fsync_interval seconds (None -> only on flush() and close())
+    max_batch ... maximum number of texts written at once
+    """
+    def __init__(self, flush_interval=1.0, fsync_interval=10.0, max_batch=10000, max_open=8):
+        threading.Thread.__init__(self, name="FileWriter", daemon=True)
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.max_batch = max_batch
+        # at most max_open files are kept open, the least recently used is
+        # closed first:
+        self.max_open = max_open
+        # items: (filename, text, time of write()), (filename, None, time) to
+        # close a file, or (None, function, time) to call a function:
+        self.queue = Fifo()
+        self.stats = WriterStats()
+        # the open files by filename, the most recently used last:
+        self.files = collections.OrderedDict()
+        self.last_flush = time.perf_counter()
+        self.last_fsync = self.last_flush
+        self.run_flag = True
+
+    def write(self, filename, text):
+        """Puts text (str or bytes) on the queue for the file with the given
+        name (appended to the file, which is created if it doesn't exist), never
+        blocks! (don't mix str and bytes for one file)
+        """
+        self.queue.push((filename, text, time.perf_counter()))
+
+    def close_file(self, filename):
+        """Closes the file after everything written to it so far, never blocks"""
+        self.queue.push((filename, None, time.perf_counter()))
+
+    def flush(self, timeout=None) -> bool:
+        """Writes everything that was put on the queue before this call onto the
+        disk (flush and fsync), waits at most timeout seconds (None -> forever)
+        and returns True if that worked in time
+        """
+        if not self.is_alive():
+            return False
+        done = threading.Event()
+
+        def flush():
+            self._flush(fsync=True)
+            done.set()
+        self.call(flush)
+        return done.wait(timeout)
+
+    def call(self, function):
+        """Calls the function on the writer thread after everything put on the
+        queue so far is written (e.g. to rename a file after it was closed),
+        never blocks
+        """
+        self.queue.push((None, function, time.perf_counter()))
+
+    def run(self):
+        while self.run_flag or len(self.queue) > 0:
+            # wait for the first item, but not longer than the next flush:
+            try:
+                item = self.queue.get(timeout=self._timeout())
+            except queue.Empty:
+                item = None
+            if item is not None:
+                self.stats.depth = len(self.queue) + 1
+                self.stats.max_depth = max(self.stats.max_depth, self.stats.depth)
+                # take whatever else arrived meanwhile too:
+                self._write_items([item] + self.queue.drain(self.max_batch - 1))
+                self.stats.depth = len(self.queue)
+            self._flush_if_due()
+        for filename in list(self.files):
+            self._close_file(filename)
+        logger.info("%s has stopped! %s", self, self.stats)
+
+    def _timeout(self) -> float:
+        if not self.files or self.flush_interval <= 0:
+            # nothing to flush (or it's done after every write), but look at
+            # the run_flag from time to time:
+            return 0.5
+        return max(0.0, self.last_flush + self.flush_interval - time.perf_counter())
+
+    def _write_items(self, items):
+        # the texts for the same file are joined into one write:
+        groups = collections.OrderedDict()
+        for filename, text, t_write in items:
+            if filename is None:
+                # a function call, everything before it has to be written:
+                self._write_groups(groups)
+                groups.clear()
+                try:
+                    text()
+                except Exception:
+                    self.stats.errors += 1
+                    logger.exception("Call of %s on %s failed", text, self)
+            elif text is None:
+                self._write_groups(groups)
+                groups.clear()
+                self._close_file(filename)
+            else:
+                groups.setdefault(filename, []).append((text, t_write))
+        self._write_groups(groups)
+
+    def _write_groups(self, groups):
+        for filename, group in groups.items():
+            file = self._file(filename, isinstance(group[0][0], bytes))
+            if file is None:
+                continue
+            text = group[0][0][:0].join(text for text, t_write in group)
+            try:
+                file.write(text)
+            except Exception:
+                self.stats.errors += 1
+                logger.exception("Couldn't write %d texts to %s", len(group), filename)
+                continue
+            now = time.perf_counter()
+            for _, t_write in group:
+                self.stats.latency.add(now - t_write)
+            self.stats.writes += 1
+            self.stats.written += len(text)
+
+    def _file(self, filename, binary=False):
+        """Returns the open file with the given name, opens it if needed"""
+        file = self.files.get(filename)
+        if file is not None:
+            self.files.move_to_end(filename)
+            return file
+        if len(self.files) >= self.max_open:
+            self._close_file(next(iter(self.files)))
+        try:
+            # append data if the file is already filled with content,
+            # or create the file if no file with that name exists:
+            file = open_file(filename, "ab" if binary else "a+")
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("Couldn't open %s", filename)
+            return None
+        self.files[filename] = file
+        return file
+
+    def _close_file(self, filename):
+        file = self.files.pop(filename, None)
+        if file is not None:
+            self._sync(filename, file, fsync=True)
+            try:
+                file.close()
+            except Exception:
+                logger.exception("Couldn't close %s", filename)
+
+    def _flush_if_due(self):
+        now = time.perf_counter()
+        if now - self.last_flush >= self.flush_interval:
+            fsync = self.fsync_interval is not None and now - self.last_fsync >= self.fsync_interval
+            self._flush(fsync)
+
+    def _flush(self, fsync=False):
+        now = time.perf_counter()
+        self.last_flush = now
+        if fsync:
+            self.last_fsync = now
+        for filename, file in self.files.items():
+            self._sync(filename, file, fsync)
+
+    def _sync(self, filename, file, fsync):
+        try:
+            file.flush()
+            self.stats.flushes += 1
+            if fsync:
+                os.fsync(file.fileno())
+                self.stats.fsyncs += 1
+        except Exception:
+            self.stats.errors += 1
+            logger.exception("Couldn't flush %s", filename)
+
+    def close(self, timeout=None):
+        """Writes the rest of the queue, closes the files and stops the thread"""
+        self.run_flag = False
+        if self.is_alive():
+            # wake the thread up if it waits for an item:
+            self.flush(timeout)
+            self.join(timeout)
+
+    def __repr__(self):
+        return "FileWriter<{}>".format(", ".join(self.files))
+
+
+if __name__ == '__main__':
+    writer = FileWriter(flush_interval=0.1)
+    writer.start()
+    for i in range(10000):
+        writer.write("writer_test.txt", "Time: {}, Value: {}\n".format(i, i * i))
+    writer.flush()
+    print(writer.stats)
+    writer.close()
+    os.remove("writer_test.txt")